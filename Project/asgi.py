@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Project.settings')
 
 application = get_asgi_application()
+
+# Build the fee-counter typeahead index before the first request arrives
+from core.typeahead import warm_index  # noqa: E402
+
+warm_index()
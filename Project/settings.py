@@ -84,6 +84,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock when a transaction starts, so writers queue up
+        # instead of failing with "database is locked" halfway through
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
     }
 }
 
@@ -132,6 +135,21 @@ USE_TZ = True
 # =====================
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+# With DEBUG off, `collectstatic` writes content-hashed names plus .gz/.br copies (core.storage)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'core.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+# With DEBUG off the app serves STATIC_ROOT itself (core.assets); False when the web server does
+SERVE_STATIC = True
+# Pinned libraries committed under static/ (never loaded from a CDN) and where each copy came from;
+# `python manage.py vendor_assets --force` fetches them again after a version bump
+VENDOR_ASSETS = {
+    'vendor/chart.umd.min.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.js',
+}
 
 
 # =====================
@@ -139,6 +157,76 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 # =====================
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Let the web server send media files once the app has checked the login:
+# 'X-Accel-Redirect' (nginx; SENDFILE_MEDIA_PREFIX is an internal location aliased
+# to MEDIA_ROOT) or 'X-Sendfile' (Apache mod_xsendfile). Empty: the app sends them.
+SENDFILE_HEADER = ''
+SENDFILE_MEDIA_PREFIX = '/protected-media/'
+
+
+# =====================
+# STUDENT PHOTOS
+# =====================
+PHOTO_MAX_UPLOAD_BYTES = 15 * 1024 * 1024
+# Uploads are kept as JPEG no larger than this on the longest side
+PHOTO_MAX_EDGE = 1600
+PHOTO_QUALITY = 85
+# Bigger uploads are stored as sent and normalized in this many background threads
+PHOTO_INLINE_MAX_BYTES = 1024 * 1024
+PHOTO_THREADS = 2
+# Unreferenced photo files are deleted by `sweep_media` only after this long
+MEDIA_SWEEP_GRACE_MINUTES = 60
+
+
+# =====================
+# RECEIPTS
+# =====================
+# Prefix of each financial year's receipt numbers; {fy} becomes e.g. '2526'
+RECEIPT_PREFIX = 'RCP-{fy}-'
+# Financial years start on the 1st of this month (April)
+RECEIPT_YEAR_START_MONTH = 4
+
+
+# =====================
+# BACKGROUND EXPORTS
+# =====================
+# 'thread' runs queued exports in a small pool inside the web process;
+# 'worker' leaves them for `python manage.py run_export_worker`.
+EXPORT_JOB_RUNNER = 'thread'
+EXPORT_JOB_THREADS = 2
+# Finished export files are kept for this long
+EXPORT_JOB_TTL_HOURS = 24
+# Jobs still running after this long were cut off (e.g. by a restart) and are marked failed
+EXPORT_JOB_STALE_MINUTES = 60
+
+# Finished exports are reused until the data they read changes
+EXPORT_CACHE_ENABLED = True
+EXPORT_CACHE_DIR = BASE_DIR / 'cache' / 'exports'
+EXPORT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+
+# =====================
+# CACHE
+# =====================
+# Facet lists, dashboard figures and filtered-list counts (core.caching):
+# 'locmem' keeps them per process, 'file' shares them between the processes on
+# one machine, 'redis' between machines (any Redis-compatible server; needs the
+# `redis` package).
+CACHE_BACKEND = 'locmem'
+CACHE_REDIS_URL = 'redis://127.0.0.1:6379/1'
+# Entries never go stale (their keys carry data versions); this only bounds their lifetime
+CACHE_TIMEOUT = 24 * 3600
+CACHE_BACKENDS = {
+    'locmem': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core'},
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'django',
+    },
+    'redis': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_REDIS_URL},
+}
+CACHES = {
+    'default': {**CACHE_BACKENDS[CACHE_BACKEND], 'TIMEOUT': CACHE_TIMEOUT, 'KEY_PREFIX': 'core'},
+}
 
 
 # =====================
@@ -1,8 +1,9 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.contrib.auth import views as auth_views
 from django.conf import settings
-from django.conf.urls.static import static
 from core import views as core_views
 
 urlpatterns = [
@@ -17,6 +18,14 @@ urlpatterns = [
     path('', include('core.urls')),
 ]
 
-# Serve media files during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Media goes through core.views.media_file: logged-in staff only, with cache
+# headers, ETags and byte ranges (or handed to the web server, SENDFILE_HEADER)
+urlpatterns += [
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), core_views.media_file),
+]
+
+# runserver serves static files while DEBUG is on; after that, the collected ones
+if not settings.DEBUG and settings.SERVE_STATIC:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.+)$' % re.escape(settings.STATIC_URL.lstrip('/')), core_views.static_file),
+    ]
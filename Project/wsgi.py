@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Project.settings')
 
 application = get_wsgi_application()
+
+# Build the fee-counter typeahead index before the first request arrives
+from core.typeahead import warm_index  # noqa: E402
+
+warm_index()
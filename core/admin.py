@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Enquiry, AdmittedStudent, Course, Student, FeePayment
+from .models import Enquiry, AdmittedStudent, Course, Student, FeePayment, ReceiptSequence, MediaBlob
 
 @admin.register(Enquiry)
 class EnquiryAdmin(admin.ModelAdmin):
@@ -13,7 +13,8 @@ class AdmittedStudentAdmin(admin.ModelAdmin):
     list_display = ("full_name", "course", "mobile_own", "city", "admission_date", "remaining_fees")
     search_fields = ("full_name", "student_name", "mobile_own", "city")
     list_filter = ("course", "gender", "marital_status", "admission_date")
-    readonly_fields = ("admission_date", "updated_at", "remaining_fees", "fees_percentage_paid")
+    # paid_fees follows the receipts (core.ledger)
+    readonly_fields = ("admission_date", "updated_at", "paid_fees", "remaining_fees", "fees_percentage_paid")
     
     fieldsets = (
         ('Course Information', {
@@ -121,4 +122,19 @@ class FeePaymentAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         # Disable deleting payments
         # This is to maintain financial integrity
-        return False
\ No newline at end of file
+        return False
+
+
+@admin.register(ReceiptSequence)
+class ReceiptSequenceAdmin(admin.ModelAdmin):
+    list_display = ("financial_year", "prefix", "last_number", "updated_at")
+    # The counter only moves through core.receipt_numbers
+    readonly_fields = ("last_number", "updated_at")
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ("name", "size", "refs", "created_at", "released_at")
+    search_fields = ("name",)
+    # Counted by core.media; unused files are removed by `manage.py sweep_media`
+    readonly_fields = ("name", "size", "refs", "created_at", "released_at")
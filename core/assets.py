@@ -0,0 +1,160 @@
+"""
+Static and media files sent by the app itself.
+
+With DEBUG off, ``collectstatic`` stores every static file under a name
+with its content hash - ``core/style.3f9c1e0a42b7.css`` - and writes ``.gz``
+and ``.br`` copies next to it (core.storage). ``serve_file()`` sends the
+smallest copy the browser accepts, with an ETag for revalidation and a
+Cache-Control chosen by the caller: a hashed name never changes, so it is
+cached for a year. Uncompressed responses honour a single byte range
+(206 Partial Content), which lets an interrupted download resume.
+
+Media files can be handed to the web server instead, after the view has
+checked the login (SENDFILE_HEADER): nginx's X-Accel-Redirect or Apache's
+X-Sendfile.
+"""
+import mimetypes
+import os
+from functools import cache
+from urllib.parse import quote
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+
+IMMUTABLE = 'max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+# Precompressed copies, best first: (Accept-Encoding token, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+@cache
+def hashed_static_names():
+    """The content-hashed names in the collectstatic manifest (none while DEBUG is on)"""
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def byte_range(header, size):
+    """
+    (first, last) byte of a 'bytes=...' Range header, or None to send the
+    whole file (no header, several ranges or one we don't understand)
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, _, last = header[len('bytes='):].strip().partition('-')
+    try:
+        if not first:
+            # 'bytes=-500': the last 500 bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable
+            return max(0, size - length), size - 1
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if first >= size or last < first:
+        raise RangeNotSatisfiable
+    return first, last
+
+
+def _etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _matches(header, etag):
+    tags = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in tags or etag in tags
+
+
+def _read(file, length):
+    with file:
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, root, path, cache_control, precompressed=False, sendfile=None):
+    """
+    The file ``path`` under ``root`` as a response. ``precompressed`` looks
+    for .br/.gz copies; ``sendfile`` is (header, value) to let the web server
+    send the file instead.
+    """
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Not found')
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    encoding, chosen = None, full_path
+    if precompressed:
+        accepted = request.headers.get('Accept-Encoding', '')
+        for token, suffix in ENCODINGS:
+            if token in accepted and os.path.isfile(full_path + suffix):
+                encoding, chosen = token, full_path + suffix
+                break
+
+    stat = os.stat(chosen)
+    etag = _etag(stat)
+    headers = {'ETag': etag, 'Cache-Control': cache_control, 'Last-Modified': http_date(stat.st_mtime)}
+    if precompressed:
+        headers['Vary'] = 'Accept-Encoding'
+    if _matches(request.headers.get('If-None-Match', ''), etag):
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    if sendfile:
+        # The web server reads the file, ranges included; we only send headers
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response[sendfile[0]] = sendfile[1]
+        return response
+
+    span = None
+    if encoding is None:
+        headers['Accept-Ranges'] = 'bytes'
+        # If-Range: only resume if the file is still the one the client started on
+        if_range = request.headers.get('If-Range')
+        if not if_range or if_range == etag:
+            try:
+                span = byte_range(request.headers.get('Range'), stat.st_size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416, headers=headers)
+                response['Content-Range'] = f'bytes */{stat.st_size}'
+                return response
+
+    file = open(chosen, 'rb')
+    if span is None:
+        response = FileResponse(file, content_type=content_type, headers=headers)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        return response
+
+    first, last = span
+    file.seek(first)
+    response = StreamingHttpResponse(_read(file, last - first + 1), status=206, content_type=content_type,
+                                     headers=headers)
+    response['Content-Length'] = str(last - first + 1)
+    response['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+    return response
+
+
+def sendfile_target(header, prefix, root, path):
+    """(header, value) handing ``path`` under ``root`` to the web server"""
+    if header.lower() == 'x-accel-redirect':
+        return header, prefix.rstrip('/') + '/' + quote(path)
+    return header, safe_join(root, path)
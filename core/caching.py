@@ -0,0 +1,93 @@
+"""
+Cached query results.
+
+Facet lists (the years and courses in the filter dropdowns), the dashboard
+figures and the counts of filtered lists are read on every page view but
+change only when their tables do. ``cached()`` keeps such a result in the
+Django cache - local memory, files or Redis, see CACHE_BACKEND in settings -
+under a key that includes the stamps of the data sets it reads
+(core.versions). The model signals in core.signals move those stamps on
+every write, so a result is never served once its data has changed; the
+superseded entries are simply left to expire after CACHE_TIMEOUT.
+
+Hits and misses are counted per cached function, in the cache itself so
+that all processes sharing a file or Redis cache add up. ``stats()``
+reports them (the ``cache_stats`` view and management command).
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.core.cache import cache
+
+from . import versions
+
+# name -> data sets read, for every function wrapped by cached()
+REGISTRY = {}
+OUTCOMES = ('hits', 'misses')
+
+_MISSING = object()
+
+
+def _key(name, data_sets, args):
+    stamps = versions.stamps(data_sets)
+    digest = hashlib.sha1(json.dumps(args, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+    return f"{name}:{':'.join(stamps.values())}:{digest}"
+
+
+def _stats_key(name, outcome):
+    return f'stats:{name}:{outcome}'
+
+
+def _count(name, outcome):
+    key = _stats_key(name, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # First of its kind (or evicted); another process may have started it meanwhile
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def cached(name, data_sets):
+    """
+    Cache the decorated function's result per ``data_sets`` stamps and
+    arguments. Arguments must be JSON-serializable, results picklable.
+    """
+    def decorator(function):
+        REGISTRY[name] = tuple(data_sets)
+
+        @wraps(function)
+        def wrapper(*args):
+            key = _key(name, data_sets, args)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                _count(name, 'hits')
+                return value
+            _count(name, 'misses')
+            value = function(*args)
+            cache.set(key, value)
+            return value
+
+        wrapper.uncached = function
+        return wrapper
+    return decorator
+
+
+# ================= STATS =================
+def stats():
+    """{name: {'hits', 'misses', 'hit_rate'}} for every cached function"""
+    counts = cache.get_many([_stats_key(name, outcome) for name in REGISTRY for outcome in OUTCOMES])
+    report = {}
+    for name in sorted(REGISTRY):
+        hits, misses = (counts.get(_stats_key(name, outcome), 0) for outcome in OUTCOMES)
+        report[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+    return report
+
+
+def reset_stats():
+    cache.delete_many([_stats_key(name, outcome) for name in REGISTRY for outcome in OUTCOMES])
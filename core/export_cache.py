@@ -0,0 +1,192 @@
+"""
+Disk cache for exports.
+
+An export is identified by its kind, its format, its filter parameters
+(normalised: empty and control parameters dropped, keys sorted) and the
+stamps of the data sets it reads (core.versions: never reused, even after a
+rolled-back write, unlike the bare version numbers). While none of those
+change, the file produced last time is still correct, so it is served from
+EXPORT_CACHE_DIR instead of being rebuilt, and a client that already holds
+it gets a 304 from its ``If-None-Match``.
+
+A miss streams as before; the bytes are written to a temporary file on the
+way out and moved into the cache once the export completes. CSV and JSON
+are stored gzipped and sent as-is to clients that accept gzip. The cache is
+bounded by EXPORT_CACHE_MAX_BYTES: after each store the least recently used
+files are removed (a hit refreshes the file's mtime). Background export
+jobs read and fill the same cache through ``cached_chunks()``.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from . import versions
+from .streaming import streaming_download, wants_gzip
+
+# Request parameters that do not change the contents of an export
+IGNORED_PARAMS = {'format', 'background', 'gzip', 'csrfmiddlewaretoken'}
+
+COPY_CHUNK = 64 * 1024
+
+
+def cache_dir():
+    return Path(getattr(settings, 'EXPORT_CACHE_DIR', Path(settings.BASE_DIR) / 'cache' / 'exports'))
+
+
+def max_bytes():
+    return getattr(settings, 'EXPORT_CACHE_MAX_BYTES', 200 * 1024 * 1024)
+
+
+# ================= KEYS =================
+def normalized_params(params):
+    return {
+        key: params.get(key).strip()
+        for key in sorted(params)
+        if key not in IGNORED_PARAMS and params.get(key) and params.get(key).strip()
+    }
+
+
+def cache_key(kind, export_format, params):
+    """Hex digest of everything the export's contents depend on"""
+    identity = {
+        'kind': kind.name,
+        'format': export_format,
+        'params': normalized_params(params),
+        'versions': versions.stamps(kind.data_sets),
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def etag_for(key):
+    # Weak: a rebuilt xlsx has the same contents but different zip timestamps
+    return f'W/"{key[:32]}"'
+
+
+def _matches(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    candidates = {tag.strip() for tag in header.split(',')}
+    return '*' in candidates or etag in candidates or etag[2:] in candidates
+
+
+def _path(key, compressed):
+    return cache_dir() / key[:2] / (key + ('.gz' if compressed else ''))
+
+
+# ================= STORE =================
+def _store(chunks, path, compressed):
+    """Pass ``chunks`` through, saving them at ``path`` once all have been read"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.part')
+    complete = False
+    try:
+        with os.fdopen(handle, 'wb') as raw:
+            output = gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) if compressed else raw
+            for chunk in chunks:
+                output.write(chunk)
+                yield chunk
+            if compressed:
+                output.close()
+        os.replace(temp_path, path)
+        complete = True
+    finally:
+        # A client that disconnects mid-download leaves nothing behind
+        if not complete and os.path.exists(temp_path):
+            os.remove(temp_path)
+    evict()
+
+
+def evict(limit=None):
+    """Remove least recently used files until the cache fits in ``limit`` bytes"""
+    limit = max_bytes() if limit is None else limit
+    root = cache_dir()
+    if not root.exists():
+        return 0
+    entries = []
+    for path in root.glob('*/*'):
+        if path.suffix == '.part':
+            continue
+        stat = path.stat()
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total <= limit:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+# ================= READING =================
+def _read_chunks(path, compressed):
+    with (gzip.open(path, 'rb') if compressed else open(path, 'rb')) as source:
+        while True:
+            chunk = source.read(COPY_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+
+
+def cached_chunks(kind, export_format, params, chunks_for, compress):
+    """(uncompressed export bytes, whether they came from the cache)"""
+    path = _path(cache_key(kind, export_format, params), compress)
+    if path.exists():
+        os.utime(path)
+        return _read_chunks(path, compress), True
+    return _store(chunks_for(), path, compress), False
+
+
+# ================= RESPONSES =================
+
+def _cached_response(request, path, compressed, filename, content_type):
+    os.utime(path)
+    if not compressed:
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+
+    if wants_gzip(request):
+        # FileResponse would guess Content-Encoding from the .gz name; set it explicitly
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(_read_chunks(path, True), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def cached_export_response(request, kind, export_format, chunks_for, filename, content_type, compress,
+                           params=None):
+    """
+    Serve the export from the cache, or stream it from ``chunks_for()`` and
+    keep a copy. ``compress`` marks formats worth gzipping (not xlsx);
+    ``params`` are the filters the contents depend on (the query string).
+    """
+    key = cache_key(kind, export_format, request.GET if params is None else params)
+    etag = etag_for(key)
+    path = _path(key, compress)
+
+    if path.exists():
+        if _matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = _cached_response(request, path, compress, filename, content_type)
+        response['X-Export-Cache'] = 'hit'
+    else:
+        response = streaming_download(
+            request, _store(chunks_for(), path, compress), filename, content_type, compress=compress,
+        )
+        response['X-Export-Cache'] = 'miss'
+
+    response['ETag'] = etag
+    # Downloads carry staff data: revalidate with the server, never share
+    response['Cache-Control'] = 'private, no-cache'
+    return response
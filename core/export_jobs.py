@@ -0,0 +1,245 @@
+"""
+Background export jobs.
+
+An export requested with ``?background=1`` is stored as an ExportJob and the
+view returns at once. The file is produced off the request path and saved
+under MEDIA_ROOT/exports/; the browser polls ``/api/export-jobs/<id>/`` for
+progress and then downloads it. Finished files expire after
+EXPORT_JOB_TTL_HOURS and are removed by ``purge_expired()``; jobs still
+running after EXPORT_JOB_STALE_MINUTES were cut off by a restart and are
+marked failed by ``fail_stale()``.
+
+Where the work runs depends on EXPORT_JOB_RUNNER:
+
+* ``'thread'`` (default): a small in-process thread pool
+  (EXPORT_JOB_THREADS, default 2). At most that many exports run at once
+  per web process, however many are requested. ``enqueue()`` also runs
+  ``housekeeping()`` at most every few minutes: the two clean-ups above,
+  and jobs left queued by a previous process are handed to the pool.
+* ``'worker'``: jobs only wait in the table; ``manage.py run_export_worker``
+  picks them up in a separate process and keeps exports away from web
+  workers entirely.
+"""
+import logging
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .export_cache import cached_chunks
+from .exports import EXPORT_KINDS, GZIP_FORMATS, export_chunks
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+# Request parameters that steer the export itself rather than filter its rows
+CONTROL_PARAMS = {'background', 'gzip', 'csrfmiddlewaretoken'}
+
+# rows_done is written back every this many rows
+PROGRESS_EVERY = 1000
+
+# Thread runner housekeeping runs at most this often per process
+HOUSEKEEPING_EVERY = timedelta(minutes=5)
+
+_pool = None
+_pool_lock = threading.Lock()
+# Queued jobs older than this process were submitted to a pool that is gone
+_process_started = timezone.now()
+_last_housekeeping = None
+
+
+def job_ttl():
+    return timedelta(hours=getattr(settings, 'EXPORT_JOB_TTL_HOURS', 24))
+
+
+def stale_after():
+    return timedelta(minutes=getattr(settings, 'EXPORT_JOB_STALE_MINUTES', 60))
+
+
+# ================= QUEUEING =================
+def enqueue(kind, params, user=None):
+    """Record a job for export ``kind`` with the given request parameters"""
+    job = ExportJob.objects.create(
+        kind=kind.name,
+        export_format=kind.format_for(params),
+        params={key: params.get(key) for key in params if key not in CONTROL_PARAMS},
+        created_by=user if user and user.is_authenticated else None,
+    )
+    if getattr(settings, 'EXPORT_JOB_RUNNER', 'thread') == 'thread':
+        transaction.on_commit(lambda: _thread_pool().submit(run_in_thread, job.id))
+        transaction.on_commit(housekeeping)
+    return job
+
+
+def _thread_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'EXPORT_JOB_THREADS', 2),
+                thread_name_prefix='export-job',
+            )
+        return _pool
+
+
+def run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Each pool thread has its own connection; don't leave it open
+        connection.close()
+
+
+# ================= RUNNING =================
+def claim(job_id):
+    """Move a queued job to running; False if another worker got it first"""
+    return ExportJob.objects.filter(pk=job_id, status='queued').update(
+        status='running', started_at=timezone.now()
+    ) == 1
+
+
+def _with_progress(rows, job_id):
+    done = 0
+    for row in rows:
+        yield row
+        done += 1
+        if done % PROGRESS_EVERY == 0:
+            ExportJob.objects.filter(pk=job_id).update(rows_done=done)
+    ExportJob.objects.filter(pk=job_id).update(rows_done=done)
+
+
+def run_job(job_id):
+    """Produce the file for one queued job"""
+    if not claim(job_id):
+        return
+    job = ExportJob.objects.get(pk=job_id)
+    kind = EXPORT_KINDS.get(job.kind)
+
+    try:
+        if kind is None:
+            raise ValueError(f'Unknown export: {job.kind}')
+
+        queryset = kind.queryset(job.params)
+        rows_total = queryset.count()
+        ExportJob.objects.filter(pk=job.pk).update(rows_total=rows_total)
+
+        def build():
+            rows = _with_progress(kind.spec.rows(queryset), job.pk)
+            return export_chunks(kind.spec, rows, job.export_format)[0]
+
+        chunks, hit = cached_chunks(
+            kind, job.export_format, job.params, build, job.export_format in GZIP_FORMATS,
+        )
+        if hit:
+            ExportJob.objects.filter(pk=job.pk).update(rows_done=rows_total)
+        filename = f'{kind.filename(job.params)}.{job.export_format}'
+
+        with tempfile.TemporaryFile() as output:
+            for chunk in chunks:
+                output.write(chunk)
+            output.seek(0)
+            # A random directory keeps the stored path unguessable
+            job.file.save(f'{uuid.uuid4().hex}/{filename}', File(output), save=False)
+
+        finished = timezone.now()
+        ExportJob.objects.filter(pk=job.pk).update(
+            status='done', file=job.file.name, filename=filename,
+            finished_at=finished, expires_at=finished + job_ttl(),
+        )
+    except Exception as e:
+        logger.exception('Export job %s failed', job.pk)
+        ExportJob.objects.filter(pk=job.pk).update(
+            status='failed', error=str(e), finished_at=timezone.now()
+        )
+
+
+def run_queued(limit=None):
+    """Run waiting jobs in this thread, oldest first; returns how many ran"""
+    job_ids = ExportJob.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True)
+    if limit:
+        job_ids = job_ids[:limit]
+    count = 0
+    for job_id in list(job_ids):
+        run_job(job_id)
+        count += 1
+    return count
+
+
+def purge_expired(now=None):
+    """Delete the files of expired jobs; returns how many were removed"""
+    now = now or timezone.now()
+    expired = ExportJob.objects.filter(status='done', expires_at__lt=now)
+    count = 0
+    for job in expired:
+        if job.file:
+            job.file.delete(save=False)
+        ExportJob.objects.filter(pk=job.pk).update(status='expired', file='')
+        count += 1
+    return count
+
+
+def fail_stale(now=None):
+    """Mark jobs running for longer than EXPORT_JOB_STALE_MINUTES as failed; returns how many"""
+    now = now or timezone.now()
+    return ExportJob.objects.filter(status='running', started_at__lt=now - stale_after()).update(
+        status='failed', error='The export was interrupted; please request it again', finished_at=now,
+    )
+
+
+def orphaned_jobs():
+    """Ids of the jobs queued before this process started, whose pool is gone"""
+    return list(ExportJob.objects.filter(status='queued', created_at__lt=_process_started).values_list('id', flat=True))
+
+
+def requeue_orphans():
+    """Hand orphaned jobs to this process's thread pool; returns how many"""
+    job_ids = orphaned_jobs()
+    for job_id in job_ids:
+        # claim() keeps a job that several processes pick up from running twice
+        _thread_pool().submit(run_in_thread, job_id)
+    return len(job_ids)
+
+
+def housekeeping(force=False):
+    """The thread runner's clean-ups, at most every HOUSEKEEPING_EVERY unless ``force``"""
+    global _last_housekeeping
+    now = timezone.now()
+    with _pool_lock:
+        if not force and _last_housekeeping and now - _last_housekeeping < HOUSEKEEPING_EVERY:
+            return
+        _last_housekeeping = now
+    try:
+        purge_expired(now)
+        fail_stale(now)
+        requeue_orphans()
+    except Exception:
+        # Never let a clean-up break the export that triggered it
+        logger.exception('Export job housekeeping failed')
+
+
+# ================= STATUS =================
+def job_status(job):
+    """JSON-ready progress for the polling endpoint"""
+    status = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'rows_done': job.rows_done,
+        'rows_total': job.rows_total,
+        'percent': job.percent,
+        'status_url': reverse('export_job_status', args=[job.id]),
+        'download_url': None,
+        'filename': job.filename,
+        'error': job.error,
+        'expires_at': job.expires_at.isoformat() if job.expires_at else None,
+    }
+    if job.status == 'done':
+        status['download_url'] = reverse('export_job_download', args=[job.id])
+    return status
@@ -0,0 +1,297 @@
+"""
+Declarative export specs.
+
+Each export is described once as an ExportSpec: a list of Columns, each with
+its header, the model fields it reads (``student__full_name`` style paths)
+and an optional formatter. The spec plans the query itself: every source
+path of every column goes into a single ``values_list()`` projection, so
+related fields are joined in the same SELECT and no export can fall back to
+per-row lazy loads, however many columns are added.
+
+The same spec feeds the CSV, XLSX and JSON outputs through
+``export_response()``; ``?format=csv|xlsx|json`` picks one.
+
+EXPORT_KINDS ties a spec to the list filter that selects its rows and to its
+file name, so an export can be produced from nothing but its kind and the
+request parameters - in the request, or later by core.export_jobs. Both
+paths go through the disk cache in core.export_cache, keyed on the kind's
+``data_sets`` versions.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .export_cache import cached_export_response
+from .filters import filtered_admitted_students, filtered_enquiries, filtered_students
+from .receipts import filtered_receipts
+from .rollups import course_name_for
+from .streaming import FETCH_SIZE, ROWS_PER_CHUNK, csv_chunks, streaming_download
+from .xlsx import XLSX_CONTENT_TYPE, Sheet, stream_xlsx
+
+EXPORT_FORMATS = ('csv', 'xlsx', 'json')
+# Worth gzipping in transit and in the export cache (.xlsx is already deflated)
+GZIP_FORMATS = ('csv', 'json')
+
+
+# ================= FORMATTERS =================
+def as_float(value):
+    return float(value) if value is not None else None
+
+
+def or_blank(value):
+    return value or ''
+
+
+def date_text(pattern):
+    def format_date(value):
+        return value.strftime(pattern) if value else ''
+    return format_date
+
+
+def local_datetime_text(pattern):
+    def format_datetime(value):
+        return timezone.localtime(value).strftime(pattern) if value else ''
+    return format_datetime
+
+
+def difference(total, paid):
+    return float(total - paid)
+
+
+def percentage_paid(total, paid):
+    percentage = (paid / total) * 100 if total > 0 else 0
+    return f"{percentage:.2f}%"
+
+
+# ================= SPECS =================
+class Column:
+    """
+    One output column.
+
+    ``sources`` is a field path or a tuple of them; the formatter receives
+    their values positionally (the single value when omitted). ``serial``
+    columns number the rows instead of reading a field.
+    """
+
+    def __init__(self, header, sources=(), formatter=None, key=None, serial=False):
+        self.header = header
+        self.sources = (sources,) if isinstance(sources, str) else tuple(sources)
+        self.formatter = formatter
+        self.key = key or slugify(header).replace('-', '_')
+        self.serial = serial
+
+    def value(self, values, serial):
+        if self.serial:
+            return serial
+        if self.formatter:
+            return self.formatter(*values)
+        return values[0]
+
+
+class ExportSpec:
+    def __init__(self, title, columns):
+        self.title = title
+        self.columns = list(columns)
+
+        # Distinct source paths in first-use order, and where each column's values sit
+        self.paths = list(dict.fromkeys(path for column in self.columns for path in column.sources))
+        self._positions = [
+            [self.paths.index(path) for path in column.sources]
+            for column in self.columns
+        ]
+
+    @property
+    def headers(self):
+        return [column.header for column in self.columns]
+
+    @property
+    def keys(self):
+        return [column.key for column in self.columns]
+
+    def plan(self, queryset):
+        """The one query an export runs: a values_list() of every source path"""
+        return queryset.values_list(*self.paths)
+
+    def rows(self, queryset):
+        """Formatted rows, fetched with a server-side cursor"""
+        for serial, record in enumerate(self.plan(queryset).iterator(chunk_size=FETCH_SIZE), 1):
+            yield [
+                column.value([record[position] for position in positions], serial)
+                for column, positions in zip(self.columns, self._positions)
+            ]
+
+
+# ================= OUTPUTS =================
+def json_chunks(keys, rows, rows_per_chunk=ROWS_PER_CHUNK):
+    """A JSON array of objects, produced in batches"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    yield b'['
+    batch, first = [], True
+    for row in rows:
+        text = encoder.encode(dict(zip(keys, row)))
+        batch.append(text if first else ',' + text)
+        first = False
+        if len(batch) >= rows_per_chunk:
+            yield ''.join(batch).encode('utf-8')
+            batch = []
+    batch.append(']')
+    yield ''.join(batch).encode('utf-8')
+
+
+def export_chunks(spec, rows, export_format):
+    """(byte chunks, content type, worth gzipping) for ``rows`` of ``spec``"""
+    if export_format == 'csv':
+        return csv_chunks(spec.headers, rows), 'text/csv', True
+    if export_format == 'json':
+        return json_chunks(spec.keys, rows), 'application/json', True
+    return stream_xlsx([Sheet(spec.title, spec.headers, rows)]), XLSX_CONTENT_TYPE, False
+
+
+def export_response(request, kind):
+    """The export ``kind`` for this request's filters, in the requested format"""
+    export_format = kind.format_for(request.GET)
+    chunks, content_type, compress = export_chunks(
+        kind.spec, kind.spec.rows(kind.queryset(request.GET)), export_format
+    )
+    filename = f'{kind.filename(request.GET)}.{export_format}'
+    if not getattr(settings, 'EXPORT_CACHE_ENABLED', True):
+        return streaming_download(request, chunks, filename, content_type, compress=compress)
+    # The generators above are lazy: on a cache hit no query runs
+    return cached_export_response(
+        request, kind, export_format, lambda: chunks, filename, content_type, compress,
+    )
+
+
+# ================= EXPORTS =================
+ENQUIRY_EXPORT = ExportSpec('Enquiries', [
+    Column('ID', 'id'),
+    Column('Name', 'name'),
+    Column('Mobile', 'mobile'),
+    Column('Education', 'education'),
+    Column('Course', 'course'),
+    Column('Date & Time', 'created_at', local_datetime_text('%d-%m-%Y %I:%M %p'), key='created_at'),
+])
+
+ADMITTED_STUDENT_EXPORT = ExportSpec('Admitted Students', [
+    Column('S.No', serial=True, key='serial'),
+    Column('Full Name', 'full_name'),
+    Column('Student Name', 'student_name'),
+    Column('Father Name', 'father_name'),
+    Column('Surname', 'surname'),
+    Column('Mother Name', 'mother_name'),
+    Column('Date of Birth', 'date_of_birth', date_text('%d-%m-%Y')),
+    Column('Mobile (Own)', 'mobile_own'),
+    Column('Parent Mobile', 'parent_mobile', or_blank),
+    Column('Gender', 'gender'),
+    Column('Marital Status', 'marital_status'),
+    Column('Course', 'course'),
+    Column('Custom Course', 'custom_course', or_blank),
+    Column('Educational Qualification', 'educational_qualification'),
+    Column('Address', 'address'),
+    Column('City', 'city'),
+    Column('Tehsil/Block', 'tehsil_block'),
+    Column('District', 'district'),
+    Column('Pin Code', 'pin_code'),
+    Column('Total Fees (₹)', 'total_fees', as_float),
+    Column('Paid Fees (₹)', 'paid_fees', as_float),
+    Column('Remaining Fees (₹)', ('total_fees', 'paid_fees'), difference),
+    Column('Fees % Paid', ('total_fees', 'paid_fees'), percentage_paid),
+    Column('Admission Date', 'admission_date', local_datetime_text('%d-%m-%Y %I:%M %p')),
+])
+
+RECEIPT_EXPORT = ExportSpec('Payment Receipts', [
+    Column('Receipt No', 'receipt_no'),
+    Column('Student Name', 'student__full_name'),
+    Column('Mobile', 'student__mobile_own'),
+    Column('Course', ('student__course', 'student__custom_course'), course_name_for),
+    Column('Payment Date', 'payment_date', local_datetime_text('%d-%m-%Y %I:%M %p')),
+    Column('Payment Mode', 'payment_mode'),
+    Column('Total Fees', 'total_fees_at_payment', as_float),
+    Column('Paid Before', 'paid_before_this', as_float),
+    Column('Amount Paid', 'amount', as_float),
+    Column('Remaining Fees', 'remaining_after_this', as_float),
+    Column('Remarks', 'remarks', or_blank),
+])
+
+STUDENT_EXPORT = ExportSpec('Admitted Students', [
+    Column('S.No', serial=True, key='serial'),
+    Column('Name', 'name'),
+    Column('Phone', 'phone'),
+    Column('Email', 'email', or_blank),
+    Column('Course', 'course__name', or_blank),
+    Column('Admission Date', 'admission_date', date_text('%d-%m-%Y')),
+    Column('Address', 'address', or_blank),
+    Column('City', 'city', or_blank),
+    Column('State', 'state', or_blank),
+    Column('Pincode', 'pincode', or_blank),
+    Column('Parent Name', 'parent_name', or_blank),
+    Column('Parent Phone', 'parent_phone', or_blank),
+    Column('Qualification', 'qualification', or_blank),
+    Column('Date of Birth', 'date_of_birth', date_text('%d-%m-%Y')),
+    Column('Total Fees', 'total_fees', as_float),
+    Column('Paid Fees', 'paid_fees', as_float),
+    Column('Remaining Fees', ('total_fees', 'paid_fees'), difference),
+])
+
+
+# ================= EXPORT KINDS =================
+def timestamp():
+    return timezone.localtime().strftime('%Y%m%d_%H%M%S')
+
+
+class ExportKind:
+    """A spec plus the rows it covers (from request-style params) and its file name"""
+
+    def __init__(self, name, spec, queryset, filename, data_sets, default_format='xlsx'):
+        self.name = name
+        self.spec = spec
+        self.queryset = queryset
+        self.filename = filename
+        # core.versions data sets the rows are read from, for the export cache
+        self.data_sets = tuple(data_sets)
+        self.default_format = default_format
+
+    def format_for(self, params):
+        export_format = params.get('format', self.default_format)
+        return export_format if export_format in EXPORT_FORMATS else self.default_format
+
+
+def admitted_students_filename(params):
+    parts = ['admitted_students']
+    if params.get('search'):
+        parts.append(f"search_{params['search'][:20]}")
+    if params.get('course'):
+        parts.append(params['course'])
+    if params.get('month'):
+        parts.append(f"month_{params['month']}")
+    if params.get('year'):
+        parts.append(params['year'])
+    parts.append(timestamp())
+    return '_'.join(parts)
+
+
+EXPORT_KINDS = {
+    kind.name: kind for kind in [
+        ExportKind(
+            'enquiries', ENQUIRY_EXPORT, filtered_enquiries,
+            lambda params: f'enquiries_{timestamp()}', ('enquiries',), default_format='csv',
+        ),
+        ExportKind(
+            'admitted_students', ADMITTED_STUDENT_EXPORT,
+            lambda params: filtered_admitted_students(params).order_by('-admission_date'),
+            admitted_students_filename, ('admissions',),
+        ),
+        ExportKind(
+            'receipts', RECEIPT_EXPORT,
+            lambda params: filtered_receipts(params).order_by('-payment_date'),
+            lambda params: f'receipts_{timestamp()}', ('receipts', 'admissions'),
+        ),
+        ExportKind(
+            'students', STUDENT_EXPORT, filtered_students,
+            lambda params: f'admitted_students_{timestamp()}', ('students',),
+        ),
+    ]
+}
@@ -0,0 +1,193 @@
+"""
+Year/month/date filters expressed as half-open ranges.
+
+``field__year`` / ``field__month`` lookups on a DateTimeField are evaluated
+row by row (on SQLite through a Python function when USE_TZ is on), so no
+index can be used. The helpers here turn the same request parameters into
+``field__gte`` / ``field__lt`` bounds computed in the local time zone
+(settings.TIME_ZONE, Asia/Kolkata), which the database answers with an index
+range scan.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import DateTimeField, Max, Min, Q
+from django.utils import timezone
+
+from . import rollups
+from .caching import cached
+from .models import AdmittedStudent, Enquiry, Student
+from .search import search_enquiries, search_students
+
+
+# ================= PARAMETER PARSING =================
+def parse_int(value, low, high):
+    """Integer request parameter within [low, high], or None"""
+    try:
+        number = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return number if low <= number <= high else None
+
+
+def parse_date(value):
+    """YYYY-MM-DD request parameter, or None"""
+    try:
+        return datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+# ================= BOUNDS =================
+def _next_month(day):
+    return date(day.year + 1, 1, 1) if day.month == 12 else date(day.year, day.month + 1, 1)
+
+
+def date_bounds(year=None, month=None, day=None):
+    """[start, end) dates for a day, a month or a year"""
+    if day:
+        return day, day + timedelta(days=1)
+    if month:
+        start = date(year, month, 1)
+        return start, _next_month(start)
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def local_midnight(day):
+    """Aware datetime for 00:00 local time on ``day``"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def range_q(field, start, end, is_datetime=True):
+    if is_datetime:
+        start, end = local_midnight(start), local_midnight(end)
+    return Q(**{f'{field}__gte': start, f'{field}__lt': end})
+
+
+# ================= QUERYSET FILTER =================
+def filter_period(queryset, field, year='', month='', day=''):
+    """
+    Filter ``queryset`` on ``field`` by the usual year/month/date parameters.
+
+    Invalid values are ignored. A month without a year matches that month in
+    every year that has data: one range per year, OR'd together.
+    """
+    is_datetime = isinstance(queryset.model._meta.get_field(field), DateTimeField)
+    year = parse_int(year, 1900, 9999)
+    month = parse_int(month, 1, 12)
+    day = parse_date(day)
+
+    if day:
+        queryset = queryset.filter(range_q(field, *date_bounds(day=day), is_datetime))
+
+    if year:
+        return queryset.filter(range_q(field, *date_bounds(year, month), is_datetime))
+
+    if month:
+        years = _year_span(queryset.model, field, is_datetime)
+        condition = Q(pk__in=[])
+        for each_year in years:
+            condition |= range_q(field, *date_bounds(each_year, month), is_datetime)
+        return queryset.filter(condition)
+
+    return queryset
+
+
+def _year_span(model, field, is_datetime):
+    # MIN/MAX on an indexed column are single index probes
+    bounds = model._default_manager.aggregate(first=Min(field), last=Max(field))
+    if bounds['first'] is None:
+        return []
+    if is_datetime:
+        bounds = {key: timezone.localtime(value) for key, value in bounds.items()}
+    return range(bounds['first'].year, bounds['last'].year + 1)
+
+
+# ================= LIST FILTERS =================
+# Shared by the list pages, their exports and background export jobs, which
+# pass the same GET parameters (a QueryDict or a plain dict).
+def filtered_enquiries(params):
+    enquiries = Enquiry.objects.all().order_by('-created_at')
+
+    search = params.get('search', '')
+    if search:
+        enquiries = search_enquiries(enquiries, search)
+
+    enquiries = filter_period(enquiries, 'created_at', year=params.get('year', ''), month=params.get('month', ''))
+
+    course = params.get('course', '')
+    if course:
+        enquiries = enquiries.filter(course=course)
+
+    return enquiries
+
+
+def filtered_admitted_students(params):
+    students = AdmittedStudent.objects.all()
+
+    search = params.get('search', '')
+    if search:
+        students = search_students(students, search)
+
+    students = filter_period(students, 'admission_date', year=params.get('year', ''), month=params.get('month', ''))
+
+    course = params.get('course', '')
+    if course:
+        students = students.filter(course=course)
+
+    return students
+
+
+def filtered_students(params):
+    """Active students of the older Student model"""
+    students = Student.objects.filter(is_active=True)
+
+    year = params.get('year', '')
+    if year:
+        students = filter_period(students, 'admission_date', year=year, month=params.get('month', ''))
+
+    course_id = parse_int(params.get('course', ''), 1, 2 ** 63 - 1)
+    if course_id:
+        students = students.filter(course_id=course_id)
+
+    return students.order_by('admission_date', 'name')
+
+
+# ================= FACETS AND COUNTS =================
+# Cached (core.caching) until a write to the tables they read
+LIST_FILTER_PARAMS = ('search', 'year', 'month', 'course')
+
+
+def _filter_values(params):
+    return [params.get(key, '') for key in LIST_FILTER_PARAMS]
+
+
+@cached('enquiry_facets', ['enquiries'])
+def enquiry_facets():
+    """Years and courses that have enquiries, for the filter dropdowns"""
+    courses = Enquiry.objects.values_list('course', flat=True).distinct().order_by('course')
+    return {'years': rollups.enquiry_years(), 'courses': list(courses)}
+
+
+@cached('admission_facets', ['admissions'])
+def admission_facets():
+    return {'years': rollups.admission_years()}
+
+
+@cached('enquiry_count', ['enquiries'])
+def _enquiry_count(values):
+    return filtered_enquiries(dict(zip(LIST_FILTER_PARAMS, values))).count()
+
+
+@cached('admitted_student_count', ['admissions'])
+def _admitted_student_count(values):
+    return filtered_admitted_students(dict(zip(LIST_FILTER_PARAMS, values))).count()
+
+
+def count_enquiries(params):
+    """How many enquiries filtered_enquiries(params) matches"""
+    return _enquiry_count(_filter_values(params))
+
+
+def count_admitted_students(params):
+    """How many students filtered_admitted_students(params) matches"""
+    return _admitted_student_count(_filter_values(params))
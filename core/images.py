@@ -0,0 +1,261 @@
+"""
+Student photos.
+
+Uploads are normalized before they are kept: turned upright by their EXIF
+orientation, capped at PHOTO_MAX_EDGE pixels on the longest side and
+re-encoded as JPEG at PHOTO_QUALITY, without the EXIF data. A 4 MB camera
+photo is kept as a few hundred KB. Uploads over PHOTO_INLINE_MAX_BYTES are
+stored as sent and normalized by a small thread pool (PHOTO_THREADS) after
+the request, so the admission form does not wait on decoding them. A file
+Pillow cannot read is refused, never stored as sent.
+
+A card shows a photo at under 2 cm. For each stored photo, downscaled
+copies are written next to it - RENDITION_WIDTHS pixels wide, each as WebP
+and JPEG - under ``renditions/``, named after the original. Their URLs
+follow from the photo's name, so a page of cards needs no lookups:
+``photo_sources()`` gives the ``srcset`` lists the templates and the cards
+API use, and the browser picks the smallest copy that is sharp at the
+element's size.
+
+Photos are named by the hash of their content (core.storage), so a
+rendition's content never changes and it can be cached for a year (see
+core.views.media_file).
+``python manage.py make_photo_renditions`` backfills photos uploaded before
+this existed.
+"""
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from .media import acquire, photo_storage, release
+from .models import AdmittedStudent
+
+logger = logging.getLogger(__name__)
+
+RENDITION_WIDTHS = (96, 192, 384)
+# Shown when nothing picks from the srcset (and in the edit modal's first paint)
+DEFAULT_WIDTH = 192
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def rendition_storage():
+    # Renditions keep the names derived from their photo; the photo storage would hash them
+    return default_storage
+
+
+def rendition_name(name, width, ext):
+    """'student_photos/3f/3f9c...e1.jpg' -> 'student_photos/3f/renditions/3f9c...e1-192w.webp'"""
+    folder, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(folder, 'renditions', f'{stem}-{width}w.{ext}')
+
+
+def _load(source, box):
+    """Image from an open file, upright and in RGB, decoded no larger than needed for ``box``"""
+    image = Image.open(source)
+    # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, far faster than in full
+    image.draft('RGB', (box, box))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def make_renditions(name):
+    """Write every rendition of the photo ``name``; raises OSError for unreadable images"""
+    with photo_storage().open(name, 'rb') as source:
+        image = _load(source, max(RENDITION_WIDTHS))
+    storage = rendition_storage()
+    # Largest first, each resized from the previous one
+    for width in sorted(RENDITION_WIDTHS, reverse=True):
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        for ext, (image_format, options) in RENDITION_FORMATS.items():
+            buffer = BytesIO()
+            image.save(buffer, image_format, **options)
+            target = rendition_name(name, width, ext)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+
+
+def delete_renditions(name):
+    storage = rendition_storage()
+    for width in RENDITION_WIDTHS:
+        for ext in RENDITION_FORMATS:
+            target = rendition_name(name, width, ext)
+            if storage.exists(target):
+                storage.delete(target)
+
+
+def renditions_exist(name):
+    return all(
+        rendition_storage().exists(rendition_name(name, width, ext))
+        for width in RENDITION_WIDTHS for ext in RENDITION_FORMATS
+    )
+
+
+def update_renditions(student, remake=False):
+    """Make the renditions of a student's current photo and record that they exist"""
+    ready = False
+    if student.photo:
+        try:
+            # A photo shared with another student already has them
+            if remake or not renditions_exist(student.photo.name):
+                make_renditions(student.photo.name)
+            ready = True
+        except (OSError, Image.DecompressionBombError):
+            # The original is still shown; the backfill command can retry
+            logger.exception('Could not make renditions of %s', student.photo.name)
+    student.photo_renditions = ready
+    AdmittedStudent.objects.filter(pk=student.pk).update(photo_renditions=ready)
+    return ready
+
+
+# ================= UPLOADS =================
+class PhotoError(ValueError):
+    """The upload cannot be kept as a photo; the message is meant for staff"""
+
+
+def normalize_photo(source):
+    """
+    An uploaded photo as stored: turned upright, no larger than PHOTO_MAX_EDGE
+    on its longest side, re-encoded as JPEG at PHOTO_QUALITY without its EXIF
+    data (camera details, GPS position)
+    """
+    max_edge = settings.PHOTO_MAX_EDGE
+    image = _load(source, max_edge)
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=settings.PHOTO_QUALITY, optimize=True, progressive=True)
+    return ContentFile(buffer.getvalue())
+
+
+def _jpeg_name(name):
+    return f'{posixpath.splitext(posixpath.basename(name))[0]}.jpg'
+
+
+def _store(student, name, content):
+    """Save ``content`` as the student's photo and move the file references over"""
+    previous = student.photo.name
+    student.photo.save(name, content, save=False)
+    AdmittedStudent.objects.filter(pk=student.pk).update(photo=student.photo.name, photo_renditions=False)
+    student.photo_renditions = False
+    acquire(student.photo.name, student.photo.size)
+    release([previous])
+
+
+def upload_error(upload):
+    """Why ``upload`` cannot be a student photo, or None"""
+    if upload.size > settings.PHOTO_MAX_UPLOAD_BYTES:
+        return f'The photo is too large (at most {settings.PHOTO_MAX_UPLOAD_BYTES // (1024 * 1024)} MB)'
+    if upload.content_type and not upload.content_type.startswith('image/'):
+        return 'The photo must be an image file'
+    # The content type is whatever the browser said; check the file itself
+    try:
+        with Image.open(upload) as image:
+            image.verify()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        return 'The photo must be an image file'
+    finally:
+        upload.seek(0)
+    return None
+
+
+def attach_photo(student, upload):
+    """
+    Store ``upload`` as a saved student's photo. Uploads up to
+    PHOTO_INLINE_MAX_BYTES are normalized here; larger ones are stored as they
+    came and normalized in the photo thread pool once the transaction commits.
+    """
+    if upload.size <= settings.PHOTO_INLINE_MAX_BYTES:
+        try:
+            content = normalize_photo(upload)
+        except (OSError, Image.DecompressionBombError):
+            raise PhotoError('The photo could not be read as an image')
+        _store(student, _jpeg_name(upload.name), content)
+        update_renditions(student)
+        return
+
+    _store(student, upload.name, upload)
+    name = student.photo.name
+    transaction.on_commit(lambda: _thread_pool().submit(process_in_thread, student.pk, name))
+
+
+def _thread_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.PHOTO_THREADS, thread_name_prefix='photo')
+        return _pool
+
+
+def process_in_thread(student_id, name):
+    try:
+        process_photo(student_id, name)
+    except Exception:
+        logger.exception('Could not process photo %s', name)
+    finally:
+        # Each pool thread has its own connection; don't leave it open
+        connection.close()
+
+
+def process_photo(student_id, name):
+    """Normalize a photo stored as uploaded, swap it in and make its renditions"""
+    storage = photo_storage()
+    try:
+        with storage.open(name, 'rb') as source:
+            content = normalize_photo(source)
+    except (OSError, Image.DecompressionBombError):
+        # Never keep an upload as sent, with its EXIF data
+        if AdmittedStudent.objects.filter(pk=student_id, photo=name).update(photo=None, photo_renditions=False):
+            release([name])
+        raise
+    field = AdmittedStudent._meta.get_field('photo')
+    normalized = storage.save(field.generate_filename(None, _jpeg_name(name)), content)
+
+    acquire(normalized, content.size)
+    # Only if the student still has this photo (not replaced or deleted meanwhile)
+    if AdmittedStudent.objects.filter(pk=student_id, photo=name).update(photo=normalized):
+        release([name])
+    else:
+        release([normalized])
+        return
+    student = AdmittedStudent.objects.only('id', 'photo').get(pk=student_id)
+    update_renditions(student)
+
+
+def photo_sources(name, has_renditions, storage=None):
+    """{'url', 'srcset', 'webp_srcset'} for a photo; only 'url' (the original) until renditions exist"""
+    if not name:
+        return {'url': '', 'srcset': '', 'webp_srcset': ''}
+    if not has_renditions:
+        return {'url': (storage or photo_storage()).url(name), 'srcset': '', 'webp_srcset': ''}
+    storage = rendition_storage()
+
+    def srcset(ext):
+        return ', '.join(f'{storage.url(rendition_name(name, width, ext))} {width}w' for width in RENDITION_WIDTHS)
+
+    return {
+        'url': storage.url(rendition_name(name, DEFAULT_WIDTH, 'jpg')),
+        'srcset': srcset('jpg'),
+        'webp_srcset': srcset('webp'),
+    }
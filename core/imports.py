@@ -0,0 +1,331 @@
+"""
+Bulk admission import.
+
+Spreadsheets of admissions (.xlsx or .csv) are read row by row - openpyxl in
+``read_only`` mode or the csv module, so the file is never loaded whole -
+and each row is checked against the same rules as the admission form and
+the AdmittedStudent field definitions. Valid rows are inserted with
+``bulk_create()`` in batches, each batch in its own transaction, and
+``post_bulk_create`` (core.signals) brings the rollups, the typeahead index
+and the data versions up to date once per batch instead of once per row.
+
+A dry run does all of the checking and reports what would happen without
+writing anything. Rows that fail are collected with their original values
+and error messages, for an error file the sender can fix and re-import.
+
+Columns are matched by name, case- and punctuation-insensitively, so a file
+produced by the admitted students export imports as it is.
+"""
+import codecs
+import csv
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+import openpyxl
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from .models import AdmittedStudent, normalize_mobile
+from .signals import post_bulk_create
+from .streaming import csv_chunks
+
+IMPORT_BATCH_SIZE = 500
+
+IMPORT_FIELDS = (
+    'course', 'custom_course', 'student_name', 'father_name', 'surname', 'mother_name', 'full_name',
+    'date_of_birth', 'mobile_own', 'parent_mobile', 'gender', 'marital_status', 'address', 'city',
+    'tehsil_block', 'district', 'pin_code', 'educational_qualification', 'total_fees', 'paid_fees',
+)
+# Needed in every file; full_name is built from the name parts when absent
+REQUIRED_COLUMNS = (
+    'course', 'student_name', 'father_name', 'surname', 'mother_name', 'date_of_birth', 'mobile_own',
+    'gender', 'marital_status', 'address', 'city', 'tehsil_block', 'district', 'pin_code',
+    'educational_qualification',
+)
+# Other headers partner centres use for the same columns
+COLUMN_ALIASES = {
+    'mobile': 'mobile_own',
+    'phone': 'mobile_own',
+    'parent_phone': 'parent_mobile',
+    'dob': 'date_of_birth',
+    'pincode': 'pin_code',
+    'tehsil': 'tehsil_block',
+    'qualification': 'educational_qualification',
+    'education': 'educational_qualification',
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y')
+PIN_CODE_RE = re.compile(r'^\d{6}$')
+
+
+class ImportFileError(Exception):
+    """The file as a whole cannot be imported (unreadable, columns missing)"""
+
+
+# ================= READING =================
+def column_key(header, aliases=COLUMN_ALIASES):
+    """'Mobile (Own)' -> 'mobile_own', 'Tehsil/Block' -> 'tehsil_block'"""
+    key = re.sub(r'[^a-z0-9]+', '_', str(header or '').lower()).strip('_')
+    return aliases.get(key, key)
+
+
+def cell_text(value):
+    """Spreadsheet cell as text: whole numbers without '.0', dates as YYYY-MM-DD"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _xlsx_rows(source):
+    try:
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f'Could not read the workbook: {e}')
+    try:
+        for values in workbook.worksheets[0].iter_rows(values_only=True):
+            yield [cell_text(value) for value in values]
+    finally:
+        workbook.close()
+
+
+def _csv_rows(source):
+    lines = codecs.iterdecode(source, 'utf-8-sig')
+    try:
+        for values in csv.reader(lines):
+            yield [value.strip() for value in values]
+    except UnicodeDecodeError:
+        raise ImportFileError('The CSV file is not UTF-8 text')
+
+
+def read_rows(source, filename):
+    """(headers, iterator of (row number, {header: text})) for an .xlsx or .csv file"""
+    if filename.lower().endswith('.xlsx'):
+        rows = _xlsx_rows(source)
+    elif filename.lower().endswith('.csv'):
+        rows = _csv_rows(source)
+    else:
+        raise ImportFileError('Upload an .xlsx or .csv file')
+
+    headers = next(rows, None)
+    if not headers or not any(headers):
+        raise ImportFileError('The file is empty')
+    while headers and not headers[-1]:
+        headers.pop()
+
+    def records():
+        for number, values in enumerate(rows, 2):
+            if any(values):
+                yield number, dict(zip(headers, values))
+
+    return headers, records()
+
+
+# ================= VALIDATION =================
+def _choice(value, choices):
+    """The choice matching ``value`` regardless of case, or the value itself"""
+    for option, _ in choices:
+        if option.lower() == value.lower():
+            return option
+    return value
+
+
+def parse_date(value):
+    for pattern in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, pattern).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_decimal(value, default=None):
+    """'12,500.00' -> Decimal('12500.00'); ``default`` when blank, None when not a number"""
+    if value == '':
+        return None if default is None else Decimal(default)
+    try:
+        return Decimal(value.replace(',', '').replace('₹', '').strip())
+    except InvalidOperation:
+        return None
+
+
+def build_student(values):
+    """(unsaved AdmittedStudent, {field: [messages]}) for one row's values by field"""
+    errors = {}
+    data = {field: values.get(field, '') for field in IMPORT_FIELDS}
+
+    data['course'] = _choice(data['course'], AdmittedStudent.COURSE_CHOICES)
+    data['gender'] = _choice(data['gender'], AdmittedStudent.GENDER_CHOICES)
+    data['marital_status'] = _choice(data['marital_status'], AdmittedStudent.MARITAL_STATUS_CHOICES)
+    # Same rules as the admission form
+    data['custom_course'] = data['custom_course'] if data['course'] == 'Other' else ''
+    if not data['full_name']:
+        data['full_name'] = ' '.join(
+            part for part in (data['student_name'], data['father_name'], data['surname']) if part
+        )
+
+    birth_date = parse_date(data['date_of_birth'])
+    if data['date_of_birth'] and birth_date is None:
+        errors['date_of_birth'] = ['Enter the date as DD-MM-YYYY or YYYY-MM-DD.']
+    data['date_of_birth'] = birth_date
+
+    for field in ('mobile_own', 'parent_mobile'):
+        if data[field]:
+            digits = normalize_mobile(data[field])
+            if len(digits) != 10:
+                errors[field] = ['Enter a 10-digit mobile number.']
+            data[field] = digits
+    if data['pin_code'] and not PIN_CODE_RE.match(data['pin_code']):
+        errors['pin_code'] = ['Enter a 6-digit pin code.']
+
+    for field, default in (('total_fees', '5000'), ('paid_fees', '0')):
+        data[field] = parse_decimal(data[field], default)
+        if data[field] is None:
+            errors[field] = ['Enter a number.']
+
+    student = AdmittedStudent(**data)
+    try:
+        student.full_clean(
+            exclude=['photo', *errors], validate_unique=False, validate_constraints=False,
+        )
+    except ValidationError as e:
+        for field, messages in e.message_dict.items():
+            errors.setdefault(field, []).extend(messages)
+
+    if not errors and student.paid_fees > student.total_fees:
+        errors['paid_fees'] = ['Paid fees cannot be more than the total fees.']
+
+    student.opening_paid_fees = student.paid_fees
+    student.sync_mobile_digits()
+    return student, errors
+
+
+def _duplicate_key(student):
+    return student.mobile_own_digits, student.full_name.strip().lower()
+
+
+def _existing_keys(students):
+    """Keys of rows already admitted (same mobile number and full name)"""
+    mobiles = {student.mobile_own_digits for student in students}
+    existing = AdmittedStudent.objects.filter(mobile_own_digits__in=mobiles).values_list(
+        'mobile_own_digits', 'full_name'
+    )
+    return {(mobile, name.strip().lower()) for mobile, name in existing}
+
+
+def _message(errors):
+    return '; '.join(
+        f"{field.replace('_', ' ')}: {' '.join(messages)}" if field != '__all__' else ' '.join(messages)
+        for field, messages in errors.items()
+    )
+
+
+# ================= IMPORT =================
+class ImportResult:
+    def __init__(self, headers, dry_run):
+        self.headers = headers
+        self.dry_run = dry_run
+        self.rows = 0
+        self.imported = 0
+        # (row number, {header: text}, message)
+        self.errors = []
+
+    @property
+    def valid(self):
+        return self.rows - len(self.errors)
+
+    def error_file_chunks(self):
+        """CSV of the failed rows as they were sent, with the reason for each"""
+        rows = (
+            [number, *[values.get(header, '') for header in self.headers], message]
+            for number, values, message in self.errors
+        )
+        return csv_chunks(['Row', *self.headers, 'Errors'], rows)
+
+    def summary(self, max_errors=200):
+        return {
+            'dry_run': self.dry_run,
+            'rows': self.rows,
+            'valid': self.valid,
+            'imported': self.imported,
+            'failed': len(self.errors),
+            'errors': [
+                {'row': number, 'error': message}
+                for number, _, message in self.errors[:max_errors]
+            ],
+        }
+
+
+def _check_columns(headers):
+    keys = [column_key(header) for header in headers]
+    missing = [field for field in REQUIRED_COLUMNS if field not in keys]
+    if missing:
+        names = ', '.join(field.replace('_', ' ') for field in missing)
+        raise ImportFileError(f'Missing columns: {names}')
+    # First header for each field wins; columns that match no field are ignored
+    columns = {}
+    for header, key in zip(headers, keys):
+        if key in IMPORT_FIELDS:
+            columns.setdefault(key, header)
+    return columns
+
+
+def _save_batch(batch, result):
+    """Insert one batch of validated rows in a transaction; on failure report every row"""
+    try:
+        with transaction.atomic():
+            created = AdmittedStudent.objects.bulk_create([student for _, _, student in batch])
+            post_bulk_create.send(sender=AdmittedStudent, instances=created)
+    except DatabaseError as e:
+        result.errors.extend((number, values, f'Not saved: {e}') for number, values, _ in batch)
+        return
+    result.imported += len(created)
+
+
+def import_admissions(source, filename, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import admissions from an open .xlsx/.csv file. Returns an ImportResult;
+    raises ImportFileError when the file itself is unusable.
+    """
+    headers, records = read_rows(source, filename)
+    columns = _check_columns(headers)
+    result = ImportResult(headers, dry_run)
+    seen = set()
+
+    def flush(pending):
+        existing = _existing_keys([student for _, _, student in pending])
+        batch = []
+        for number, values, student in pending:
+            key = _duplicate_key(student)
+            if key in existing:
+                result.errors.append((number, values, 'Already admitted (same full name and mobile).'))
+            elif key in seen:
+                result.errors.append((number, values, 'Repeated earlier in this file.'))
+            else:
+                seen.add(key)
+                batch.append((number, values, student))
+        if batch and not dry_run:
+            _save_batch(batch, result)
+
+    pending = []
+    for number, values in records:
+        result.rows += 1
+        student, errors = build_student({field: values.get(header, '') for field, header in columns.items()})
+        if errors:
+            result.errors.append((number, values, _message(errors)))
+            continue
+        pending.append((number, values, student))
+        if len(pending) >= batch_size:
+            flush(pending)
+            pending = []
+    if pending:
+        flush(pending)
+
+    result.errors.sort(key=lambda error: error[0])
+    return result
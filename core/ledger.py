@@ -0,0 +1,163 @@
+"""
+Fee ledger.
+
+A student's ``paid_fees`` changes only here, and every change is a single
+conditional UPDATE: ``paid_fees = paid_fees + delta, version = version + 1``
+for the row whose version is still the one just read. Nothing holds a row
+lock between the read and the write, so several fee counters can post at
+once; when another writer got in first the UPDATE matches no row and the
+change is re-read, re-checked and retried.
+
+The student read before the update is returned, so the caller can record
+the receipt's "paid before / remaining after" snapshot from the same state
+the update was applied to. Call these inside the transaction that writes
+the receipt.
+
+Each receipt also records the paid fees before it and the fees remaining
+after it. When a receipt is edited or deleted, ``restate()`` re-chains only
+the receipts from that point on, with a running sum (a window function)
+over their amounts, and writes back the ones that changed with one
+``bulk_update()``; ``rechain()`` does the same after a receipt is inserted,
+which need not be the latest (a back-dated bank settlement). ``drifted()`` finds, in one aggregate query, the
+students whose paid fees no longer match their receipts (see the
+``reconcile_fees`` command).
+"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Q, Sum, Value, Window
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import AdmittedStudent, FeePayment
+from .signals import post_bulk_update
+
+LEDGER_ATTEMPTS = 5
+
+# A student's receipts in the order their snapshots chain
+RECEIPT_ORDER = ('payment_date', 'id')
+
+
+class LedgerError(Exception):
+    """The change was refused; the message is meant for staff"""
+
+
+class LedgerConflict(LedgerError):
+    """Other writers kept changing the student's fees; nothing was changed"""
+
+
+def _apply(student_id, delta, check=None):
+    for _ in range(LEDGER_ATTEMPTS):
+        student = AdmittedStudent.objects.get(pk=student_id)
+        if check:
+            check(student)
+        updated = AdmittedStudent.objects.filter(pk=student_id, version=student.version).update(
+            # Never below zero, as when a receipt recorded before an edit is deleted
+            paid_fees=Greatest(F('paid_fees') + delta, Value(Decimal(0))),
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            post_bulk_update.send(sender=AdmittedStudent, instances=[student])
+            return student
+    raise LedgerConflict('The fees of this student are being changed elsewhere; please try again')
+
+
+def pay(student_id, amount):
+    """Add a payment of ``amount``; refused when it is more than the remaining fees"""
+    def check(student):
+        if amount > student.remaining_fees:
+            raise LedgerError(f'Payment amount cannot exceed remaining fees (₹{student.remaining_fees})')
+
+    return _apply(student_id, amount, check)
+
+
+def adjust(student_id, delta):
+    """Correct the paid fees by ``delta`` (an edited or deleted receipt), not going below zero"""
+    return _apply(student_id, delta)
+
+
+# ================= RECEIPT SNAPSHOTS =================
+def opening_balance(student_id):
+    """Fees paid before the student's first receipt (entered with the admission or import)"""
+    return AdmittedStudent.objects.values_list('opening_paid_fees', flat=True).get(pk=student_id)
+
+
+def _from(start):
+    payment_date, pk = start
+    return Q(payment_date__gt=payment_date) | Q(payment_date=payment_date, id__gte=pk)
+
+
+def restate(student_id, start, opening):
+    """
+    Recompute paid_before_this / remaining_after_this of the student's receipts
+    at or after ``start`` - a (payment_date, id) position. The chain continues
+    from the receipt before ``start``, or from ``opening`` when there is none.
+    Returns the number of receipts rewritten.
+    """
+    payments = FeePayment.objects.filter(student_id=student_id)
+    previous = (
+        payments.exclude(_from(start))
+        .order_by(*(f'-{field}' for field in RECEIPT_ORDER))
+        .values_list('paid_before_this', 'amount')
+        .first()
+    )
+    base = sum(previous) if previous else opening
+
+    suffix = payments.filter(_from(start)).annotate(
+        running=Window(Sum('amount'), order_by=[F(field).asc() for field in RECEIPT_ORDER]),
+    ).order_by(*RECEIPT_ORDER)
+
+    changed = []
+    now = timezone.now()
+    for payment in suffix:
+        paid_before = base + payment.running - payment.amount
+        remaining = payment.total_fees_at_payment - paid_before - payment.amount
+        if (payment.paid_before_this, payment.remaining_after_this) != (paid_before, remaining):
+            payment.paid_before_this = paid_before
+            payment.remaining_after_this = remaining
+            # Resent to clients syncing the receipts list
+            payment.updated_at = now
+            changed.append(payment)
+
+    if changed:
+        FeePayment.objects.bulk_update(changed, ['paid_before_this', 'remaining_after_this', 'updated_at'])
+        post_bulk_update.send(sender=FeePayment, instances=changed)
+    return len(changed)
+
+
+def rechain(student_id, payments):
+    """
+    Restate the student's receipts after ``payments`` were added, wherever
+    they fall in the chain: a back-dated receipt shifts every later one
+    """
+    start = min((payment.payment_date, payment.id) for payment in payments)
+    return restate(student_id, start, opening_balance(student_id))
+
+
+# ================= RECONCILIATION =================
+def drifted():
+    """
+    Students whose paid_fees differ from their opening balance plus the sum of
+    their receipts, annotated with ``expected`` and ``receipt_count``; one query
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return (
+        AdmittedStudent.objects
+        .annotate(
+            receipt_count=Count('fee_payments'),
+            expected=F('opening_paid_fees')
+            + Coalesce(Sum('fee_payments__amount'), Value(Decimal(0)), output_field=money),
+        )
+        .exclude(paid_fees=F('expected'))
+        .order_by('id')
+    )
+
+
+def repair(student, expected):
+    """Set a drifted student's paid fees to ``expected``; False if it changed meanwhile"""
+    updated = AdmittedStudent.objects.filter(pk=student.pk, version=student.version).update(
+        paid_fees=expected, version=F('version') + 1, updated_at=timezone.now(),
+    )
+    if updated:
+        post_bulk_update.send(sender=AdmittedStudent, instances=[student])
+    return bool(updated)
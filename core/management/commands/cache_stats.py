@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Importing filters and rollups registers their cached functions
+from core import caching, filters, rollups
+
+
+class Command(BaseCommand):
+    help = "Show the hit/miss counters of the cached facets, counts and dashboard figures"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Set the counters back to zero afterwards")
+
+    def handle(self, *args, **options):
+        if settings.CACHE_BACKEND == 'locmem':
+            self.stdout.write(self.style.WARNING(
+                "CACHE_BACKEND is 'locmem': each process counts for itself, use the /api/cache-stats/ view"
+            ))
+        for name, counts in caching.stats().items():
+            rate = f"{counts['hit_rate']:.1%}" if counts['hit_rate'] is not None else '-'
+            self.stdout.write(f"{name:<24} {counts['hits']:>8} hits {counts['misses']:>8} misses  {rate}")
+        if options['reset']:
+            caching.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import IMPORT_BATCH_SIZE, ImportFileError, import_admissions
+
+
+class Command(BaseCommand):
+    help = "Import admissions from an .xlsx or .csv file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Spreadsheet to import (.xlsx or .csv)")
+        parser.add_argument('--dry-run', action='store_true', help="Check every row but save nothing")
+        parser.add_argument('--errors', help="Write the rows that failed, with reasons, to this CSV file")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help="Rows per insert and transaction")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as source:
+                result = import_admissions(
+                    source, options['path'], dry_run=options['dry_run'], batch_size=options['batch_size'],
+                )
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for number, _, message in result.errors[:20]:
+            self.stdout.write(f"Row {number}: {message}")
+        if len(result.errors) > 20:
+            self.stdout.write(f"... and {len(result.errors) - 20} more")
+
+        if options['errors'] and result.errors:
+            with open(options['errors'], 'wb') as output:
+                for chunk in result.error_file_chunks():
+                    output.write(chunk)
+            self.stdout.write(f"Failed rows written to {options['errors']}")
+
+        if result.dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f"Dry run: {result.rows} rows, {result.valid} would be imported, {len(result.errors)} have errors"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Imported {result.imported} of {result.rows} rows ({len(result.errors)} failed)"
+            ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import ImportFileError
+from core.settlements import SETTLEMENT_MODES, import_settlement
+
+
+class Command(BaseCommand):
+    help = "Post the payments in a bank/UPI statement file; unmatched rows go to the review queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Statement to import (.xlsx or .csv)")
+        parser.add_argument('--mode', choices=SETTLEMENT_MODES, default='UPI', help="Payment mode of the statement")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as source:
+                settlement = import_settlement(source, options['path'], options['mode'])
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{settlement.rows_total} rows: {settlement.matched} posted, "
+            f"{settlement.queued_for_review} sent for review, {settlement.duplicates} already imported"
+        ))
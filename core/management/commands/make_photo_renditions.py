@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core import images
+from core.models import AdmittedStudent
+
+
+class Command(BaseCommand):
+    help = "Make the downscaled copies of student photos that do not have them yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Remake the copies of every photo")
+
+    def handle(self, *args, **options):
+        students = AdmittedStudent.objects.exclude(photo='').exclude(photo__isnull=True).only('id', 'photo')
+        if not options['all']:
+            students = students.filter(photo_renditions=False)
+
+        made = failed = 0
+        for student in students.iterator(chunk_size=200):
+            if images.update_renditions(student, remake=options['all']):
+                made += 1
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"{student.id}: could not read {student.photo.name}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Renditions made for {made} photos, {failed} failed"))
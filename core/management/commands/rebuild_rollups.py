@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core import rollups, versions
+from core.models import AdmissionRollup, EnquiryRollup, CollectionRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the admission, enquiry and collection rollup tables from scratch"
+
+    def handle(self, *args, **options):
+        rollups.rebuild()
+        # Cached dashboard figures were computed from the old rollups
+        for name in ('enquiries', 'admissions', 'receipts'):
+            versions.bump(name)
+
+        for model in (AdmissionRollup, EnquiryRollup, CollectionRollup):
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {model.objects.count()} rows")
+        self.stdout.write(self.style.SUCCESS("Rollups rebuilt successfully"))
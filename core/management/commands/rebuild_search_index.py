@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = "Create (if missing) and repopulate the full-text search indexes"
+
+    def handle(self, *args, **options):
+        search.rebuild_indexes()
+        self.stdout.write(self.style.SUCCESS("Search indexes rebuilt successfully"))
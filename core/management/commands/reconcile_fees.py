@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core import ledger
+
+
+class Command(BaseCommand):
+    help = "Check every student's paid fees against their receipts; --repair fixes the ones that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help="Set paid fees to the opening balance plus the receipts' total")
+
+    def handle(self, *args, **options):
+        drifted = repaired = 0
+        for student in ledger.drifted().iterator(chunk_size=500):
+            drifted += 1
+            self.stdout.write(
+                f"{student.id} {student.full_name}: paid {student.paid_fees}, receipts {student.expected}"
+                f" ({student.receipt_count} receipts)"
+            )
+            if options['repair']:
+                if ledger.repair(student, student.expected):
+                    repaired += 1
+                else:
+                    self.stdout.write(self.style.WARNING(f"{student.id} changed while checking; run again"))
+
+        self.stdout.write(self.style.SUCCESS(f"{drifted} students drifted, {repaired} repaired"))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import export_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background exports (use with EXPORT_JOB_RUNNER = 'worker')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run the jobs waiting now, then exit")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds between polls of the queue")
+
+    def handle(self, *args, **options):
+        while True:
+            ran = export_jobs.run_queued()
+            purged = export_jobs.purge_expired()
+            failed = export_jobs.fail_stale()
+            if ran or purged or failed:
+                self.stdout.write(f"Exports run: {ran}, expired files removed: {purged}, interrupted: {failed}")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS("Export worker finished"))
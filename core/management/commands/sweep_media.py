@@ -0,0 +1,26 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core import media
+
+
+class Command(BaseCommand):
+    help = "Delete stored photos that no student uses any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Sweep once, then exit")
+        parser.add_argument('--interval', type=float, default=600.0, help="Seconds between sweeps")
+        parser.add_argument('--grace', type=float, help="Minutes a file must have been unused (default: settings)")
+
+    def handle(self, *args, **options):
+        grace = timedelta(minutes=options['grace']) if options['grace'] is not None else None
+        while True:
+            removed, freed = media.sweep(grace)
+            if removed:
+                self.stdout.write(f"Removed {removed} unused files ({freed // 1024} KB)")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS("Media sweep finished"))
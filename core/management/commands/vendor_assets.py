@@ -0,0 +1,29 @@
+from pathlib import Path
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Download the pinned VENDOR_ASSETS libraries into static/, to be committed and served locally"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Download files that are already there again")
+
+    def handle(self, *args, **options):
+        static_dir = Path(settings.STATICFILES_DIRS[0])
+        for path, url in settings.VENDOR_ASSETS.items():
+            target = static_dir / path
+            if target.exists() and not options['force']:
+                self.stdout.write(f"{path}: already vendored")
+                continue
+            try:
+                with urlopen(url, timeout=30) as response:
+                    content = response.read()
+            except OSError as exc:
+                raise CommandError(f"Could not download {url}: {exc}")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(content)
+            self.stdout.write(self.style.SUCCESS(f"{path}: {len(content) // 1024} KB from {url}"))
+        self.stdout.write("Commit the files under static/ and run collectstatic to deploy them")
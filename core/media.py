@@ -0,0 +1,79 @@
+"""
+Reference counts for stored media files.
+
+Photos live in content-addressed storage (core.storage), where one file can
+be shared by several students. Each file has a MediaBlob row counting the
+rows that point at it: ``acquire()`` when a student takes a file,
+``release()`` when the student drops it or is deleted. Both are single
+UPDATEs, so deleting hundreds of students inside a transaction touches no
+files at all.
+
+A file whose count reached zero is removed by ``sweep()`` - run by
+``python manage.py sweep_media`` - once it has been unused for
+MEDIA_SWEEP_GRACE_MINUTES, which leaves room for an upload that found the
+file already stored and is about to acquire it. Before deleting, the sweeper
+checks that no student points at the file, so a count that went wrong never
+costs a photo.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AdmittedStudent, MediaBlob
+
+
+def photo_storage():
+    return AdmittedStudent._meta.get_field('photo').storage
+
+
+def acquire(name, size=0):
+    """Count one more reference to the stored file ``name``"""
+    if MediaBlob.objects.filter(name=name).update(refs=F('refs') + 1, released_at=None):
+        return
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, size=size, refs=1)
+    except IntegrityError:
+        # Registered by a concurrent upload in the meantime
+        MediaBlob.objects.filter(name=name).update(refs=F('refs') + 1, released_at=None)
+
+
+def release(names):
+    """Count one reference less to each of ``names`` (repeats count once each)"""
+    by_count = {}
+    for name, count in Counter(name for name in names if name).items():
+        by_count.setdefault(count, []).append(name)
+    now = timezone.now()
+    for count, group in by_count.items():
+        MediaBlob.objects.filter(name__in=group).update(refs=F('refs') - count, released_at=now)
+
+
+def sweep(grace=None):
+    """Delete the files unused for longer than ``grace``; returns (files removed, bytes freed)"""
+    from .images import delete_renditions
+
+    if grace is None:
+        grace = timedelta(minutes=settings.MEDIA_SWEEP_GRACE_MINUTES)
+    candidates = MediaBlob.objects.filter(refs__lte=0, released_at__lte=timezone.now() - grace)
+    storage = photo_storage()
+    removed = freed = 0
+    for blob in candidates.iterator(chunk_size=500):
+        if AdmittedStudent.objects.filter(photo=blob.name).exists():
+            # Still in use after all: put the count right instead
+            MediaBlob.objects.filter(pk=blob.pk).update(
+                refs=AdmittedStudent.objects.filter(photo=blob.name).count(), released_at=None,
+            )
+            continue
+        # Claim the row first, so two sweepers never both delete the file
+        if not MediaBlob.objects.filter(pk=blob.pk, refs__lte=0, released_at=blob.released_at).delete()[0]:
+            continue
+        if storage.exists(blob.name):
+            storage.delete(blob.name)
+        delete_renditions(blob.name)
+        removed += 1
+        freed += blob.size
+    return removed, freed
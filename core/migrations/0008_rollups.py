@@ -0,0 +1,109 @@
+# Generated by Django 6.0 on 2026-10-18 11:29
+
+from django.db import migrations, models
+from django.db.models import Case, Count, DateField, F, Sum, When
+from django.db.models.functions import Trunc
+
+
+def _course_label(prefix=''):
+    # Frozen copy of core.stats.course_label
+    return Case(
+        When(**{f'{prefix}course': 'Other', f'{prefix}custom_course__gt': '', 'then': F(f'{prefix}custom_course')}),
+        default=F(f'{prefix}course'),
+    )
+
+
+def backfill_rollups(apps, schema_editor):
+    # Frozen copy of core.rollups.rebuild as of this migration
+    Enquiry = apps.get_model('core', 'Enquiry')
+    AdmittedStudent = apps.get_model('core', 'AdmittedStudent')
+    FeePayment = apps.get_model('core', 'FeePayment')
+    AdmissionRollup = apps.get_model('core', 'AdmissionRollup')
+    EnquiryRollup = apps.get_model('core', 'EnquiryRollup')
+    CollectionRollup = apps.get_model('core', 'CollectionRollup')
+
+    for period in ('day', 'month', 'year'):
+        rows = (
+            AdmittedStudent.objects.order_by()
+            .annotate(period_start=Trunc('admission_date', period, output_field=DateField()),
+                      course_name=_course_label())
+            .values('period_start', 'course', 'course_name')
+            .annotate(count=Count('id'))
+        )
+        AdmissionRollup.objects.bulk_create(AdmissionRollup(period=period, **row) for row in rows)
+
+        rows = (
+            Enquiry.objects.order_by()
+            .annotate(period_start=Trunc('created_at', period, output_field=DateField()))
+            .values('period_start', 'course')
+            .annotate(count=Count('id'))
+        )
+        EnquiryRollup.objects.bulk_create(EnquiryRollup(period=period, **row) for row in rows)
+
+        rows = (
+            FeePayment.objects.order_by()
+            .annotate(period_start=Trunc('payment_date', period, output_field=DateField()),
+                      course_name=_course_label('student__'))
+            .values('period_start', 'course_name', 'payment_mode')
+            .annotate(count=Count('id'), amount=Sum('amount'))
+        )
+        CollectionRollup.objects.bulk_create(CollectionRollup(period=period, **row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_admittedstudent_paid_fees_admittedstudent_total_fees'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdmissionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month'), ('year', 'Year')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('course', models.CharField(max_length=50)),
+                ('course_name', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Admission Rollup',
+                'verbose_name_plural': 'Admission Rollups',
+                'unique_together': {('period', 'period_start', 'course', 'course_name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CollectionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month'), ('year', 'Year')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('course_name', models.CharField(max_length=100)),
+                ('payment_mode', models.CharField(max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Collection Rollup',
+                'verbose_name_plural': 'Collection Rollups',
+                'unique_together': {('period', 'period_start', 'course_name', 'payment_mode')},
+            },
+        ),
+        migrations.CreateModel(
+            name='EnquiryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month'), ('year', 'Year')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('course', models.CharField(max_length=50)),
+            ],
+            options={
+                'verbose_name': 'Enquiry Rollup',
+                'verbose_name_plural': 'Enquiry Rollups',
+                'unique_together': {('period', 'period_start', 'course')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='admittedstudent',
+            index=models.Index(fields=['admission_date'], name='admitted_admission_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='admittedstudent',
+            index=models.Index(fields=['course', 'admission_date'], name='admitted_course_admission_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enquiry',
+            index=models.Index(fields=['created_at'], name='enquiry_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enquiry',
+            index=models.Index(fields=['course', 'created_at'], name='enquiry_course_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feepayment',
+            index=models.Index(fields=['payment_date'], name='feepayment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feepayment',
+            index=models.Index(fields=['payment_mode', 'payment_date'], name='feepayment_mode_date_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 6.0 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+
+def _normalize(value):
+    # Frozen copy of core.models.normalize_mobile
+    digits = ''.join(ch for ch in (value or '') if ch.isdigit())
+    if len(digits) > 10 and (digits.startswith('91') or digits.startswith('0')):
+        digits = digits[-10:]
+    return digits
+
+
+def backfill_mobiles(apps, schema_editor):
+    for model_name, fields in (
+        ('AdmittedStudent', ('mobile_own', 'parent_mobile')),
+        ('Enquiry', ('mobile',)),
+    ):
+        model = apps.get_model('core', model_name)
+        updated = []
+        for row in model.objects.only('id', *fields).iterator(chunk_size=2000):
+            for field in fields:
+                digits = _normalize(getattr(row, field))
+                setattr(row, f'{field}_digits', digits)
+                setattr(row, f'{field}_reversed', digits[::-1])
+            updated.append(row)
+        derived = [f'{field}{suffix}' for field in fields for suffix in ('_digits', '_reversed')]
+        model.objects.bulk_update(updated, derived, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_date_range_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='admittedstudent',
+            name='mobile_own_digits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddField(
+            model_name='admittedstudent',
+            name='mobile_own_reversed',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddField(
+            model_name='admittedstudent',
+            name='parent_mobile_digits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddField(
+            model_name='admittedstudent',
+            name='parent_mobile_reversed',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddField(
+            model_name='enquiry',
+            name='mobile_digits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddField(
+            model_name='enquiry',
+            name='mobile_reversed',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.RunPython(backfill_mobiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_normalized_mobiles'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='admittedstudent',
+            name='admitted_admission_idx',
+        ),
+        migrations.AddIndex(
+            model_name='admittedstudent',
+            index=models.Index(fields=['admission_date', 'id'], name='admitted_admission_id_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_admission_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('receipt_id', models.IntegerField()),
+                ('receipt_no', models.CharField(max_length=50)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Receipt Tombstone',
+                'verbose_name_plural': 'Receipt Tombstones',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feepayment',
+            index=models.Index(fields=['updated_at', 'id'], name='feepayment_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipttombstone',
+            index=models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ),
+    ]
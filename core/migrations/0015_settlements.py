@@ -0,0 +1,73 @@
+# Generated by Django 6.0 on 2026-10-18 11:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_data_versions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feepayment',
+            name='settlement_ref',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='feepayment',
+            name='payment_date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='SettlementImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255)),
+                ('payment_mode', models.CharField(choices=[('Cash', 'Cash'), ('UPI', 'UPI'), ('Card', 'Card'), ('Bank Transfer', 'Bank Transfer')], max_length=20)),
+                ('rows_total', models.IntegerField(default=0)),
+                ('matched', models.IntegerField(default=0)),
+                ('queued_for_review', models.IntegerField(default=0)),
+                ('duplicates', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Settlement Import',
+                'verbose_name_plural': 'Settlement Imports',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SettlementReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_number', models.IntegerField()),
+                ('reference', models.CharField(blank=True, max_length=64)),
+                ('payer_name', models.CharField(blank=True, max_length=200)),
+                ('payer_mobile', models.CharField(blank=True, max_length=20)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('paid_on', models.DateTimeField(blank=True, null=True)),
+                ('reason', models.CharField(choices=[('no_match', 'No matching student'), ('ambiguous', 'More than one matching student'), ('over_remaining', 'More than the remaining fees'), ('invalid', 'Incomplete row')], max_length=20)),
+                ('candidate_ids', models.JSONField(blank=True, default=list)),
+                ('raw', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('posted', 'Posted'), ('dismissed', 'Dismissed')], default='pending', max_length=10)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.feepayment')),
+                ('resolved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('settlement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='core.settlementimport')),
+            ],
+            options={
+                'verbose_name': 'Settlement Review',
+                'verbose_name_plural': 'Settlement Reviews',
+                'ordering': ['created_at', 'row_number'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='settlementreview_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_receipt_sequences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='admittedstudent',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
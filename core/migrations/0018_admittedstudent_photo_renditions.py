@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_admittedstudent_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='admittedstudent',
+            name='photo_renditions',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-18 12:11
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def register_photos(apps, schema_editor):
+    # Photos stored before this keep their names; count their users so the
+    # sweeper can remove them once the last one lets go
+    AdmittedStudent = apps.get_model('core', 'AdmittedStudent')
+    MediaBlob = apps.get_model('core', 'MediaBlob')
+    storage = AdmittedStudent._meta.get_field('photo').storage
+    blobs = []
+    rows = AdmittedStudent.objects.exclude(photo='').exclude(photo__isnull=True)
+    for row in rows.values('photo').annotate(refs=Count('id')).order_by():
+        try:
+            size = storage.size(row['photo'])
+        except OSError:
+            size = 0
+        blobs.append(MediaBlob(name=row['photo'], size=size, refs=row['refs']))
+    MediaBlob.objects.bulk_create(blobs, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_admittedstudent_photo_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='admittedstudent',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='student_photos/'),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('refs', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Media Blob',
+                'verbose_name_plural': 'Media Blobs',
+                'indexes': [models.Index(fields=['released_at'], name='mediablob_released_idx')],
+            },
+        ),
+        migrations.RunPython(register_photos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 12:23
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_opening(apps, schema_editor):
+    # The first receipt written (lowest id, whatever its date) recorded the fees
+    # paid before it; a student without receipts paid everything on admission
+    AdmittedStudent = apps.get_model('core', 'AdmittedStudent')
+    FeePayment = apps.get_model('core', 'FeePayment')
+    first_written = FeePayment.objects.filter(student=OuterRef('pk')).order_by('id').values('paid_before_this')[:1]
+    AdmittedStudent.objects.update(opening_paid_fees=Coalesce(Subquery(first_written), F('paid_fees')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_mediablob_content_addressed_photos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='admittedstudent',
+            name='opening_paid_fees',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(backfill_opening, migrations.RunPython.noop),
+    ]
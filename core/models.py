@@ -1,18 +1,69 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
-class Enquiry(models.Model):
+from .storage import ContentAddressedStorage
+
+
+def normalize_mobile(value):
+    """Digits only, without a leading 0 or +91 on an Indian number"""
+    digits = ''.join(ch for ch in (value or '') if ch.isdigit())
+    if len(digits) > 10 and (digits.startswith('91') or digits.startswith('0')):
+        digits = digits[-10:]
+    return digits
+
+
+class NormalizedMobileMixin:
+    """
+    Keeps ``<field>_digits`` and ``<field>_reversed`` in step with each
+    field in MOBILE_FIELDS, so searches by the first or the last digits of a
+    number are indexed prefix lookups.
+    """
+    MOBILE_FIELDS = ()
+
+    def sync_mobile_digits(self):
+        for field in self.MOBILE_FIELDS:
+            digits = normalize_mobile(getattr(self, field))
+            setattr(self, f'{field}_digits', digits)
+            setattr(self, f'{field}_reversed', digits[::-1])
+
+    def save(self, *args, **kwargs):
+        self.sync_mobile_digits()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            derived = [
+                f'{field}{suffix}'
+                for field in self.MOBILE_FIELDS if field in update_fields
+                for suffix in ('_digits', '_reversed')
+            ]
+            kwargs['update_fields'] = list(update_fields) + derived
+        super().save(*args, **kwargs)
+
+class Enquiry(NormalizedMobileMixin, models.Model):
+    MOBILE_FIELDS = ('mobile',)
+    
     name = models.CharField(max_length=100)
     mobile = models.CharField(max_length=15)
+    mobile_digits = models.CharField(max_length=15, blank=True, default='', editable=False, db_index=True)
+    mobile_reversed = models.CharField(max_length=15, blank=True, default='', editable=False, db_index=True)
     education = models.CharField(max_length=100)
     course = models.CharField(max_length=50)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='enquiry_created_idx'),
+            models.Index(fields=['course', 'created_at'], name='enquiry_course_created_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 
-class AdmittedStudent(models.Model):
+class AdmittedStudent(NormalizedMobileMixin, models.Model):
+    MOBILE_FIELDS = ('mobile_own', 'parent_mobile')
+    
     COURSE_CHOICES = [
         ('MS-CIT', 'MS-CIT'),
         ('Tally', 'Tally'),
@@ -49,6 +100,12 @@ class AdmittedStudent(models.Model):
     mobile_own = models.CharField(max_length=15)
     parent_mobile = models.CharField(max_length=15, blank=True, null=True)
     
+    # Digits-only copies (plus reversed, for "last digits" search) - see NormalizedMobileMixin
+    mobile_own_digits = models.CharField(max_length=15, blank=True, default='', editable=False, db_index=True)
+    mobile_own_reversed = models.CharField(max_length=15, blank=True, default='', editable=False, db_index=True)
+    parent_mobile_digits = models.CharField(max_length=15, blank=True, default='', editable=False, db_index=True)
+    parent_mobile_reversed = models.CharField(max_length=15, blank=True, default='', editable=False, db_index=True)
+    
     # Demographics
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES)
     marital_status = models.CharField(max_length=10, choices=MARITAL_STATUS_CHOICES)
@@ -64,7 +121,11 @@ class AdmittedStudent(models.Model):
     educational_qualification = models.CharField(max_length=200)
     
     # Photo
-    photo = models.ImageField(upload_to='student_photos/', blank=True, null=True)
+    photo = models.ImageField(
+        upload_to='student_photos/', storage=ContentAddressedStorage(), blank=True, null=True
+    )
+    # Downscaled copies of the photo have been written (see core.images)
+    photo_renditions = models.BooleanField(default=False, editable=False)
     
     # Financial Information
     total_fees = models.DecimalField(
@@ -79,14 +140,33 @@ class AdmittedStudent(models.Model):
         validators=[MinValueValidator(0)],
         default=0
     )
+    # Fees already paid when the student was admitted or imported, before any receipt
+    opening_paid_fees = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    # Bumped by every paid_fees change (see core.ledger)
+    version = models.PositiveIntegerField(default=0, editable=False)
     
     # Metadata
     admission_date = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Written only through core.ledger
+    LEDGER_FIELDS = ('paid_fees', 'opening_paid_fees', 'version')
+    
     def __str__(self):
         return self.full_name
     
+    def save(self, *args, **kwargs):
+        # Whatever is paid on admission is the balance the receipts build on
+        if self._state.adding:
+            self.opening_paid_fees = self.paid_fees
+        # A plain save of a loaded student must not write back a stale paid_fees
+        elif kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.LEDGER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
     @property
     def remaining_fees(self):
         return self.total_fees - self.paid_fees
@@ -101,6 +181,10 @@ class AdmittedStudent(models.Model):
         ordering = ['-admission_date']
         verbose_name = 'Admitted Student'
         verbose_name_plural = 'Admitted Students'
+        indexes = [
+            models.Index(fields=['admission_date', 'id'], name='admitted_admission_id_idx'),
+            models.Index(fields=['course', 'admission_date'], name='admitted_course_admission_idx'),
+        ]
 
 
 class Course(models.Model):
@@ -199,10 +283,13 @@ class FeePayment(models.Model):
         validators=[MinValueValidator(0.01)]
     )
     payment_mode = models.CharField(max_length=20, choices=PAYMENT_MODE_CHOICES)
-    payment_date = models.DateTimeField(auto_now_add=True)
+    # Defaults to now; settlement imports set the statement's transaction date
+    payment_date = models.DateTimeField(default=timezone.now)
     
     # Additional info
     remarks = models.TextField(blank=True, null=True)
+    # UTR / transaction id of payments imported from bank or UPI statements
+    settlement_ref = models.CharField(max_length=64, blank=True, default='', db_index=True)
     
     # Fees snapshot at time of payment
     total_fees_at_payment = models.DecimalField(max_digits=10, decimal_places=2)
@@ -217,22 +304,252 @@ class FeePayment(models.Model):
         ordering = ['-payment_date']
         verbose_name = 'Fee Payment'
         verbose_name_plural = 'Fee Payments'
+        indexes = [
+            models.Index(fields=['payment_date'], name='feepayment_date_idx'),
+            models.Index(fields=['payment_mode', 'payment_date'], name='feepayment_mode_date_idx'),
+            models.Index(fields=['updated_at', 'id'], name='feepayment_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.receipt_no} - {self.student.full_name} - ₹{self.amount}"
     
     def save(self, *args, **kwargs):
-        if not self.receipt_no:
-            # Generate receipt number
-            last_payment = FeePayment.objects.order_by('-id').first()
-            if last_payment and last_payment.receipt_no:
-                try:
-                    last_number = int(last_payment.receipt_no.split('-')[1])
-                    new_number = last_number + 1
-                except:
-                    new_number = 1
-            else:
-                new_number = 1
-            self.receipt_no = f"RCP-{new_number:06d}"
+        if self.receipt_no:
+            return super().save(*args, **kwargs)
         
-        super().save(*args, **kwargs)
\ No newline at end of file
+        from .receipt_numbers import assign
+        # The number is reserved in the insert's transaction, so a failed save leaves no gap
+        with transaction.atomic(using=kwargs.get('using')):
+            assign([self])
+            super().save(*args, **kwargs)
+
+# ROLLUP TABLES FOR DASHBOARD AND REPORT STATISTICS
+class StatRollup(models.Model):
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('month', 'Month'),
+        ('year', 'Year'),
+    ]
+    
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        abstract = True
+
+
+class AdmissionRollup(StatRollup):
+    # Raw course choice plus the label shown to staff (custom course for 'Other')
+    course = models.CharField(max_length=50)
+    course_name = models.CharField(max_length=100)
+    
+    class Meta:
+        unique_together = ('period', 'period_start', 'course', 'course_name')
+        verbose_name = 'Admission Rollup'
+        verbose_name_plural = 'Admission Rollups'
+
+
+class EnquiryRollup(StatRollup):
+    course = models.CharField(max_length=50)
+    
+    class Meta:
+        unique_together = ('period', 'period_start', 'course')
+        verbose_name = 'Enquiry Rollup'
+        verbose_name_plural = 'Enquiry Rollups'
+
+
+class CollectionRollup(StatRollup):
+    course_name = models.CharField(max_length=100)
+    payment_mode = models.CharField(max_length=20)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ('period', 'period_start', 'course_name', 'payment_mode')
+        verbose_name = 'Collection Rollup'
+        verbose_name_plural = 'Collection Rollups'
+
+
+# DELETED RECEIPTS, FOR CLIENTS SYNCING CHANGES SINCE A TOKEN
+class ReceiptTombstone(models.Model):
+    receipt_id = models.IntegerField()
+    receipt_no = models.CharField(max_length=50)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Receipt Tombstone'
+        verbose_name_plural = 'Receipt Tombstones'
+        indexes = [
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.receipt_no} (deleted)"
+
+
+# EXPORTS GENERATED IN THE BACKGROUND (see core.export_jobs)
+class ExportJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    ]
+    
+    kind = models.CharField(max_length=50)
+    export_format = models.CharField(max_length=10)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    
+    # Progress
+    rows_total = models.IntegerField(null=True, blank=True)
+    rows_done = models.IntegerField(default=0)
+    
+    # Result
+    file = models.FileField(upload_to='exports/', blank=True, null=True)
+    filename = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Export Job'
+        verbose_name_plural = 'Export Jobs'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='exportjob_status_idx'),
+            models.Index(fields=['expires_at'], name='exportjob_expires_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} ({self.status})"
+    
+    @property
+    def percent(self):
+        if self.status == 'done':
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(99, int(self.rows_done * 100 / self.rows_total))
+
+
+# CHANGE COUNTERS PER DATA SET, BUMPED BY core.signals ON EVERY WRITE
+class DataVersion(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Data Version'
+        verbose_name_plural = 'Data Versions'
+    
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+# STORED MEDIA FILES AND THEIR REFERENCE COUNTS (see core.media)
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refs = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When refs last dropped to zero; the sweeper removes the file a while after
+    released_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Media Blob'
+        verbose_name_plural = 'Media Blobs'
+        indexes = [
+            models.Index(fields=['released_at'], name='mediablob_released_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.refs} refs)"
+
+
+# RECEIPT NUMBER SEQUENCES (see core.receipt_numbers)
+class ReceiptSequence(models.Model):
+    # e.g. '2025-26'
+    financial_year = models.CharField(max_length=7, unique=True)
+    prefix = models.CharField(max_length=12)
+    last_number = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-financial_year']
+        verbose_name = 'Receipt Sequence'
+        verbose_name_plural = 'Receipt Sequences'
+    
+    def __str__(self):
+        return f"{self.financial_year}: {self.prefix}{self.last_number:06d}"
+
+
+# BANK / UPI STATEMENT IMPORTS (see core.settlements)
+class SettlementImport(models.Model):
+    filename = models.CharField(max_length=255)
+    payment_mode = models.CharField(max_length=20, choices=FeePayment.PAYMENT_MODE_CHOICES)
+    rows_total = models.IntegerField(default=0)
+    matched = models.IntegerField(default=0)
+    queued_for_review = models.IntegerField(default=0)
+    duplicates = models.IntegerField(default=0)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Settlement Import'
+        verbose_name_plural = 'Settlement Imports'
+    
+    def __str__(self):
+        return f"{self.filename} ({self.created_at:%d-%m-%Y})"
+
+
+class SettlementReview(models.Model):
+    """A statement row that could not be posted automatically"""
+    REASON_CHOICES = [
+        ('no_match', 'No matching student'),
+        ('ambiguous', 'More than one matching student'),
+        ('over_remaining', 'More than the remaining fees'),
+        ('invalid', 'Incomplete row'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('posted', 'Posted'),
+        ('dismissed', 'Dismissed'),
+    ]
+    
+    settlement = models.ForeignKey(SettlementImport, on_delete=models.CASCADE, related_name='reviews')
+    row_number = models.IntegerField()
+    reference = models.CharField(max_length=64, blank=True)
+    payer_name = models.CharField(max_length=200, blank=True)
+    payer_mobile = models.CharField(max_length=20, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    paid_on = models.DateTimeField(null=True, blank=True)
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    # Students the row could belong to, for 'ambiguous' and 'over_remaining'
+    candidate_ids = models.JSONField(default=list, blank=True)
+    raw = models.JSONField(default=dict, blank=True)
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    payment = models.ForeignKey(FeePayment, on_delete=models.SET_NULL, null=True, blank=True)
+    resolved_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['created_at', 'row_number']
+        verbose_name = 'Settlement Review'
+        verbose_name_plural = 'Settlement Reviews'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='settlementreview_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.reference or self.payer_name} - {self.get_reason_display()}"
@@ -0,0 +1,103 @@
+"""
+Keyset (cursor) pagination.
+
+OFFSET pagination re-reads every skipped row, so the last pages of a long
+list get slower and rows shift when students are added meanwhile. A keyset
+page instead continues strictly after the last row already shown:
+
+    WHERE (admission_date, id) < (:last_date, :last_id)
+    ORDER BY admission_date DESC, id DESC LIMIT :size
+
+which is one index range scan whatever the page number. The cursor handed to
+the client is the ordering values of that last row, JSON + base64 encoded.
+"""
+import base64
+import binascii
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+# ================= CURSORS =================
+def _cursor_value(value):
+    # Full isoformat: DjangoJSONEncoder would cut microseconds, and a
+    # rounded timestamp would skip or repeat rows at the page boundary
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Cannot use {type(value).__name__} in a cursor')
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=_cursor_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(model, ordering, token):
+    """Ordering values stored in ``token``, converted back to Python; None if invalid"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != len(ordering):
+        return None
+    try:
+        return [
+            model._meta.get_field(name.lstrip('-')).to_python(value)
+            for name, value in zip(ordering, values)
+        ]
+    except ValidationError:
+        return None
+
+
+# ================= PAGES =================
+def after_q(ordering, values):
+    """Rows that sort strictly after ``values`` under ``ordering``"""
+    condition = Q(pk__in=[])
+    for position, name in enumerate(ordering):
+        field = name.lstrip('-')
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        step = Q(**{f'{field}__{lookup}': values[position]})
+        for earlier, earlier_name in enumerate(ordering[:position]):
+            step &= Q(**{earlier_name.lstrip('-'): values[earlier]})
+        condition |= step
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor='', size=30, fields=None):
+    """
+    One page of ``queryset`` as ``(rows, next_cursor)``.
+
+    ``ordering`` must end with a unique field (normally ``-id``) so the order
+    is total. With ``fields`` the rows are ``values()`` dicts holding only
+    those columns; ``next_cursor`` is None on the last page.
+    """
+    ordering = list(ordering)
+    queryset = queryset.order_by(*ordering)
+    values = decode_cursor(queryset.model, ordering, cursor)
+    if values is not None:
+        queryset = queryset.filter(after_q(ordering, values))
+
+    keys = [name.lstrip('-') for name in ordering]
+    if fields is not None:
+        queryset = queryset.values(*dict.fromkeys(list(fields) + keys))
+
+    # One extra row tells whether another page exists
+    rows = list(queryset[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+
+    rows = rows[:size]
+    last = rows[-1]
+    if fields is not None:
+        next_values = [last[key] for key in keys]
+    else:
+        next_values = [getattr(last, key) for key in keys]
+    return rows, encode_cursor(next_values)
@@ -0,0 +1,127 @@
+"""
+Receipt numbers.
+
+Each financial year has a ReceiptSequence row with its prefix and the last
+number issued. Numbers are reserved by incrementing that counter in the
+database (one ``UPDATE ... RETURNING`` where the backend has it), so two
+counters saving at the same moment can never get the same number and
+nothing has to read the latest receipt first. The increment runs in the
+transaction that saves the receipts: when that rolls back the counter does
+too, so the series has no gaps. Bulk paths reserve a whole block with the
+same single statement.
+
+A new year's prefix comes from RECEIPT_PREFIX, with ``{fy}`` replaced by
+e.g. '2526'; edit the year's row in the admin before its first receipt to
+use another. A new sequence continues after the highest receipt already
+issued with its prefix. Years that share a prefix (a RECEIPT_PREFIX without
+``{fy}``) share one series: the statement that reserves numbers advances all
+their rows together, so a back-dated receipt in an older year takes the next
+number after the newest one instead of repeating it.
+"""
+import re
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .models import FeePayment, ReceiptSequence
+
+# Receipts numbered before sequences existed ('RCP-000123')
+LEGACY_PREFIX = 'RCP-'
+
+
+def financial_year(moment=None):
+    """'2025-26' for any moment from April 2025 to March 2026 (local time)"""
+    moment = moment or timezone.now()
+    day = timezone.localtime(moment).date() if isinstance(moment, datetime) and timezone.is_aware(moment) else moment
+    start = day.year if day.month >= settings.RECEIPT_YEAR_START_MONTH else day.year - 1
+    return f'{start}-{(start + 1) % 100:02d}'
+
+
+def default_prefix(year):
+    return settings.RECEIPT_PREFIX.format(fy=f'{year[2:4]}{year[5:7]}')
+
+
+def known_prefixes():
+    return {LEGACY_PREFIX, *ReceiptSequence.objects.values_list('prefix', flat=True)}
+
+
+def _highest_issued(prefix):
+    """Highest number already used with ``prefix`` (0 if none)"""
+    last = (
+        FeePayment.objects
+        .filter(receipt_no__regex=rf'^{re.escape(prefix)}[0-9]+$')
+        .order_by(Length('receipt_no').desc(), '-receipt_no')
+        .values_list('receipt_no', flat=True)
+        .first()
+    )
+    return int(last[len(prefix):]) if last else 0
+
+
+def _increment(year, count):
+    """
+    Advance the counter of ``year``, and of every year sharing its prefix, by
+    ``count``; (prefix, new last number), or None if the year has no row yet
+    """
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    if connection.vendor in ('sqlite', 'postgresql') and connection.features.can_return_columns_from_insert:
+        table = connection.ops.quote_name(ReceiptSequence._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET last_number = last_number + %s, updated_at = %s '
+                f'WHERE prefix = (SELECT prefix FROM {table} WHERE financial_year = %s) RETURNING prefix, last_number',
+                [count, now, year],
+            )
+            rows = cursor.fetchall()
+    else:
+        prefix = ReceiptSequence.objects.filter(financial_year=year).values_list('prefix', flat=True).first()
+        sequences = ReceiptSequence.objects.filter(prefix=prefix)
+        if prefix is None or not sequences.update(last_number=F('last_number') + count, updated_at=timezone.now()):
+            return None
+        rows = list(sequences.values_list('prefix', 'last_number'))
+    if not rows:
+        return None
+
+    prefix, last = max(rows, key=lambda row: row[1])
+    if any(number != last for _, number in rows):
+        # A year that joined the prefix later (or was renamed in the admin) catches up;
+        # the update above holds the lock on every row involved
+        ReceiptSequence.objects.filter(prefix=prefix).update(last_number=last)
+    return prefix, last
+
+
+def allocate(year, count=1):
+    """
+    Reserve ``count`` consecutive receipt numbers of financial year ``year``.
+    Call it inside the transaction that saves the receipts.
+    """
+    row = _increment(year, count)
+    if row is None:
+        prefix = default_prefix(year)
+        try:
+            with transaction.atomic():
+                ReceiptSequence.objects.create(
+                    financial_year=year, prefix=prefix, last_number=_highest_issued(prefix),
+                )
+        except IntegrityError:
+            # Created by a concurrent writer in the meantime
+            pass
+        row = _increment(year, count)
+
+    prefix, last = row
+    return [f'{prefix}{number:06d}' for number in range(last - count + 1, last + 1)]
+
+
+def assign(payments):
+    """Number every payment that has no receipt number yet, one block per financial year"""
+    by_year = defaultdict(list)
+    for payment in payments:
+        if not payment.receipt_no:
+            by_year[financial_year(payment.payment_date)].append(payment)
+    for year, group in by_year.items():
+        for payment, receipt_no in zip(group, allocate(year, len(group))):
+            payment.receipt_no = receipt_no
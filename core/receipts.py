@@ -0,0 +1,189 @@
+"""
+Query layer behind ``/api/receipts/``.
+
+Receipts are filtered, sorted and cut into keyset pages in the database and
+read with a ``values()`` projection of just the requested fields, so neither
+model instances nor the full receipt history are ever built per request.
+
+``receipt_changes()`` backs ``/api/receipts/changes/``: given the token from
+the previous sync it returns only receipts saved since then (by
+``updated_at``) plus the ids deleted since then (ReceiptTombstone rows
+written by core.signals), so the browser's copy can be brought up to date
+cheaply.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .filters import filter_period, parse_int
+from .models import FeePayment, ReceiptTombstone
+from .pagination import decode_cursor, encode_cursor, keyset_page
+from .rollups import course_name_for
+from .search import search_receipts
+
+
+# ================= FIELDS =================
+def _local(moment):
+    return timezone.localtime(moment) if timezone.is_aware(moment) else moment
+
+
+# name -> (columns read with values(), row -> JSON value)
+RECEIPT_FIELDS = {
+    'id': (('id',), lambda row: row['id']),
+    'receipt_no': (('receipt_no',), lambda row: row['receipt_no']),
+    'student_name': (('student__full_name',), lambda row: row['student__full_name']),
+    'student_id': (('student_id',), lambda row: row['student_id']),
+    'payment_date': (('payment_date',), lambda row: _local(row['payment_date']).strftime('%Y-%m-%d')),
+    'payment_time': (('payment_date',), lambda row: _local(row['payment_date']).strftime('%I:%M %p')),
+    'payment_at': (('payment_date',), lambda row: _local(row['payment_date']).isoformat()),
+    'paid_fees': (('amount',), lambda row: float(row['amount'])),
+    'remaining_fees': (('remaining_after_this',), lambda row: float(row['remaining_after_this'])),
+    'total_fees': (('total_fees_at_payment',), lambda row: float(row['total_fees_at_payment'])),
+    'paid_before_this': (('paid_before_this',), lambda row: float(row['paid_before_this'])),
+    'payment_mode': (('payment_mode',), lambda row: row['payment_mode']),
+    'course': (
+        ('student__course', 'student__custom_course'),
+        lambda row: course_name_for(row['student__course'], row['student__custom_course']),
+    ),
+    'mobile': (('student__mobile_own',), lambda row: row['student__mobile_own']),
+    'remarks': (('remarks',), lambda row: row['remarks'] or ''),
+}
+
+# ?sort= value -> ordering; each ends with a unique column for keyset paging
+RECEIPT_SORTS = {
+    'newest': ('-payment_date', '-id'),
+    'oldest': ('payment_date', 'id'),
+    'amount_desc': ('-amount', '-id'),
+    'amount_asc': ('amount', 'id'),
+    'receipt_no': ('receipt_no', 'id'),
+}
+DEFAULT_SORT = 'newest'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Student columns copied into receipts; changing one re-sends their receipts
+STUDENT_RECEIPT_FIELDS = ('full_name', 'course', 'custom_course', 'mobile_own')
+
+# Tombstones older than this are pruned; an older token gets a full resync
+TOMBSTONE_RETENTION = timedelta(days=90)
+# Tokens lag behind "now" so a save committed just after the sync is not missed
+SYNC_OVERLAP = timedelta(seconds=30)
+SYNC_PAGE_SIZE = 500
+
+
+def requested_fields(value):
+    """Field names from a comma-separated ``fields`` parameter (all when empty)"""
+    names = [name.strip() for name in (value or '').split(',') if name.strip() in RECEIPT_FIELDS]
+    if not names:
+        return list(RECEIPT_FIELDS)
+    return list(dict.fromkeys(['id'] + names))
+
+
+# ================= QUERYING =================
+def filtered_receipts(params):
+    """FeePayment queryset narrowed by the request's filter parameters"""
+    payments = FeePayment.objects.all()
+
+    search = params.get('search', '').strip()
+    if search:
+        payments = search_receipts(payments, search)
+
+    payments = filter_period(
+        payments, 'payment_date',
+        year=params.get('year', ''), month=params.get('month', ''), day=params.get('date', ''),
+    )
+
+    payment_mode = params.get('payment_mode', '').strip()
+    if payment_mode:
+        payments = payments.filter(payment_mode=payment_mode)
+
+    student_id = parse_int(params.get('student', ''), 1, 2 ** 63 - 1)
+    if student_id:
+        payments = payments.filter(student_id=student_id)
+
+    return payments
+
+
+def receipt_totals(payments):
+    """Count and sums over the whole filtered set, not just one page"""
+    totals = payments.order_by().aggregate(
+        count=Count('id'), paid=Sum('amount'), remaining=Sum('remaining_after_this'),
+    )
+    return {
+        'count': totals['count'],
+        'paid': float(totals['paid'] or 0),
+        'remaining': float(totals['remaining'] or 0),
+    }
+
+
+def receipt_page(params):
+    """
+    The ``/api/receipts/`` envelope for the given query parameters.
+
+    Totals are computed for the first page only (no ``cursor``) unless
+    ``totals=1`` is passed; later pages of the same listing reuse them.
+    """
+    payments = filtered_receipts(params)
+    fields = requested_fields(params.get('fields', ''))
+    sort = params.get('sort', '') if params.get('sort', '') in RECEIPT_SORTS else DEFAULT_SORT
+    size = parse_int(params.get('size', ''), 1, MAX_PAGE_SIZE) or DEFAULT_PAGE_SIZE
+    cursor = params.get('cursor', '')
+
+    columns = [column for name in fields for column in RECEIPT_FIELDS[name][0]]
+    rows, next_cursor = keyset_page(payments, RECEIPT_SORTS[sort], cursor=cursor, size=size, fields=columns)
+
+    envelope = {
+        'success': True,
+        'receipts': [{name: RECEIPT_FIELDS[name][1](row) for name in fields} for row in rows],
+        'next_cursor': next_cursor,
+        'sort': sort,
+    }
+    if not cursor or params.get('totals') == '1':
+        envelope['totals'] = receipt_totals(payments)
+        envelope['total_count'] = envelope['totals']['count']
+    return envelope
+
+
+# ================= CHANGE FEED =================
+def _sync_rows(rows):
+    return [{name: read(row) for name, (_, read) in RECEIPT_FIELDS.items()} for row in rows]
+
+
+def receipt_changes(params):
+    """
+    The ``/api/receipts/changes/`` envelope.
+
+    ``since`` is the token from an earlier sync; without a usable one the
+    response has ``reset: true`` and lists every receipt. Changed receipts
+    come in keyset pages (``cursor``); ``deleted`` and the new ``token`` are
+    on the first page, and the client stores the token once all pages are in.
+    """
+    now = timezone.now()
+    since = decode_cursor(FeePayment, ['updated_at'], params.get('since', ''))
+    since = since[0] if since else None
+    if since is not None and since < now - TOMBSTONE_RETENTION:
+        since = None
+
+    payments = FeePayment.objects.all()
+    if since is not None:
+        payments = payments.filter(updated_at__gte=since)
+
+    columns = [column for spec, _ in RECEIPT_FIELDS.values() for column in spec]
+    cursor = params.get('cursor', '')
+    size = parse_int(params.get('size', ''), 1, SYNC_PAGE_SIZE) or SYNC_PAGE_SIZE
+    rows, next_cursor = keyset_page(payments, ('updated_at', 'id'), cursor=cursor, size=size, fields=columns)
+
+    envelope = {
+        'success': True,
+        'reset': since is None,
+        'receipts': _sync_rows(rows),
+        'next_cursor': next_cursor,
+    }
+    if not cursor:
+        deleted = ReceiptTombstone.objects.none()
+        if since is not None:
+            deleted = ReceiptTombstone.objects.filter(deleted_at__gte=since)
+        envelope['deleted'] = list(deleted.values_list('receipt_id', flat=True).distinct())
+        envelope['token'] = encode_cursor([now - SYNC_OVERLAP])
+    return envelope
@@ -0,0 +1,130 @@
+"""
+Month-end report.
+
+One workbook with the month's admissions, its receipts, a per-course summary
+and a daily cash book for each payment mode. The two detail sheets are
+streamed from the same single-query export specs as the regular exports;
+as their rows go past, a tally collects the totals the summary sheets need.
+stream_xlsx() writes sheets in order and each sheet's rows are a generator
+that only runs when the writer gets to it, so the summary sheets - listed
+last - are built from those tallies without querying again.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from .exports import ADMITTED_STUDENT_EXPORT, RECEIPT_EXPORT
+from .filters import filter_period
+from .models import AdmittedStudent, FeePayment
+from .rollups import course_name_for
+from .xlsx import Sheet
+
+
+class MonthEndReport:
+    """Identity of the report in the export cache (core.export_cache)"""
+    name = 'month_end'
+    data_sets = ('admissions', 'receipts')
+
+
+COURSE_SUMMARY_HEADERS = [
+    'Course', 'Admissions', 'Total Fees (₹)', 'Paid Fees (₹)', 'Outstanding (₹)',
+    'Receipts', 'Collected This Month (₹)',
+]
+CASH_BOOK_HEADERS = ['Date', 'Receipts', 'Amount (₹)', 'Running Total (₹)']
+
+
+def _money(value):
+    return float(value)
+
+
+class MonthEndTally:
+    """Totals gathered while the student and receipt sheets stream"""
+
+    def __init__(self, payment_modes):
+        self.courses = defaultdict(lambda: {
+            'admissions': 0, 'total_fees': Decimal(0), 'paid_fees': Decimal(0),
+            'receipts': 0, 'collected': Decimal(0),
+        })
+        # mode -> day -> [receipts, amount]
+        self.cash_book = {mode: defaultdict(lambda: [0, Decimal(0)]) for mode in payment_modes}
+
+    def students(self, rows):
+        keys = ADMITTED_STUDENT_EXPORT.keys
+        course, custom, total, paid = (
+            keys.index('course'), keys.index('custom_course'),
+            keys.index('total_fees'), keys.index('paid_fees'),
+        )
+        for row in rows:
+            summary = self.courses[course_name_for(row[course], row[custom])]
+            summary['admissions'] += 1
+            summary['total_fees'] += Decimal(str(row[total]))
+            summary['paid_fees'] += Decimal(str(row[paid]))
+            yield row
+
+    def receipts(self, rows):
+        keys = RECEIPT_EXPORT.keys
+        course, mode, paid_on, amount = (
+            keys.index('course'), keys.index('payment_mode'),
+            keys.index('payment_date'), keys.index('amount_paid'),
+        )
+        for row in rows:
+            value = Decimal(str(row[amount]))
+            summary = self.courses[row[course]]
+            summary['receipts'] += 1
+            summary['collected'] += value
+
+            day = self.cash_book.setdefault(row[mode], defaultdict(lambda: [0, Decimal(0)]))[row[paid_on][:10]]
+            day[0] += 1
+            day[1] += value
+            yield row
+
+    def course_rows(self):
+        totals = [0, Decimal(0), Decimal(0), Decimal(0), 0, Decimal(0)]
+        for name in sorted(self.courses):
+            summary = self.courses[name]
+            values = [
+                summary['admissions'], summary['total_fees'], summary['paid_fees'],
+                summary['total_fees'] - summary['paid_fees'], summary['receipts'], summary['collected'],
+            ]
+            totals = [total + value for total, value in zip(totals, values)]
+            yield [name, values[0], *map(_money, values[1:4]), values[4], _money(values[5])]
+        yield ['Total', totals[0], *map(_money, totals[1:4]), totals[4], _money(totals[5])]
+
+    def cash_book_rows(self, mode):
+        days = self.cash_book.get(mode, {})
+        running, count = Decimal(0), 0
+        # Days are dd-mm-YYYY text; order them by the date they name
+        for day in sorted(days, key=lambda text: datetime.strptime(text, '%d-%m-%Y')):
+            receipts, amount = days[day]
+            running += amount
+            count += receipts
+            yield [day, receipts, _money(amount), _money(running)]
+        yield ['Total', count, _money(running), _money(running)]
+
+
+def month_end_sheets(year, month):
+    """The report's sheets; rows are produced only as the workbook is written"""
+    payment_modes = [mode for mode, _ in FeePayment.PAYMENT_MODE_CHOICES]
+    tally = MonthEndTally(payment_modes)
+
+    students = filter_period(AdmittedStudent.objects.all(), 'admission_date', year=year, month=month)
+    payments = filter_period(FeePayment.objects.all(), 'payment_date', year=year, month=month)
+
+    sheets = [
+        Sheet(
+            'Students', ADMITTED_STUDENT_EXPORT.headers,
+            tally.students(ADMITTED_STUDENT_EXPORT.rows(students.order_by('admission_date', 'id'))),
+        ),
+        Sheet(
+            'Receipts', RECEIPT_EXPORT.headers,
+            tally.receipts(RECEIPT_EXPORT.rows(payments.order_by('payment_date', 'id'))),
+        ),
+        Sheet('Course Summary', COURSE_SUMMARY_HEADERS, tally.course_rows()),
+    ]
+    # Modes outside the choices (older data) only show up once receipts are read,
+    # after the sheet list is fixed; they still count in the course summary
+    sheets += [
+        Sheet(f'Cash Book - {mode}', CASH_BOOK_HEADERS, tally.cash_book_rows(mode))
+        for mode in payment_modes
+    ]
+    return sheets
@@ -0,0 +1,259 @@
+"""
+Pre-aggregated statistics for the dashboard and reports.
+
+Every Enquiry, AdmittedStudent and FeePayment row contributes to one rollup
+row per period (day, month and year, in the local time zone). The signal
+handlers in core.signals keep the rollups current on create/update/delete,
+and ``rebuild()`` (the ``rebuild_rollups`` command) recomputes them from
+scratch.
+"""
+from datetime import date
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .caching import cached
+from .models import AdmissionRollup, AdmittedStudent, CollectionRollup, Enquiry, EnquiryRollup, FeePayment
+from .stats import course_label
+
+PERIODS = ('day', 'month', 'year')
+
+
+# ================= BUCKETS =================
+def course_name_for(course, custom_course):
+    """Python twin of stats.course_label()"""
+    return custom_course if course == 'Other' and custom_course else course
+
+
+def period_starts(moment):
+    """First day of the day/month/year bucket containing ``moment``"""
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    day = timezone.localtime(moment).date()
+    return {
+        'day': day,
+        'month': day.replace(day=1),
+        'year': day.replace(month=1, day=1),
+    }
+
+
+def year_range(year):
+    """Half-open [1 Jan, 1 Jan next year) bounds for period_start lookups"""
+    return {
+        'period_start__gte': date(year, 1, 1),
+        'period_start__lt': date(year + 1, 1, 1),
+    }
+
+
+# ================= STATES =================
+# A state is the set of rollup dimensions a row contributes to, plus the
+# moment that picks its buckets and (for collections) the amount.
+
+def admission_state(student):
+    return {
+        'moment': student.admission_date,
+        'course': student.course,
+        'course_name': course_name_for(student.course, student.custom_course),
+    }
+
+
+def enquiry_state(enquiry):
+    return {
+        'moment': enquiry.created_at,
+        'course': enquiry.course,
+    }
+
+
+def collection_state(payment, course_name):
+    return {
+        'moment': payment.payment_date,
+        'course_name': course_name,
+        'payment_mode': payment.payment_mode,
+        'amount': payment.amount,
+    }
+
+
+# ================= INCREMENTAL UPDATES =================
+def _add(model, lookup, count, amount=None):
+    """Add ``count`` (and ``amount``) to one rollup bucket, creating it if needed"""
+    changes = {'count': F('count') + count}
+    initial = {'count': count}
+    if amount is not None:
+        changes['amount'] = F('amount') + amount
+        initial['amount'] = amount
+
+    if model.objects.filter(**lookup).update(**changes):
+        return
+
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **initial)
+    except IntegrityError:
+        # Another writer created the bucket first
+        model.objects.filter(**lookup).update(**changes)
+
+
+def apply(model, state, sign):
+    """Add (sign=1) or remove (sign=-1) one row's contribution"""
+    apply_many(model, [state], sign)
+
+
+def apply_many(model, states, sign=1):
+    """Add or remove the contributions of many rows, one update per bucket touched"""
+    buckets = {}
+    for state in states:
+        dimensions = dict(state)
+        moment = dimensions.pop('moment')
+        amount = dimensions.pop('amount', None)
+        for period, period_start in period_starts(moment).items():
+            key = (period, period_start, tuple(sorted(dimensions.items())))
+            count, total = buckets.get(key, (0, None))
+            if amount is not None:
+                total = (total or 0) + amount * sign
+            buckets[key] = (count + sign, total)
+
+    for (period, period_start, dimensions), (count, total) in buckets.items():
+        _add(model, dict(dimensions, period=period, period_start=period_start), count, total)
+
+
+def move(model, old_state, new_state):
+    """Re-bucket a row whose dimensions changed"""
+    if old_state == new_state:
+        return
+    apply(model, old_state, -1)
+    apply(model, new_state, 1)
+
+
+# ================= FULL REBUILD =================
+def _trunc(field, period):
+    return Trunc(field, period, output_field=DateField())
+
+
+def rebuild():
+    """Recompute every rollup table from the raw rows"""
+    with transaction.atomic():
+        for model in (AdmissionRollup, EnquiryRollup, CollectionRollup):
+            model.objects.all().delete()
+
+        for period in PERIODS:
+            rows = (
+                AdmittedStudent.objects
+                .order_by()
+                .annotate(period_start=_trunc('admission_date', period), course_name=course_label())
+                .values('period_start', 'course', 'course_name')
+                .annotate(count=Count('id'))
+            )
+            AdmissionRollup.objects.bulk_create(
+                AdmissionRollup(period=period, **row) for row in rows
+            )
+
+            rows = (
+                Enquiry.objects
+                .order_by()
+                .annotate(period_start=_trunc('created_at', period))
+                .values('period_start', 'course')
+                .annotate(count=Count('id'))
+            )
+            EnquiryRollup.objects.bulk_create(
+                EnquiryRollup(period=period, **row) for row in rows
+            )
+
+            rows = (
+                FeePayment.objects
+                .order_by()
+                .annotate(
+                    period_start=_trunc('payment_date', period),
+                    course_name=course_label('student__'),
+                )
+                .values('period_start', 'course_name', 'payment_mode')
+                .annotate(count=Count('id'), amount=Sum('amount'))
+            )
+            CollectionRollup.objects.bulk_create(
+                CollectionRollup(period=period, **row) for row in rows
+            )
+
+
+# ================= READERS =================
+def _yearly(model, year=None):
+    rows = model.objects.filter(period='year')
+    if year:
+        rows = rows.filter(**year_range(year))
+    return rows
+
+
+def enquiry_count(year=None):
+    return _yearly(EnquiryRollup, year).aggregate(total=Sum('count'))['total'] or 0
+
+
+def admission_counts(year=None):
+    """MS-CIT vs KLIC (every other course) admissions"""
+    totals = _yearly(AdmissionRollup, year).aggregate(
+        mscit_count=Sum('count', filter=Q(course='MS-CIT')),
+        klic_count=Sum('count', filter=~Q(course='MS-CIT')),
+    )
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def course_distribution(year=None):
+    rows = (
+        _yearly(AdmissionRollup, year)
+        .values('course_name')
+        .annotate(total=Sum('count'))
+        .filter(total__gt=0)
+        .order_by('-total', 'course_name')
+    )
+    return {row['course_name']: row['total'] for row in rows}
+
+
+def monthly_admissions(year):
+    monthly_data = {str(i): 0 for i in range(1, 13)}
+
+    rows = (
+        AdmissionRollup.objects
+        .filter(period='month', **year_range(year))
+        .values('period_start')
+        .annotate(total=Sum('count'))
+    )
+    for row in rows:
+        monthly_data[str(row['period_start'].month)] = row['total']
+
+    return monthly_data
+
+
+def _years(model):
+    return [
+        period_start.year
+        for period_start in (
+            model.objects
+            .filter(period='year', count__gt=0)
+            .values_list('period_start', flat=True)
+            .distinct()
+            .order_by('-period_start')
+        )
+    ]
+
+
+def admission_years():
+    """Years that have at least one admission, newest first"""
+    return _years(AdmissionRollup)
+
+
+def enquiry_years():
+    """Years that have at least one enquiry, newest first"""
+    return _years(EnquiryRollup)
+
+
+@cached('dashboard', ['enquiries', 'admissions'])
+def dashboard_figures(year, monthly_year):
+    """Everything the dashboard shows for ``year`` (None: all years), as one cacheable dict"""
+    counts = admission_counts(year)
+    return {
+        'available_years': admission_years(),
+        'enquiry_count': enquiry_count(year),
+        'mscit_count': counts['mscit_count'],
+        'klic_count': counts['klic_count'],
+        'course_distribution': course_distribution(year),
+        'monthly_data': monthly_admissions(monthly_year),
+    }
@@ -0,0 +1,209 @@
+"""
+Full-text search for admitted students, enquiries and receipts.
+
+SQLite: FTS5 external-content tables shadow ``core_admittedstudent`` and
+``core_enquiry``. Triggers keep them in sync on every insert, update and
+delete (including bulk operations), so saves need no extra Python work.
+PostgreSQL: GIN indexes on a ``simple`` tsvector expression plus pg_trgm on
+the name column. Any other backend falls back to ``icontains``.
+
+``ensure_indexes()`` creates whatever is missing and runs after every
+``migrate`` (SQLite drops triggers when a migration remakes a table).
+
+Purely numeric queries are treated as (part of) a mobile number and go to the
+normalized ``<field>_digits`` / ``<field>_reversed`` columns instead, so
+"first digits" and "last digits" are both indexed prefix lookups.
+"""
+import re
+
+from django.db import connection as default_connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import AdmittedStudent, Enquiry, normalize_mobile
+from .receipt_numbers import known_prefixes
+
+
+# ================= INDEX DEFINITIONS =================
+# table -> columns that are searchable
+INDEXED_COLUMNS = {
+    'core_admittedstudent': ('full_name', 'student_name', 'mobile_own'),
+    'core_enquiry': ('name', 'mobile', 'course'),
+}
+
+# Word characters plus combining marks, so Devanagari names stay whole
+TOKEN_RE = re.compile(r'[\w\u0300-\u036f\u0900-\u0dff]+', re.UNICODE)
+
+# Digits with the separators people type inside phone numbers
+MOBILE_QUERY_RE = re.compile(r'^\+?[\d\s\-()]*\d[\d\s\-()]*$')
+
+
+def _sqlite_statements(table, columns):
+    fts = f'{table}_fts'
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{c}' for c in columns)
+    old_values = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+def _postgres_document(columns):
+    return " || ' ' || ".join(f"coalesce({c}, '')" for c in columns)
+
+
+def _postgres_statements(table, columns):
+    return [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"CREATE INDEX IF NOT EXISTS {table}_fts_idx ON {table} "
+        f"USING GIN (to_tsvector('simple', {_postgres_document(columns)}))",
+        f"CREATE INDEX IF NOT EXISTS {table}_trgm_idx ON {table} "
+        f"USING GIN ({columns[0]} gin_trgm_ops)",
+    ]
+
+
+def _sqlite_in_sync(cursor, table):
+    cursor.execute(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s AND name LIKE %s",
+        [table, f'{table}_fts_%'],
+    )
+    return cursor.fetchone()[0] == 3
+
+
+def ensure_indexes(connection=default_connection):
+    """Create the search tables/triggers/indexes for the current backend"""
+    existing = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        for table, columns in INDEXED_COLUMNS.items():
+            if table not in existing:
+                continue
+            if connection.vendor == 'sqlite':
+                if _sqlite_in_sync(cursor, table):
+                    continue
+                for statement in _sqlite_statements(table, columns):
+                    cursor.execute(statement)
+                # Triggers were missing, so the index may have drifted
+                cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+            elif connection.vendor == 'postgresql':
+                for statement in _postgres_statements(table, columns):
+                    cursor.execute(statement)
+
+
+def rebuild_indexes(connection=default_connection):
+    """Repopulate the SQLite FTS tables from their content tables"""
+    ensure_indexes(connection)
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for table in INDEXED_COLUMNS:
+                cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+
+# ================= QUERYING =================
+def tokens(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+def _matching_ids(table, query):
+    """RawSQL subquery of row ids whose indexed columns match every token prefix"""
+    words = tokens(query)
+    if not words:
+        return None
+
+    if default_connection.vendor == 'sqlite':
+        match = ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+        return RawSQL(f"SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s", [match])
+
+    if default_connection.vendor == 'postgresql':
+        columns = INDEXED_COLUMNS[table]
+        ts_query = ' & '.join(f"{word}:*" for word in words)
+        return RawSQL(
+            f"SELECT id FROM {table} "
+            f"WHERE to_tsvector('simple', {_postgres_document(columns)}) @@ to_tsquery('simple', %s) "
+            f"OR {columns[0]} ILIKE %s",
+            # Escaped like Django's icontains, so '%', '_' and backslashes match themselves
+            [ts_query, f'%{default_connection.ops.prep_for_like_query(query)}%'],
+        )
+
+    return None
+
+
+def _fallback_q(fields, query):
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': query})
+    return condition
+
+
+def prefix_q(field, prefix):
+    """``field`` starts with ``prefix``, as an index-friendly range"""
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '\uffff'})
+
+
+def mobile_digits(query):
+    """Normalized digits if ``query`` looks like (part of) a phone number, else ''"""
+    return normalize_mobile(query) if MOBILE_QUERY_RE.match(query) else ''
+
+
+def mobile_q(fields, digits, prefix=''):
+    """Any of the mobile ``fields`` starts or ends with ``digits``"""
+    condition = Q()
+    for field in fields:
+        condition |= prefix_q(f'{prefix}{field}_digits', digits)
+        condition |= prefix_q(f'{prefix}{field}_reversed', digits[::-1])
+    return condition
+
+
+def student_q(query, prefix=''):
+    """Q matching admitted students (``prefix`` reaches them through a relation)"""
+    digits = mobile_digits(query)
+    if digits:
+        return mobile_q(AdmittedStudent.MOBILE_FIELDS, digits, prefix)
+    ids = _matching_ids('core_admittedstudent', query)
+    if ids is None:
+        return _fallback_q([f'{prefix}{field}' for field in INDEXED_COLUMNS['core_admittedstudent']], query)
+    return Q(**{f'{prefix}id__in': ids})
+
+
+def search_students(queryset, query):
+    query = query.strip()
+    return queryset.filter(student_q(query)) if query else queryset
+
+
+def search_enquiries(queryset, query):
+    query = query.strip()
+    if not query:
+        return queryset
+    digits = mobile_digits(query)
+    if digits:
+        return queryset.filter(mobile_q(Enquiry.MOBILE_FIELDS, digits))
+    ids = _matching_ids('core_enquiry', query)
+    if ids is None:
+        return queryset.filter(_fallback_q(INDEXED_COLUMNS['core_enquiry'], query))
+    return queryset.filter(id__in=ids)
+
+
+def receipt_no_q(query):
+    """Receipt number typed in full or in part ('RCP-2526-0001...', or just '123')"""
+    query = query.strip().upper()
+    if query.isdigit():
+        return Q(receipt_no__in=[f"{prefix}{int(query):06d}" for prefix in known_prefixes()])
+    return prefix_q('receipt_no', query)
+
+
+def search_receipts(queryset, query):
+    query = query.strip()
+    if not query:
+        return queryset
+    return queryset.filter(student_q(query, prefix='student__') | receipt_no_q(query))
@@ -0,0 +1,304 @@
+"""
+Bank / UPI settlement import.
+
+A statement file (.xlsx or .csv: date, reference, payer name, mobile,
+amount) is matched against the admitted students through a StudentIndex
+built once per file - one query for every student's name and mobile digits,
+then dictionary lookups per row. Matched rows are posted as FeePayments in a
+single transaction: the receipt numbers are allocated as one block, the
+payments are written with ``bulk_create()`` and the students' ``paid_fees``
+incremented with ``bulk_update()``, and ``post_bulk_create`` / ``post_bulk_update``
+(core.signals) keep the rollups and data versions current. A statement
+row is dated when the money arrived, usually before receipts already posted
+at the counter, so the receipts after it are re-chained (core.ledger).
+
+Rows that match no student, match several, or exceed the matched student's
+remaining fees go to the review queue (SettlementReview) for staff to post
+by hand or dismiss. Rows whose reference was already imported are skipped,
+so the same statement can be imported twice safely.
+"""
+import re
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import ledger
+from .filters import local_midnight
+from .imports import ImportFileError, column_key, parse_date, parse_decimal, read_rows
+from .models import AdmittedStudent, FeePayment, SettlementImport, SettlementReview, normalize_mobile
+from .receipt_numbers import assign as assign_receipt_numbers
+from .signals import post_bulk_create, post_bulk_update
+
+STATEMENT_ALIASES = {
+    'utr': 'reference',
+    'utr_no': 'reference',
+    'ref': 'reference',
+    'ref_no': 'reference',
+    'reference_no': 'reference',
+    'transaction_id': 'reference',
+    'txn_id': 'reference',
+    'name': 'payer_name',
+    'payer': 'payer_name',
+    'remitter': 'payer_name',
+    'remitter_name': 'payer_name',
+    'student': 'payer_name',
+    'mobile': 'payer_mobile',
+    'mobile_no': 'payer_mobile',
+    'phone': 'payer_mobile',
+    'credit': 'amount',
+    'credit_amount': 'amount',
+    'date': 'paid_on',
+    'txn_date': 'paid_on',
+    'value_date': 'paid_on',
+    'transaction_date': 'paid_on',
+}
+STATEMENT_FIELDS = ('reference', 'payer_name', 'payer_mobile', 'amount', 'paid_on')
+SETTLEMENT_MODES = ('UPI', 'Bank Transfer')
+
+
+# ================= MATCHING =================
+def name_key(name):
+    """Case-, spacing- and word-order-insensitive form of a name"""
+    return ' '.join(sorted(re.findall(r'[a-z]+', (name or '').lower())))
+
+
+class StudentIndex:
+    """Every student's mobile numbers and name forms, loaded with one query"""
+
+    def __init__(self):
+        self.by_mobile = defaultdict(set)
+        self.by_name = defaultdict(set)
+        rows = AdmittedStudent.objects.order_by().values_list(
+            'id', 'full_name', 'student_name', 'surname', 'mobile_own_digits', 'parent_mobile_digits',
+        )
+        for student_id, full_name, student_name, surname, own, parent in rows.iterator(chunk_size=2000):
+            for digits in (own, parent):
+                if digits:
+                    self.by_mobile[digits].add(student_id)
+            # Statements usually carry "FIRST LAST" without the father's name
+            for name in (full_name, f'{student_name} {surname}'):
+                if name_key(name):
+                    self.by_name[name_key(name)].add(student_id)
+
+    def match(self, name, mobile):
+        """(student id or None, candidate ids) for a statement row"""
+        by_mobile = self.by_mobile.get(normalize_mobile(mobile), set()) if mobile else set()
+        by_name = self.by_name.get(name_key(name), set()) if name else set()
+
+        if by_mobile:
+            if len(by_mobile) == 1:
+                return next(iter(by_mobile)), by_mobile
+            # A shared (parent's) number: the name decides
+            both = by_mobile & by_name
+            return (next(iter(both)) if len(both) == 1 else None), by_mobile
+        if len(by_name) == 1:
+            return next(iter(by_name)), by_name
+        return None, by_name
+
+
+# ================= STATEMENT ROWS =================
+class StatementRow:
+    def __init__(self, number, raw, values):
+        self.number = number
+        self.raw = raw
+        self.reference = values.get('reference', '')[:64]
+        self.payer_name = values.get('payer_name', '')[:200]
+        self.payer_mobile = values.get('payer_mobile', '')[:20]
+        self.amount = parse_decimal(values.get('amount', ''))
+        paid_on = parse_date(values.get('paid_on', '')[:10])
+        self.paid_on = local_midnight(paid_on) if paid_on else None
+
+    @property
+    def is_complete(self):
+        return bool(self.amount and self.amount > 0 and (self.payer_name or self.payer_mobile))
+
+    def review(self, settlement, reason, candidates=()):
+        return SettlementReview(
+            settlement=settlement, row_number=self.number, reason=reason,
+            reference=self.reference, payer_name=self.payer_name, payer_mobile=self.payer_mobile,
+            amount=self.amount, paid_on=self.paid_on,
+            candidate_ids=sorted(candidates), raw=self.raw,
+        )
+
+
+def read_statement(source, filename):
+    headers, records = read_rows(source, filename)
+    columns = {}
+    for header in headers:
+        key = column_key(header, STATEMENT_ALIASES)
+        if key in STATEMENT_FIELDS:
+            columns.setdefault(key, header)
+    if 'amount' not in columns or not ({'payer_name', 'payer_mobile'} & set(columns)):
+        raise ImportFileError('The statement needs an amount column and a name or mobile column')
+
+    return [
+        StatementRow(number, raw, {field: raw.get(header, '') for field, header in columns.items()})
+        for number, raw in records
+    ]
+
+
+def _known_references(references):
+    """References already posted or waiting in the review queue"""
+    references = [reference for reference in references if reference]
+    if not references:
+        return set()
+    posted = FeePayment.objects.filter(settlement_ref__in=references).values_list('settlement_ref', flat=True)
+    queued = (
+        SettlementReview.objects
+        .filter(reference__in=references)
+        .exclude(status='dismissed')
+        .values_list('reference', flat=True)
+    )
+    return set(posted) | set(queued)
+
+
+# ================= IMPORT =================
+def _payment(student, row, payment_mode, paid_before):
+    return FeePayment(
+        student=student,
+        amount=row.amount,
+        payment_mode=payment_mode,
+        payment_date=row.paid_on or timezone.now(),
+        remarks=f'{payment_mode} settlement {row.reference}'.strip(),
+        settlement_ref=row.reference,
+        total_fees_at_payment=student.total_fees,
+        paid_before_this=paid_before,
+        remaining_after_this=student.total_fees - paid_before - row.amount,
+    )
+
+
+def import_settlement(source, filename, payment_mode, user=None):
+    """Post what can be matched from a statement file; returns the SettlementImport"""
+    if payment_mode not in SETTLEMENT_MODES:
+        raise ImportFileError(f'Payment mode must be one of: {", ".join(SETTLEMENT_MODES)}')
+    rows = read_statement(source, filename)
+
+    index = StudentIndex()
+    known = _known_references(row.reference for row in rows)
+    seen = set()
+    matched, unmatched, duplicates = [], [], 0
+    for row in rows:
+        if row.reference and (row.reference in known or row.reference in seen):
+            duplicates += 1
+            continue
+        seen.add(row.reference)
+        if not row.is_complete:
+            unmatched.append((row, 'invalid', ()))
+            continue
+        student_id, candidates = index.match(row.payer_name, row.payer_mobile)
+        if student_id:
+            matched.append((row, student_id))
+        else:
+            unmatched.append((row, 'ambiguous' if len(candidates) > 1 else 'no_match', candidates))
+
+    with transaction.atomic():
+        settlement = SettlementImport.objects.create(
+            filename=filename[:255], payment_mode=payment_mode, rows_total=len(rows),
+            duplicates=duplicates, created_by=user if user and user.is_authenticated else None,
+        )
+        students = AdmittedStudent.objects.select_for_update().in_bulk({student_id for _, student_id in matched})
+
+        # Oldest transactions first, so each receipt's before/after figures follow on
+        posted = []
+        for row, student_id in sorted(matched, key=lambda item: (item[0].paid_on or timezone.now(), item[0].number)):
+            student = students.get(student_id)
+            if student is None or row.amount > student.remaining_fees:
+                unmatched.append((row, 'over_remaining' if student else 'no_match', [student_id]))
+                continue
+            posted.append((row, student, student.paid_fees))
+            student.paid_fees += row.amount
+
+        payments = [_payment(student, row, payment_mode, paid_before) for row, student, paid_before in posted]
+        assign_receipt_numbers(payments)
+        FeePayment.objects.bulk_create(payments)
+        # Increments, as core.ledger does: the totals were read under the lock above
+        added = defaultdict(Decimal)
+        for row, student, _ in posted:
+            added[student.id] += row.amount
+        changed = [students[student_id] for student_id in added]
+        now = timezone.now()
+        for student in changed:
+            student.paid_fees = F('paid_fees') + added[student.id]
+            student.version = F('version') + 1
+            student.updated_at = now
+        AdmittedStudent.objects.bulk_update(changed, ['paid_fees', 'version', 'updated_at'])
+
+        SettlementReview.objects.bulk_create(
+            row.review(settlement, reason, candidates) for row, reason, candidates in unmatched
+        )
+        settlement.matched = len(payments)
+        settlement.queued_for_review = len(unmatched)
+        settlement.save(update_fields=['matched', 'queued_for_review'])
+
+        if payments:
+            post_bulk_create.send(sender=FeePayment, instances=payments)
+            post_bulk_update.send(sender=AdmittedStudent, instances=changed)
+        # Statement dates are usually in the past: receipts posted since then move up
+        by_student = defaultdict(list)
+        for payment in payments:
+            by_student[payment.student_id].append(payment)
+        for student_id, student_payments in by_student.items():
+            ledger.rechain(student_id, student_payments)
+
+    return settlement
+
+
+# ================= REVIEW QUEUE =================
+class ReviewError(Exception):
+    pass
+
+
+def _claim(review, status, user):
+    """
+    Move a pending row to ``status``; one conditional UPDATE, so of two
+    concurrent (or double-clicked) submits only the first gets the row
+    """
+    now = timezone.now()
+    claimed = SettlementReview.objects.filter(pk=review.pk, status='pending').update(
+        status=status, resolved_by=user, resolved_at=now,
+    )
+    if not claimed:
+        raise ReviewError('This row has already been dealt with')
+    review.status, review.resolved_by, review.resolved_at = status, user, now
+
+
+def post_review(review, student_id, user=None):
+    """Post a queued row to the chosen student as a normal payment"""
+    if not review.amount or review.amount <= 0:
+        raise ReviewError('This row has no amount to post')
+
+    with transaction.atomic():
+        # Claimed first: a failure below rolls the claim back with the payment
+        _claim(review, 'posted', user)
+        try:
+            student = ledger.pay(student_id, review.amount)
+        except AdmittedStudent.DoesNotExist:
+            raise ReviewError('Student not found')
+        except ledger.LedgerError as e:
+            raise ReviewError(str(e))
+
+        payment_mode = review.settlement.payment_mode
+        payment = FeePayment.objects.create(
+            student=student,
+            amount=review.amount,
+            payment_mode=payment_mode,
+            payment_date=review.paid_on or timezone.now(),
+            remarks=f'{payment_mode} settlement {review.reference}'.strip(),
+            settlement_ref=review.reference,
+            total_fees_at_payment=student.total_fees,
+            paid_before_this=student.paid_fees,
+            remaining_after_this=student.total_fees - student.paid_fees - review.amount,
+        )
+        if ledger.rechain(student.id, [payment]):
+            payment.refresh_from_db(fields=['paid_before_this', 'remaining_after_this'])
+
+        review.payment = payment
+        review.save(update_fields=['payment'])
+    return payment
+
+
+def dismiss_review(review, user=None):
+    _claim(review, 'dismissed', user)
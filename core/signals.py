@@ -0,0 +1,216 @@
+from django.db import connections, transaction
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from . import media, rollups, search, versions
+from .receipts import STUDENT_RECEIPT_FIELDS, TOMBSTONE_RETENTION
+from .typeahead import index as typeahead_index
+from .models import (
+    Enquiry, AdmittedStudent, FeePayment,
+    AdmissionRollup, EnquiryRollup, CollectionRollup, ReceiptTombstone,
+)
+
+
+# bulk_create()/bulk_update() send no post_save; code that writes rows in bulk
+# (core.imports, core.settlements) sends these instead, with the rows as ``instances``
+post_bulk_create = Signal()
+post_bulk_update = Signal()
+
+
+# ================= ENQUIRY ROLLUPS =================
+@receiver(pre_save, sender=Enquiry)
+def remember_enquiry_state(sender, instance, raw=False, **kwargs):
+    instance._rollup_state = None
+    if raw or not instance.pk:
+        return
+    previous = Enquiry.objects.filter(pk=instance.pk).only('created_at', 'course').first()
+    if previous:
+        instance._rollup_state = rollups.enquiry_state(previous)
+
+
+@receiver(post_save, sender=Enquiry)
+def update_enquiry_rollups(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_state', None)
+    if previous:
+        rollups.move(EnquiryRollup, previous, rollups.enquiry_state(instance))
+    else:
+        rollups.apply(EnquiryRollup, rollups.enquiry_state(instance), 1)
+
+
+@receiver(post_delete, sender=Enquiry)
+def remove_enquiry_rollups(sender, instance, **kwargs):
+    rollups.apply(EnquiryRollup, rollups.enquiry_state(instance), -1)
+
+
+# ================= ADMISSION ROLLUPS =================
+@receiver(pre_save, sender=AdmittedStudent)
+def remember_admission_state(sender, instance, raw=False, **kwargs):
+    instance._rollup_state = None
+    instance._receipt_fields = None
+    if raw or not instance.pk:
+        return
+    previous = (
+        AdmittedStudent.objects
+        .filter(pk=instance.pk)
+        .only('admission_date', *STUDENT_RECEIPT_FIELDS)
+        .first()
+    )
+    if previous:
+        instance._rollup_state = rollups.admission_state(previous)
+        instance._receipt_fields = [getattr(previous, field) for field in STUDENT_RECEIPT_FIELDS]
+
+
+@receiver(post_save, sender=AdmittedStudent)
+def update_admission_rollups(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = rollups.admission_state(instance)
+    previous = getattr(instance, '_rollup_state', None)
+    if not previous:
+        rollups.apply(AdmissionRollup, current, 1)
+        return
+
+    rollups.move(AdmissionRollup, previous, current)
+
+    # Collections are bucketed by course label, so follow a course change
+    if previous['course_name'] != current['course_name']:
+        for payment in FeePayment.objects.filter(student=instance).only('payment_date', 'payment_mode', 'amount'):
+            rollups.move(
+                CollectionRollup,
+                rollups.collection_state(payment, previous['course_name']),
+                rollups.collection_state(payment, current['course_name']),
+            )
+
+
+@receiver(post_bulk_create, sender=AdmittedStudent)
+def add_bulk_admission_rollups(sender, instances, **kwargs):
+    rollups.apply_many(AdmissionRollup, [rollups.admission_state(student) for student in instances])
+
+
+@receiver(post_delete, sender=AdmittedStudent)
+def remove_admission_rollups(sender, instance, **kwargs):
+    rollups.apply(AdmissionRollup, rollups.admission_state(instance), -1)
+
+
+# ================= COLLECTION ROLLUPS =================
+def _student_course_name(student_id):
+    student = AdmittedStudent.objects.filter(pk=student_id).only('course', 'custom_course').first()
+    return rollups.course_name_for(student.course, student.custom_course) if student else ''
+
+
+def _payment_course_name(payment):
+    # Reuse the student already attached to the payment when there is one
+    if FeePayment.student.is_cached(payment):
+        student = payment.student
+        return rollups.course_name_for(student.course, student.custom_course)
+    return _student_course_name(payment.student_id)
+
+
+@receiver(pre_save, sender=FeePayment)
+def remember_collection_state(sender, instance, raw=False, **kwargs):
+    instance._rollup_state = None
+    if raw or not instance.pk:
+        return
+    previous = (
+        FeePayment.objects
+        .filter(pk=instance.pk)
+        .only('payment_date', 'payment_mode', 'amount', 'student_id')
+        .first()
+    )
+    if previous:
+        instance._rollup_state = rollups.collection_state(
+            previous, _student_course_name(previous.student_id)
+        )
+
+
+@receiver(post_save, sender=FeePayment)
+def update_collection_rollups(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = rollups.collection_state(instance, _payment_course_name(instance))
+    previous = getattr(instance, '_rollup_state', None)
+    if previous:
+        rollups.move(CollectionRollup, previous, current)
+    else:
+        rollups.apply(CollectionRollup, current, 1)
+
+
+@receiver(post_bulk_create, sender=FeePayment)
+def add_bulk_collection_rollups(sender, instances, **kwargs):
+    rollups.apply_many(
+        CollectionRollup,
+        [rollups.collection_state(payment, _payment_course_name(payment)) for payment in instances],
+    )
+
+
+@receiver(post_delete, sender=FeePayment)
+def remove_collection_rollups(sender, instance, **kwargs):
+    rollups.apply(CollectionRollup, rollups.collection_state(instance, _payment_course_name(instance)), -1)
+
+
+# ================= RECEIPT CHANGE FEED =================
+@receiver(post_save, sender=AdmittedStudent)
+def touch_student_receipts(sender, instance, raw=False, **kwargs):
+    # Receipts show the student's name, course and mobile: resend them to syncing clients
+    previous = getattr(instance, '_receipt_fields', None)
+    if raw or previous is None:
+        return
+    if previous != [getattr(instance, field) for field in STUDENT_RECEIPT_FIELDS]:
+        FeePayment.objects.filter(student=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=FeePayment)
+def record_receipt_tombstone(sender, instance, **kwargs):
+    ReceiptTombstone.objects.create(receipt_id=instance.id, receipt_no=instance.receipt_no)
+    ReceiptTombstone.objects.filter(deleted_at__lt=timezone.now() - TOMBSTONE_RETENTION).delete()
+
+
+# ================= MEDIA REFERENCES =================
+@receiver(post_delete, sender=AdmittedStudent)
+def release_student_photo(sender, instance, **kwargs):
+    # The file itself goes later, with the media sweeper
+    if instance.photo:
+        media.release([instance.photo.name])
+
+
+# ================= DATA VERSIONS =================
+def bump_data_version(sender, **kwargs):
+    versions.bump(versions.DATA_SETS[sender])
+
+
+for model in versions.DATA_SETS:
+    post_save.connect(bump_data_version, sender=model, dispatch_uid=f'data_version_save_{model.__name__}')
+    post_delete.connect(bump_data_version, sender=model, dispatch_uid=f'data_version_delete_{model.__name__}')
+    post_bulk_create.connect(bump_data_version, sender=model, dispatch_uid=f'data_version_bulk_{model.__name__}')
+    post_bulk_update.connect(bump_data_version, sender=model, dispatch_uid=f'data_version_bulk_update_{model.__name__}')
+
+
+# ================= SEARCH INDEX =================
+@receiver(post_migrate)
+def ensure_search_indexes(sender, using='default', **kwargs):
+    if sender.name == 'core':
+        search.ensure_indexes(connections[using])
+
+
+# ================= TYPEAHEAD INDEX =================
+# The index lives in memory, outside the transaction: change it only once the
+# write is committed, so a rollback leaves no phantom or missing entries
+@receiver(post_save, sender=AdmittedStudent)
+def update_typeahead(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: typeahead_index.add(instance))
+
+
+@receiver(post_bulk_create, sender=AdmittedStudent)
+def bulk_update_typeahead(sender, instances, **kwargs):
+    instances = list(instances)
+    transaction.on_commit(lambda: typeahead_index.add_many(instances))
+
+
+@receiver(post_delete, sender=AdmittedStudent)
+def remove_from_typeahead(sender, instance, **kwargs):
+    student_id = instance.id
+    transaction.on_commit(lambda: typeahead_index.remove(student_id))
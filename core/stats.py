@@ -0,0 +1,15 @@
+from django.db.models import Case, F, When
+
+
+# ================= COURSE LABEL =================
+def course_label(prefix=''):
+    """Course name as shown to staff: the custom course when 'Other' is picked"""
+    return Case(
+        When(**{
+            f'{prefix}course': 'Other',
+            f'{prefix}custom_course__gt': '',
+            'then': F(f'{prefix}custom_course'),
+        }),
+        default=F(f'{prefix}course'),
+    )
+
@@ -0,0 +1,90 @@
+"""
+File storage backends.
+
+Content-addressed storage for student photos:
+
+A file is stored under the SHA-256 of its bytes -
+``student_photos/3f/3f9c...e1.jpg`` - whatever name it was saved with. The
+same photo uploaded twice is kept once, and a stored file's content never
+changes under its name, so it and everything derived from it (core.images
+renditions) can be cached indefinitely.
+
+Several students can point at one file, so files are never deleted
+directly: core.media counts the references in MediaBlob and a sweeper
+removes the files nobody uses any more.
+
+CompressedManifestStaticFilesStorage is the static files storage with
+DEBUG off: hashed names, plus precompressed copies core.assets can send.
+"""
+import gzip
+import hashlib
+import posixpath
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz copies are written
+    brotli = None
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible(path='core.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        """'student_photos/IMG_2041.JPG' -> 'student_photos/3f/3f9c...e1.jpg'"""
+        folder, filename = posixpath.split(name)
+        ext = posixpath.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return posixpath.join(folder, digest[:2], f'{digest}{ext}')
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Already stored: same bytes, nothing to write
+            return name
+        return super()._save(name, content)
+
+
+# ================= STATIC FILES =================
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    After ``collectstatic`` has hashed the names, writes a .gz (and with the
+    ``brotli`` package a .br) copy of each text file, where that saves space
+    """
+    compress_extensions = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.xml')
+    # Copies that save less than this are not worth a second lookup
+    min_saving = 0.05
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            if name.endswith(self.compress_extensions):
+                for compressed_name in self.compress(name):
+                    yield name, compressed_name, True
+
+    def compress(self, name):
+        with self.open(name) as source:
+            data = source.read()
+        encoders = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            encoders.append(('.br', lambda data: brotli.compress(data, quality=11)))
+        for suffix, encode in encoders:
+            compressed = encode(data)
+            if len(compressed) > len(data) * (1 - self.min_saving):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            yield self._save(name + suffix, ContentFile(compressed))
@@ -0,0 +1,15 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import ImproperlyConfigured
+from django.templatetags.static import static
+
+register = template.Library()
+
+
+@register.simple_tag
+def vendor_static(path):
+    """The URL of a VENDOR_ASSETS library's copy under static/; pages never load it from a CDN"""
+    if path not in settings.VENDOR_ASSETS or finders.find(path) is None:
+        raise ImproperlyConfigured(f"{path} is not vendored; run `python manage.py vendor_assets` and commit it")
+    return static(path)
@@ -1,3 +1,1237 @@
-from django.test import TestCase
+import gzip
+import json
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    assets, caching, export_cache, export_jobs, images, ledger, media, receipt_numbers, rollups, search, settlements,
+    typeahead, views,
+)
+from .filters import filter_period
+from .search import search_enquiries, search_receipts, search_students
+from .models import (
+    Enquiry, AdmittedStudent, Course, Student, FeePayment, ExportJob, SettlementReview, ReceiptSequence, MediaBlob,
+    AdmissionRollup, EnquiryRollup, CollectionRollup,
+)
+
+
+def make_student(**overrides):
+    data = {
+        'course': 'MS-CIT',
+        'student_name': 'Ravi',
+        'father_name': 'Suresh',
+        'surname': 'Patil',
+        'mother_name': 'Sunita',
+        'full_name': 'Ravi Suresh Patil',
+        'date_of_birth': date(2005, 1, 1),
+        'mobile_own': '9876543210',
+        'gender': 'Male',
+        'marital_status': 'Single',
+        'address': 'Main Road',
+        'city': 'Murud',
+        'tehsil_block': 'Latur',
+        'district': 'Latur',
+        'pin_code': '413510',
+        'educational_qualification': 'HSC',
+    }
+    data.update(overrides)
+    return AdmittedStudent.objects.create(**data)
+
+
+def use_temp_dir(test, setting):
+    """Point ``setting`` at a fresh directory for the duration of ``test``"""
+    path = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, path)
+    override = override_settings(**{setting: path})
+    override.enable()
+    test.addCleanup(override.disable)
+    return path
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_is_constant(self):
+        make_student()
+        _, small = self.dashboard_queries()
+
+        for i in range(25):
+            make_student(course='Other' if i % 2 else 'Tally', custom_course='Python')
+        Enquiry.objects.create(name='A', mobile='1', education='HSC', course='Tally')
+        _, large = self.dashboard_queries()
+
+        self.assertEqual(small, large)
+
+    def test_counts_and_distribution(self):
+        make_student()
+        make_student(course='Tally')
+        make_student(course='Other', custom_course='Python')
+        make_student(course='Other', custom_course='')
+
+        response, _ = self.dashboard_queries()
+
+        self.assertEqual(response.context['mscit_count'], 1)
+        self.assertEqual(response.context['klic_count'], 3)
+        distribution = json.loads(response.context['course_distribution'])
+        self.assertEqual(distribution, {'MS-CIT': 1, 'Other': 1, 'Python': 1, 'Tally': 1})
+        monthly = json.loads(response.context['monthly_data'])
+        self.assertEqual(sum(monthly.values()), 4)
+
+
+class CachingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+
+    def test_dashboard_is_cached_until_data_changes(self):
+        make_student()
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(reverse('dashboard'))
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(reverse('dashboard'))
+        self.assertLess(len(second), len(first))
+        self.assertEqual(response.context['mscit_count'], 1)
+
+        make_student(course='Tally')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['klic_count'], 1)
+        self.assertEqual(caching.stats()['dashboard'], {'hits': 1, 'misses': 2, 'hit_rate': 0.333})
+
+    def test_facets_and_counts(self):
+        Enquiry.objects.create(name='A', mobile='1', education='HSC', course='Tally')
+        self.client.get(reverse('enquiry_list'), {'course': 'Tally'})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('enquiry_list'), {'course': 'Tally'})
+        self.assertFalse([q for q in ctx.captured_queries if 'DISTINCT' in q['sql'] or 'COUNT(' in q['sql']])
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+        Enquiry.objects.create(name='B', mobile='2', education='HSC', course='MS-CIT')
+        response = self.client.get(reverse('enquiry_list'))
+        self.assertEqual(list(response.context['available_courses']), ['MS-CIT', 'Tally'])
+        self.assertEqual(response.context['available_years'], [timezone.localdate().year])
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+
+        make_student()
+        response = self.client.get(reverse('admitted_students'), {'course': 'MS-CIT'})
+        self.assertEqual(response.context['total_count'], 1)
+
+        stats = self.client.get(reverse('cache_stats')).json()['stats']
+        self.assertEqual(stats['enquiry_facets'], {'hits': 1, 'misses': 2, 'hit_rate': 0.333})
+        self.assertEqual(stats['admitted_student_count']['misses'], 1)
+
+
+class RollupTests(TestCase):
+    def snapshot(self):
+        snapshot = {}
+        for model in (AdmissionRollup, EnquiryRollup, CollectionRollup):
+            fields = [field.name for field in model._meta.fields if field.name != 'id']
+            rows = model.objects.exclude(count=0).values_list(*fields)
+            snapshot[model.__name__] = sorted(rows)
+        return snapshot
+
+    def test_signals_match_rebuild(self):
+        student = make_student()
+        other = make_student(course='Tally')
+        Enquiry.objects.create(name='A', mobile='1', education='HSC', course='Tally')
+        payment = FeePayment.objects.create(
+            student=student, amount=1000, payment_mode='Cash',
+            total_fees_at_payment=5000, paid_before_this=0, remaining_after_this=4000,
+        )
+        FeePayment.objects.create(
+            student=other, amount=500, payment_mode='UPI',
+            total_fees_at_payment=5000, paid_before_this=0, remaining_after_this=4500,
+        )
+
+        payment.amount = 1500
+        payment.save()
+        student.course = 'Other'
+        student.custom_course = 'Python'
+        student.save()
+        other.delete()
+
+        incremental = self.snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+        self.assertEqual(rollups.course_distribution(), {'Python': 1})
+
+
+class FilterPeriodTests(TestCase):
+    def enquiry_at(self, moment):
+        enquiry = Enquiry.objects.create(name='A', mobile='1', education='HSC', course='Tally')
+        Enquiry.objects.filter(pk=enquiry.pk).update(created_at=moment)
+        return enquiry
+
+    def test_ranges_follow_local_time(self):
+        # 20:00 UTC on 31 Dec is already 1 Jan in Asia/Kolkata
+        new_year = self.enquiry_at(datetime(2024, 12, 31, 20, 0, tzinfo=dt_timezone.utc))
+        december = self.enquiry_at(datetime(2024, 12, 31, 10, 0, tzinfo=dt_timezone.utc))
+        enquiries = Enquiry.objects.all()
+
+        self.assertEqual(list(filter_period(enquiries, 'created_at', year='2025')), [new_year])
+        self.assertEqual(list(filter_period(enquiries, 'created_at', year='2024', month='12')), [december])
+        self.assertEqual(list(filter_period(enquiries, 'created_at', day='2025-01-01')), [new_year])
+
+    def test_month_without_year_and_invalid_values(self):
+        first = self.enquiry_at(datetime(2023, 3, 10, 6, 0, tzinfo=dt_timezone.utc))
+        second = self.enquiry_at(datetime(2025, 3, 10, 6, 0, tzinfo=dt_timezone.utc))
+        self.enquiry_at(datetime(2024, 4, 10, 6, 0, tzinfo=dt_timezone.utc))
+        enquiries = Enquiry.objects.order_by('created_at')
+
+        self.assertEqual(list(filter_period(enquiries, 'created_at', month='3')), [first, second])
+        self.assertEqual(filter_period(enquiries, 'created_at', year='abc', month='13').count(), 3)
+
+
+class SearchTests(TestCase):
+    def test_students_enquiries_and_receipts(self):
+        ravi = make_student()
+        asha = make_student(student_name='Asha', full_name='Asha Ramesh Jadhav', mobile_own='9123456780')
+        payment = FeePayment.objects.create(
+            student=asha, amount=100, payment_mode='Cash',
+            total_fees_at_payment=5000, paid_before_this=0, remaining_after_this=4900,
+        )
+        enquiry = Enquiry.objects.create(name='Kiran More', mobile='9000000001', education='SSC', course='Tally')
+
+        students = AdmittedStudent.objects.all()
+        self.assertEqual(list(search_students(students, 'ravi pat')), [ravi])
+        self.assertEqual(list(search_students(students, '91234')), [asha])
+        self.assertEqual(list(search_students(students, '6780')), [asha])
+
+        # The index follows updates and deletes
+        ravi.full_name = 'Ravi Suresh Kale'
+        ravi.save()
+        self.assertEqual(list(search_students(students, 'kale')), [ravi])
+        self.assertEqual(list(search_students(students, 'patil')), [])
+        ravi.delete()
+        self.assertEqual(list(search_students(students, 'ravi')), [])
+
+        self.assertEqual(list(search_enquiries(Enquiry.objects.all(), 'tally')), [enquiry])
+        self.assertEqual(list(search_enquiries(Enquiry.objects.all(), '0001')), [enquiry])
+
+        payments = FeePayment.objects.all()
+        self.assertEqual(list(search_receipts(payments, 'jadhav')), [payment])
+        self.assertEqual(list(search_receipts(payments, payment.receipt_no.lower())), [payment])
+        self.assertEqual(list(search_receipts(payments, '1')), [payment])
+
+    def test_postgres_substring_fallback_escapes_like_wildcards(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            subquery = search._matching_ids('core_enquiry', '50%_off\\')
+        self.assertEqual(subquery.params[1], '%50\\%\\_off\\\\%')
+
+
+class MobileDigitsTests(TestCase):
+    def test_digits_kept_in_sync(self):
+        student = make_student(mobile_own='+91 98765-43210', parent_mobile='(0) 91234 56780')
+        self.assertEqual(student.mobile_own_digits, '9876543210')
+        self.assertEqual(student.mobile_own_reversed, '0123456789')
+        self.assertEqual(student.parent_mobile_digits, '9123456780')
+
+        student.parent_mobile = '9000000001'
+        student.save(update_fields=['parent_mobile'])
+        student.refresh_from_db()
+        self.assertEqual(student.parent_mobile_reversed, '1000000009')
+
+        students = AdmittedStudent.objects.all()
+        self.assertEqual(list(search_students(students, '0001')), [student])
+        self.assertEqual(list(search_students(students, '98765 43')), [student])
+
+
+class AdmittedStudentPageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+
+    def test_cursor_walks_every_student_once(self):
+        for i in range(7):
+            make_student(full_name=f'Student {i}')
+        # Same admission timestamp for several rows: the id breaks the tie
+        AdmittedStudent.objects.filter(full_name__in=['Student 2', 'Student 3', 'Student 4']).update(
+            admission_date=datetime(2025, 6, 1, 10, 0, 0, 123456, tzinfo=dt_timezone.utc)
+        )
+
+        seen, cursor = [], ''
+        while True:
+            response = self.client.get(reverse('admitted_students_page'), {'size': 3, 'cursor': cursor})
+            data = response.json()
+            seen.extend(student['full_name'] for student in data['students'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        expected = list(
+            AdmittedStudent.objects.order_by('-admission_date', '-id').values_list('full_name', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_first_page_is_rendered(self):
+        make_student(course='Tally')
+        make_student()
+        response = self.client.get(reverse('admitted_students'), {'course': 'Tally'})
+        self.assertEqual(response.context['total_count'], 1)
+        self.assertEqual(len(response.context['students']), 1)
+        self.assertEqual(response.context['next_cursor'], '')
+
+
+class ReceiptsApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+
+    def pay(self, student, amount, mode='Cash'):
+        return FeePayment.objects.create(
+            student=student, amount=amount, payment_mode=mode,
+            total_fees_at_payment=5000, paid_before_this=0, remaining_after_this=5000 - amount,
+        )
+
+    def get(self, **params):
+        return self.client.get(reverse('get_receipts'), params).json()
+
+    def test_pages_sort_fields_and_totals(self):
+        ravi = make_student()
+        asha = make_student(student_name='Asha', full_name='Asha Jadhav', mobile_own='9123456780')
+        for amount in (100, 300, 200):
+            self.pay(ravi, amount)
+        self.pay(asha, 50, mode='UPI')
+
+        first = self.get(sort='amount_desc', size=2, fields='receipt_no,paid_fees,bogus')
+        self.assertEqual([r['paid_fees'] for r in first['receipts']], [300.0, 200.0])
+        self.assertEqual(set(first['receipts'][0]), {'id', 'receipt_no', 'paid_fees'})
+        self.assertEqual(first['totals'], {'count': 4, 'paid': 650.0, 'remaining': 19350.0})
+
+        second = self.get(sort='amount_desc', size=2, cursor=first['next_cursor'])
+        self.assertEqual([r['paid_fees'] for r in second['receipts']], [100.0, 50.0])
+        self.assertIsNone(second['next_cursor'])
+        self.assertNotIn('totals', second)
+
+        filtered = self.get(search='jadhav', payment_mode='UPI')
+        self.assertEqual([r['student_name'] for r in filtered['receipts']], ['Asha Jadhav'])
+        self.assertEqual(filtered['totals']['paid'], 50.0)
+
+
+class ReceiptChangesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+
+    def changes(self, since=''):
+        return self.client.get(reverse('get_receipt_changes'), {'since': since}).json()
+
+    def test_delta_since_token(self):
+        student = make_student()
+        kept = FeePayment.objects.create(
+            student=student, amount=100, payment_mode='Cash',
+            total_fees_at_payment=5000, paid_before_this=0, remaining_after_this=4900,
+        )
+        removed = FeePayment.objects.create(
+            student=student, amount=200, payment_mode='Cash',
+            total_fees_at_payment=5000, paid_before_this=100, remaining_after_this=4700,
+        )
+
+        full = self.changes()
+        self.assertTrue(full['reset'])
+        self.assertEqual({r['id'] for r in full['receipts']}, {kept.id, removed.id})
+
+        # Nothing changes: old rows are only resent inside the overlap window
+        FeePayment.objects.update(updated_at=datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        quiet = self.changes(full['token'])
+        self.assertFalse(quiet['reset'])
+        self.assertEqual((quiet['receipts'], quiet['deleted']), ([], []))
+
+        removed_id = removed.id
+        removed.delete()
+        student.full_name = 'Ravi Suresh Kale'
+        student.save()
+        delta = self.changes(full['token'])
+        self.assertEqual(delta['deleted'], [removed_id])
+        self.assertEqual([(r['id'], r['student_name']) for r in delta['receipts']], [(kept.id, 'Ravi Suresh Kale')])
+
+
+class EnquiryExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+        use_temp_dir(self, 'EXPORT_CACHE_DIR')
+
+    def test_streams_plain_and_gzip(self):
+        for i in range(3):
+            Enquiry.objects.create(name=f'Enquirer {i}', mobile='9000000001', education='SSC', course='Tally')
+
+        response = self.client.get(reverse('export_enquiries'), {'course': 'Tally'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'ID,Name,Mobile,Education,Course,Date & Time')
+        self.assertEqual(len(lines), 4)
+
+        response = self.client.get(reverse('export_enquiries'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(len(body.splitlines()), 4)
+
+
+class XlsxExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+        use_temp_dir(self, 'EXPORT_CACHE_DIR')
+
+    def workbook(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertTrue(response.streaming)
+        return openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+
+    def test_streamed_workbooks_open_in_openpyxl(self):
+        student = make_student(full_name='Ravi <Suresh> & Patil')
+        FeePayment.objects.create(
+            student=student, amount=1000, payment_mode='Cash', remarks='  first\x01 instalment',
+            total_fees_at_payment=5000, paid_before_this=0, remaining_after_this=4000,
+        )
+
+        sheet = self.workbook('export_admitted_students_excel').active
+        self.assertEqual(sheet.title, 'Admitted Students')
+        self.assertEqual(sheet['A1'].value, 'S.No')
+        self.assertTrue(sheet['A1'].font.b)
+        self.assertEqual(sheet['B2'].value, 'Ravi <Suresh> & Patil')
+        self.assertEqual(sheet['T2'].value, 5000)
+        self.assertEqual(sheet.column_dimensions['B'].width, len('Ravi <Suresh> & Patil') + 2)
+
+        sheet = self.workbook('export_receipts').active
+        self.assertEqual([cell.value for cell in sheet[2]][:2], [FeePayment.objects.get().receipt_no, 'Ravi <Suresh> & Patil'])
+        self.assertEqual(sheet['K2'].value, '  first instalment')
+
+
+class ExportSpecTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+        use_temp_dir(self, 'EXPORT_CACHE_DIR')
+
+    def test_one_query_per_export_in_every_format(self):
+        course = Course.objects.create(name='Tally', duration='3 months')
+        for i in range(5):
+            Student.objects.create(
+                name=f'Student {i}', phone='9000000001', course=course,
+                admission_date=date(2025, 1, 1), total_fees=5000, paid_fees=1000,
+            )
+
+        for export_format in ('csv', 'xlsx', 'json'):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('export_students_excel'), {'format': export_format})
+                body = b''.join(response.streaming_content)
+            # Session + user lookups, then the export itself
+            export_queries = [q for q in ctx.captured_queries if 'core_student' in q['sql']]
+            self.assertEqual(len(export_queries), 1, export_format)
+
+        rows = json.loads(body)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['course'], 'Tally')
+        self.assertEqual(rows[0]['remaining_fees'], 4000.0)
+        self.assertEqual(rows[4]['serial'], 5)
+
+
+class ExportCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+        use_temp_dir(self, 'EXPORT_CACHE_DIR')
+
+    def export(self, **headers):
+        response = self.client.get(reverse('export_enquiries'), {'course': 'Tally', 'search': ''}, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else b''
+        return response, body
+
+    def test_served_from_cache_until_data_changes(self):
+        Enquiry.objects.create(name='Asha', mobile='9000000001', education='HSC', course='Tally')
+
+        first, body = self.export()
+        self.assertEqual(first['X-Export-Cache'], 'miss')
+
+        with CaptureQueriesContext(connection) as ctx:
+            second, cached = self.export()
+        self.assertEqual(second['X-Export-Cache'], 'hit')
+        self.assertEqual(cached, body)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertFalse([q for q in ctx.captured_queries if 'core_enquiry' in q['sql']])
+
+        # Stored gzipped, sent as-is to clients that accept it
+        zipped, data = self.export(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(zipped['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(data), body)
+
+        not_modified, _ = self.export(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        Enquiry.objects.create(name='Kiran', mobile='9000000002', education='SSC', course='Tally')
+        third, body = self.export(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(third['X-Export-Cache'], 'miss')
+        self.assertIn(b'Kiran', body)
+
+    def test_rolled_back_writes_do_not_reuse_cache_keys(self):
+        Enquiry.objects.create(name='Asha', mobile='9000000001', education='HSC', course='Tally')
+        try:
+            with transaction.atomic():
+                Enquiry.objects.create(name='Kiran', mobile='9000000002', education='SSC', course='Tally')
+                self.assertIn(b'Kiran', self.export()[1])
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        # Same version number as the rolled-back write, but a different stamp
+        Enquiry.objects.create(name='Om', mobile='9000000003', education='SSC', course='Tally')
+        response, body = self.export()
+        self.assertEqual(response['X-Export-Cache'], 'miss')
+        self.assertIn(b'Om', body)
+        self.assertNotIn(b'Kiran', body)
+
+    def test_evicts_least_recently_used(self):
+        Enquiry.objects.create(name='Asha', mobile='9000000001', education='HSC', course='Tally')
+        self.export()
+        cached = list(export_cache.cache_dir().glob('*/*'))
+        self.assertEqual(len(cached), 1)
+        self.assertEqual(export_cache.evict(limit=0), 1)
+        self.assertEqual(self.export()[0]['X-Export-Cache'], 'miss')
+
+
+class MonthEndReportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+        use_temp_dir(self, 'EXPORT_CACHE_DIR')
+
+    def test_one_workbook_with_summaries(self):
+        march = datetime(2025, 3, 10, 6, 0, tzinfo=dt_timezone.utc)
+        ravi = make_student(total_fees=5000, paid_fees=0)
+        asha = make_student(full_name='Asha Patil', course='Tally', total_fees=3000, paid_fees=0)
+        AdmittedStudent.objects.filter(pk__in=[ravi.pk, asha.pk]).update(admission_date=march)
+        for student, amount, mode, day in [(ravi, 1000, 'Cash', 10), (ravi, 500, 'UPI', 12), (asha, 700, 'Cash', 11)]:
+            payment = FeePayment.objects.create(
+                student=student, amount=amount, payment_mode=mode,
+                total_fees_at_payment=student.total_fees, paid_before_this=0,
+                remaining_after_this=student.total_fees - amount,
+            )
+            FeePayment.objects.filter(pk=payment.pk).update(payment_date=march.replace(day=day))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('month_end_report'), {'year': '2025', 'month': '3'})
+            book = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+        data_queries = [q for q in ctx.captured_queries if 'core_admittedstudent' in q['sql'] or 'core_feepayment' in q['sql']]
+        self.assertEqual(len(data_queries), 2)
+
+        self.assertEqual(book.sheetnames[:3], ['Students', 'Receipts', 'Course Summary'])
+        self.assertEqual(book['Students'].max_row, 3)
+        self.assertEqual(book['Receipts'].max_row, 4)
+
+        summary = [[cell.value for cell in row] for row in book['Course Summary'].iter_rows(min_row=2)]
+        self.assertEqual(summary, [
+            ['MS-CIT', 1, 5000, 0, 5000, 2, 1500],
+            ['Tally', 1, 3000, 0, 3000, 1, 700],
+            ['Total', 2, 8000, 0, 8000, 3, 2200],
+        ])
+        cash = [[cell.value for cell in row] for row in book['Cash Book - Cash'].iter_rows(min_row=2)]
+        self.assertEqual(cash, [['10-03-2025', 1, 1000, 1000], ['11-03-2025', 1, 700, 1700], ['Total', 2, 1700, 1700]])
+
+
+@override_settings(EXPORT_JOB_RUNNER='worker')
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+        use_temp_dir(self, 'MEDIA_ROOT')
+        use_temp_dir(self, 'EXPORT_CACHE_DIR')
+
+    def test_background_export_runs_and_downloads(self):
+        Enquiry.objects.create(name='Asha', mobile='9000000001', education='HSC', course='Tally')
+        Enquiry.objects.create(name='Kiran', mobile='9000000002', education='SSC', course='MS-CIT')
+
+        response = self.client.get(reverse('export_enquiries'), {'course': 'Tally', 'background': '1'})
+        self.assertEqual(response.status_code, 202)
+        job = response.json()['job']
+        self.assertEqual(job['status'], 'queued')
+        self.assertEqual(ExportJob.objects.get().params, {'course': 'Tally'})
+
+        self.assertEqual(self.client.get(job['status_url']).json()['job']['download_url'], None)
+        self.assertEqual(export_jobs.run_queued(), 1)
+
+        job = self.client.get(job['status_url']).json()['job']
+        self.assertEqual((job['status'], job['rows_done'], job['rows_total'], job['percent']), ('done', 1, 1, 100))
+
+        response = self.client.get(job['download_url'])
+        body = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertIn('Asha', body)
+        self.assertNotIn('Kiran', body)
+
+        # Other users cannot see the job; expired files are gone
+        other = User.objects.create_user('other', password='secret123')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(job['status_url']).status_code, 404)
+
+        self.client.force_login(self.user)
+        ExportJob.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(export_jobs.purge_expired(), 1)
+        self.assertEqual(self.client.get(job['download_url']).status_code, 410)
+
+    @override_settings(EXPORT_JOB_RUNNER='thread')
+    def test_thread_runner_cleans_up(self):
+        Enquiry.objects.create(name='Asha', mobile='9000000001', education='HSC', course='Tally')
+        long_ago = timezone.now() - timedelta(days=2)
+        stale = ExportJob.objects.create(kind='enquiries', export_format='csv', status='running')
+        orphan = ExportJob.objects.create(kind='enquiries', export_format='csv')
+        ExportJob.objects.filter(pk__in=[stale.pk, orphan.pk]).update(created_at=long_ago, started_at=long_ago)
+        finished = ExportJob.objects.create(kind='enquiries', export_format='csv')
+        export_jobs.run_job(finished.id)
+        ExportJob.objects.filter(pk=finished.pk).update(expires_at=long_ago)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.get(reverse('export_enquiries'), {'background': '1'})
+        # Run in the thread pool and, every few minutes, the housekeeping
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(export_jobs.orphaned_jobs(), [orphan.id])
+
+        # What the pool does with the orphan, without threads in a test
+        export_jobs.run_job(orphan.id)
+        export_jobs.housekeeping(force=True)
+        statuses = dict(ExportJob.objects.values_list('id', 'status'))
+        self.assertEqual((statuses[stale.id], statuses[finished.id], statuses[orphan.id]), ('failed', 'expired', 'done'))
+        self.assertFalse(ExportJob.objects.get(pk=finished.pk).file)
+
+
+class ImportAdmissionsTests(TestCase):
+    HEADER = (
+        'Course,Student Name,Father Name,Surname,Mother Name,Date of Birth,Mobile (Own),Gender,'
+        'Marital Status,Address,City,Tehsil/Block,District,Pin Code,Educational Qualification,Total Fees (₹)\n'
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+        use_temp_dir(self, 'MEDIA_ROOT')
+
+    def upload(self, rows, **data):
+        body = (self.HEADER + ''.join(row + '\n' for row in rows)).encode('utf-8')
+        upload = SimpleUploadedFile('admissions.csv', body, content_type='text/csv')
+        return self.client.post(reverse('import_admissions'), {'file': upload, **data}).json()
+
+    def test_dry_run_then_import(self):
+        make_student(full_name='Ravi Suresh Patil', mobile_own='9876543210')
+        rows = [
+            'tally,Asha,Ramesh,Kale,Sunita,15-06-2006,+91 90000 00001,female,single,Main Road,Pune,Haveli,Pune,411001,HSC,3000',
+            'MS-CIT,Ravi,Suresh,Patil,Sunita,2005-01-01,9876543210,Male,Single,Main Road,Pune,Haveli,Pune,411001,SSC,',
+            'Java,Om,Suresh,Patil,Sunita,31-02-2005,12345,Male,Single,Main Road,Pune,Haveli,Pune,4110,SSC,',
+        ]
+
+        report = self.upload(rows, dry_run='1')
+        self.assertEqual((report['rows'], report['valid'], report['imported']), (3, 1, 0))
+        self.assertEqual([error['row'] for error in report['errors']], [3, 4])
+        self.assertIn('Already admitted', report['errors'][0]['error'])
+        for problem in ('course', 'date of birth', 'mobile own', 'pin code'):
+            self.assertIn(problem, report['errors'][1]['error'])
+        self.assertEqual(AdmittedStudent.objects.count(), 1)
+
+        typeahead.index.warm()
+        self.addCleanup(typeahead.index.clear)
+        report = self.upload(rows)
+        self.assertEqual(report['imported'], 1)
+        asha = AdmittedStudent.objects.get(student_name='Asha')
+        self.assertEqual((asha.course, asha.full_name, asha.mobile_own), ('Tally', 'Asha Ramesh Kale', '9000000001'))
+        self.assertEqual(asha.mobile_own_reversed, '1000000009')
+
+        # post_bulk_create kept the rollups and the typeahead index current
+        month = timezone.localdate().replace(day=1)
+        self.assertEqual(AdmissionRollup.objects.get(period='month', period_start=month, course='Tally').count, 1)
+        self.assertEqual(
+            [student['full_name'] for student in self.client.get(reverse('search_students_for_payment'), {'q': 'asha'}).json()['students']],
+            ['Asha Ramesh Kale'],
+        )
+
+        with default_storage.open(report['error_file_url'][len(settings.MEDIA_URL):]) as error_file:
+            lines = error_file.read().decode('utf-8').splitlines()
+        self.assertTrue(lines[0].startswith('Row,Course,'))
+        self.assertEqual(len(lines), 3)
+
+    def test_missing_columns_rejected(self):
+        upload = SimpleUploadedFile('admissions.csv', b'Name,Mobile\nAsha,9000000001\n')
+        response = self.client.post(reverse('import_admissions'), {'file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Missing columns', response.json()['error'])
+
+
+class SettlementImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+
+    def upload(self, body):
+        upload = SimpleUploadedFile('statement.csv', body.encode('utf-8'), content_type='text/csv')
+        return self.client.post(reverse('import_settlement'), {'file': upload, 'payment_mode': 'UPI'}).json()
+
+    def test_matches_posts_and_queues(self):
+        ravi = make_student(total_fees=5000, mobile_own='9876543210')
+        asha = make_student(full_name='Asha Ramesh Kale', student_name='Asha', surname='Kale', mobile_own='9000000001')
+        make_student(full_name='Om Suresh Patil', student_name='Om', mobile_own='9111111111', parent_mobile='9222222222')
+        make_student(full_name='Isha Suresh Patil', student_name='Isha', mobile_own='9333333333', parent_mobile='9222222222')
+        FeePayment.objects.create(
+            student=asha, amount=100, payment_mode='Cash', payment_date=datetime(2025, 4, 10, tzinfo=dt_timezone.utc),
+            total_fees_at_payment=5000, paid_before_this=0, remaining_after_this=4900,
+        )
+        statement = (
+            'Txn Date,UTR,Remitter Name,Mobile,Credit Amount\n'
+            '02-03-2025,UTR1,RAVI PATIL,+91 98765 43210,"1,000.00"\n'
+            '03-03-2025,UTR2,ravi patil,,500\n'
+            '03-03-2025,UTR3,KALE ASHA,,700\n'
+            '04-03-2025,UTR4,Unknown Payer,9999999999,300\n'
+            '04-03-2025,UTR5,Someone,9222222222,300\n'
+            '05-03-2025,UTR6,Ravi Patil,9876543210,9000\n'
+        )
+
+        summary = self.upload(statement)['settlement']
+        self.assertEqual((summary['rows'], summary['posted'], summary['review']), (6, 3, 3))
+
+        ravi.refresh_from_db()
+        self.assertEqual(ravi.paid_fees, 1500)
+        first, second = FeePayment.objects.filter(student=ravi).order_by('payment_date')
+        self.assertEqual((first.settlement_ref, first.paid_before_this, first.remaining_after_this), ('UTR1', 0, 4000))
+        self.assertEqual((second.paid_before_this, second.remaining_after_this), (1000, 3500))
+        self.assertEqual(timezone.localtime(first.payment_date).date(), date(2025, 3, 2))
+        numbers = sorted(FeePayment.objects.values_list('receipt_no', flat=True))
+        self.assertEqual(numbers, ['RCP-2425-000001', 'RCP-2425-000002', 'RCP-2425-000003', 'RCP-2526-000001'])
+        self.assertEqual(
+            CollectionRollup.objects.get(period='month', period_start=date(2025, 3, 1), payment_mode='UPI').amount, 2200,
+        )
+
+        reasons = dict(SettlementReview.objects.values_list('reference', 'reason'))
+        self.assertEqual(reasons, {'UTR4': 'no_match', 'UTR5': 'ambiguous', 'UTR6': 'over_remaining'})
+
+        # Importing the same statement again posts nothing twice
+        summary = self.upload(statement)['settlement']
+        self.assertEqual((summary['posted'], summary['review'], summary['duplicates']), (0, 0, 6))
+
+        review = SettlementReview.objects.get(reference='UTR5')
+        self.assertEqual(len(review.candidate_ids), 2)
+        response = self.client.post(
+            reverse('resolve_settlement_review', args=[review.id]), {'student_id': review.candidate_ids[0]},
+        )
+        self.assertTrue(response.json()['success'])
+        review.refresh_from_db()
+        self.assertEqual((review.status, review.payment.settlement_ref), ('posted', 'UTR5'))
+
+    def test_a_review_row_is_posted_once(self):
+        ravi = make_student(total_fees=5000, mobile_own='9876543210')
+        self.upload('Txn Date,UTR,Remitter Name,Mobile,Credit Amount\n02-03-2025,UTR1,Unknown Payer,9999999999,300\n')
+        url = reverse('resolve_settlement_review', args=[SettlementReview.objects.get().id])
+
+        # Both copies were loaded before either submit was processed
+        first, second = SettlementReview.objects.get(), SettlementReview.objects.get()
+        settlements.post_review(first, ravi.id, self.user)
+        with self.assertRaisesMessage(settlements.ReviewError, 'already been dealt with'):
+            settlements.post_review(second, ravi.id, self.user)
+        with self.assertRaisesMessage(settlements.ReviewError, 'already been dealt with'):
+            settlements.dismiss_review(second, self.user)
+        self.assertFalse(self.client.post(url, {'student_id': ravi.id}).json()['success'])
+
+        self.assertEqual(FeePayment.objects.filter(student=ravi).count(), 1)
+        ravi.refresh_from_db()
+        self.assertEqual(ravi.paid_fees, 300)
+        self.assertEqual(SettlementReview.objects.get().status, 'posted')
+
+    def test_back_dated_rows_re_chain_later_receipts(self):
+        ravi = make_student(total_fees=5000, mobile_own='9876543210')
+        self.client.post(reverse('submit_fee_payment'), {'student_id': ravi.id, 'amount': '1000', 'payment_mode': 'Cash'})
+        today = timezone.localdate()
+        self.upload(
+            'Txn Date,UTR,Remitter Name,Mobile,Credit Amount\n'
+            f'{today - timedelta(days=5):%d-%m-%Y},UTR1,Ravi Patil,9876543210,500\n'
+            f'{today - timedelta(days=3):%d-%m-%Y},UTR2,Unknown Payer,9999999999,200\n'
+        )
+        review = SettlementReview.objects.get(reference='UTR2')
+        self.client.post(reverse('resolve_settlement_review', args=[review.id]), {'student_id': ravi.id})
+
+        chain = FeePayment.objects.filter(student=ravi).order_by('payment_date', 'id')
+        self.assertEqual(
+            [(p.settlement_ref, p.paid_before_this, p.remaining_after_this) for p in chain],
+            [('UTR1', 0, 4500), ('UTR2', 500, 4300), ('', 700, 3300)],
+        )
+        ravi.refresh_from_db()
+        self.assertEqual(ravi.paid_fees, 1700)
+        self.assertFalse(ledger.drifted().exists())
+
+
+class ReceiptNumberTests(TestCase):
+    def pay(self, student, when=None, **extra):
+        return FeePayment.objects.create(
+            student=student, amount=100, payment_mode='Cash', payment_date=when or timezone.now(),
+            total_fees_at_payment=5000, paid_before_this=0, remaining_after_this=4900, **extra,
+        )
+
+    def test_numbered_per_financial_year(self):
+        student = make_student()
+        march = datetime(2025, 3, 31, 23, 30, tzinfo=dt_timezone.utc)  # 1 April in Asia/Kolkata
+        self.assertEqual(self.pay(student, datetime(2025, 3, 1, tzinfo=dt_timezone.utc)).receipt_no, 'RCP-2425-000001')
+        self.assertEqual(self.pay(student, march).receipt_no, 'RCP-2526-000001')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.pay(student, march).receipt_no, 'RCP-2526-000002')
+        # One statement reserves the number; no read of the latest receipt
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT')])
+
+        payments = [
+            FeePayment(student=student, amount=1, payment_mode='UPI', payment_date=march,
+                       total_fees_at_payment=5000, paid_before_this=0, remaining_after_this=4999)
+            for _ in range(3)
+        ]
+        receipt_numbers.assign(payments)
+        self.assertEqual([p.receipt_no for p in payments], [f'RCP-2526-00000{n}' for n in (3, 4, 5)])
+
+    def test_rolled_back_save_leaves_no_gap(self):
+        student = make_student()
+        with self.assertRaises(IntegrityError):
+            self.pay(student, settlement_ref=None)
+        payment = self.pay(student)
+        self.assertTrue(payment.receipt_no.endswith('-000001'))
+        self.assertEqual(list(search_receipts(FeePayment.objects.all(), '1')), [payment])
+
+    @override_settings(RECEIPT_PREFIX='RCP-')
+    def test_reused_prefix_continues_series(self):
+        student = make_student()
+        self.pay(student, receipt_no='RCP-000041')
+        self.assertEqual(self.pay(student).receipt_no, 'RCP-000042')
+        self.assertEqual(ReceiptSequence.objects.get().last_number, 42)
+
+    @override_settings(RECEIPT_PREFIX='RCP-')
+    def test_back_dated_receipt_under_shared_prefix_takes_the_next_number(self):
+        student = make_student()
+        self.assertEqual(self.pay(student, datetime(2025, 6, 1, tzinfo=dt_timezone.utc)).receipt_no, 'RCP-000001')
+        self.assertEqual(self.pay(student, datetime(2024, 6, 1, tzinfo=dt_timezone.utc)).receipt_no, 'RCP-000002')
+        self.assertEqual(self.pay(student, datetime(2025, 6, 2, tzinfo=dt_timezone.utc)).receipt_no, 'RCP-000003')
+        self.assertEqual(self.pay(student, datetime(2024, 6, 2, tzinfo=dt_timezone.utc)).receipt_no, 'RCP-000004')
+
+        # Counters that drifted apart before the years were advanced together
+        ReceiptSequence.objects.filter(financial_year='2024-25').update(last_number=1)
+        self.assertEqual(self.pay(student, datetime(2024, 6, 3, tzinfo=dt_timezone.utc)).receipt_no, 'RCP-000005')
+        self.assertEqual(set(ReceiptSequence.objects.values_list('last_number', flat=True)), {5})
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+
+    def test_fee_mutations(self):
+        student = make_student(total_fees=5000)
+        stale = AdmittedStudent.objects.get(pk=student.pk)
+
+        response = self.client.post(reverse('submit_fee_payment'), {
+            'student_id': student.id, 'amount': '1500', 'payment_mode': 'Cash',
+        }).json()
+        self.assertEqual(response['receipt']['previous_paid'], '0.00')
+        payment = FeePayment.objects.get()
+        response = self.client.post(reverse('submit_fee_payment'), {
+            'student_id': student.id, 'amount': '4000', 'payment_mode': 'Cash',
+        }).json()
+        self.assertIn('cannot exceed remaining fees', response['error'])
+
+        # Saving a copy loaded before the payment keeps the ledger's total
+        stale.city = 'Nashik'
+        stale.save()
+        student.refresh_from_db()
+        self.assertEqual((student.paid_fees, student.version, student.city), (1500, 1, 'Nashik'))
+
+        self.client.post(
+            reverse('update_receipt', args=[payment.id]), json.dumps({'paid_fees': 1200}), content_type='application/json',
+        )
+        student.refresh_from_db()
+        self.assertEqual((student.paid_fees, student.version), (1200, 2))
+
+        self.client.post(reverse('delete_receipt', args=[payment.id]))
+        student.refresh_from_db()
+        self.assertEqual((student.paid_fees, student.version), (0, 3))
+
+    def test_retries_after_concurrent_change(self):
+        student = make_student(total_fees=5000)
+        reads = []
+
+        def another_counter_posts_first(current):
+            reads.append(current.paid_fees)
+            if len(reads) == 1:
+                ledger.pay(student.id, 300)
+
+        before = ledger._apply(student.id, 200, another_counter_posts_first)
+        self.assertEqual((reads, before.paid_fees), ([0, 300], 300))
+        student.refresh_from_db()
+        self.assertEqual((student.paid_fees, student.version), (500, 2))
+
+
+class ReceiptRestateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+
+    def test_later_receipts_follow_edits_and_deletes(self):
+        # 500 was paid with the (imported) admission, before any receipt
+        student = make_student(total_fees=5000, paid_fees=500)
+        AdmittedStudent.objects.filter(pk=student.pk).update(paid_fees=2500)
+        for day, amount in ((1, 1000), (2, 700), (3, 300)):
+            FeePayment.objects.create(
+                student=student, amount=amount, payment_mode='Cash',
+                payment_date=datetime(2025, 6, day, 10, tzinfo=dt_timezone.utc),
+                total_fees_at_payment=5000, paid_before_this=0, remaining_after_this=0,
+            )
+        first, second, third = FeePayment.objects.order_by('payment_date')
+        self.assertEqual(ledger.restate(student.id, (first.payment_date, first.id), Decimal(500)), 3)
+
+        def snapshots():
+            return list(FeePayment.objects.order_by('payment_date', 'id').values_list('paid_before_this', 'remaining_after_this'))
+
+        self.assertEqual(snapshots(), [(500, 3500), (1500, 2800), (2200, 2500)])
+
+        with CaptureQueriesContext(connection) as queries:
+            ledger.restate(student.id, (third.payment_date, third.id), Decimal(500))
+        self.assertEqual(len(queries), 2)  # nothing to write
+
+        self.client.post(
+            reverse('update_receipt', args=[second.id]), json.dumps({'paid_fees': 900}), content_type='application/json',
+        )
+        self.assertEqual(snapshots(), [(500, 3500), (1500, 2600), (2400, 2300)])
+
+        # Moved before the first receipt
+        self.client.post(
+            reverse('update_receipt', args=[third.id]), json.dumps({'payment_date': '2025-05-31'}),
+            content_type='application/json',
+        )
+        self.assertEqual(snapshots(), [(500, 4200), (800, 3200), (1800, 2300)])
+
+        self.client.post(reverse('delete_receipt', args=[third.id]))
+        self.assertEqual(snapshots(), [(500, 3500), (1500, 2600)])
+        student.refresh_from_db()
+        self.assertEqual(student.paid_fees, 2400)
+        self.assertFalse(ledger.drifted().exists())
+
+    def test_reconcile_command(self):
+        student = make_student(total_fees=5000)
+        FeePayment.objects.create(
+            student=student, amount=1000, payment_mode='Cash',
+            total_fees_at_payment=5000, paid_before_this=0, remaining_after_this=4000,
+        )
+        # No receipts: checked against the fees paid on admission
+        other = make_student(full_name='Asha Patil', paid_fees=800)
+        AdmittedStudent.objects.filter(pk__in=[student.pk, other.pk]).update(paid_fees=0)
+        self.assertEqual([s.expected for s in ledger.drifted()], [1000, 800])
+
+        out = StringIO()
+        call_command('reconcile_fees', '--repair', stdout=out)
+        self.assertIn('2 students drifted, 2 repaired', out.getvalue())
+        student.refresh_from_db()
+        self.assertEqual(student.paid_fees, 1000)
+        self.assertFalse(ledger.drifted().exists())
+
+    def test_back_dated_receipts_keep_the_chain(self):
+        student = make_student(total_fees=5000, paid_fees=200)
+        self.client.post(reverse('submit_fee_payment'), {
+            'student_id': student.id, 'amount': '1000', 'payment_mode': 'Cash',
+        })
+        today = FeePayment.objects.get()
+        # Posted later but dated five days earlier, like a bank settlement row
+        ledger.pay(student.id, Decimal(500))
+        earlier = FeePayment.objects.create(
+            student=student, amount=500, payment_mode='UPI',
+            payment_date=today.payment_date - timedelta(days=5),
+            total_fees_at_payment=5000, paid_before_this=1200, remaining_after_this=3300,
+        )
+        ledger.rechain(student.id, [earlier])
+
+        self.assertEqual(
+            list(FeePayment.objects.order_by('payment_date').values_list('paid_before_this', 'remaining_after_this')),
+            [(200, 4300), (700, 3300)],
+        )
+        self.assertFalse(ledger.drifted().exists())
+        self.assertEqual(ledger.opening_balance(student.id), 200)
+
+
+class PhotoRenditionTests(TestCase):
+    def setUp(self):
+        self.media = use_temp_dir(self, 'MEDIA_ROOT')
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+
+    def photo(self, name='camera.jpg', size=(1200, 1600)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'teal').save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_upload_makes_renditions(self):
+        student = make_student()
+        fields = {
+            field: getattr(student, field) for field in (
+                'student_name', 'father_name', 'surname', 'mother_name', 'full_name', 'date_of_birth',
+                'mobile_own', 'gender', 'marital_status', 'course', 'educational_qualification',
+                'address', 'city', 'tehsil_block', 'district', 'pin_code',
+            )
+        }
+        self.client.post(reverse('update_student_admitted', args=[student.id]), {**fields, 'photo': self.photo()})
+        student.refresh_from_db()
+        self.assertTrue(student.photo_renditions)
+
+        with Image.open(default_storage.open(images.rendition_name(student.photo.name, 96, 'webp'))) as small:
+            self.assertEqual((small.format, small.size), ('WEBP', (96, 128)))
+
+        card = self.client.get(reverse('admitted_students_page')).json()['students'][0]
+        self.assertTrue(card['photo_url'].endswith('-192w.jpg'))
+        self.assertEqual(card['photo_webp_srcset'].count('w.webp'), 3)
+        self.assertIn('384w', card['photo_srcset'])
+        detail = self.client.get(reverse('student_detail_admitted', args=[student.id])).json()
+        self.assertEqual(detail['photo'], card['photo_url'])
+
+    def test_uploads_are_normalized(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientation: rotate 90 degrees clockwise
+        exif[0x010F] = 'PhoneMaker'
+        buffer = BytesIO()
+        Image.new('RGB', (4000, 3000), 'teal').save(buffer, 'JPEG', exif=exif)
+        upload = SimpleUploadedFile('IMG_2041.jpeg', buffer.getvalue(), content_type='image/jpeg')
+
+        student = make_student()
+        images.attach_photo(student, upload)
+        student.refresh_from_db()
+        self.assertRegex(student.photo.name, r'^student_photos/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        with Image.open(default_storage.open(student.photo.name)) as stored:
+            self.assertEqual(stored.size, (1200, 1600))  # upright, longest edge capped
+            self.assertFalse(stored.getexif())
+        self.assertTrue(student.photo_renditions)
+
+    def test_non_images_are_refused(self):
+        student = make_student()
+        fake = SimpleUploadedFile('id.jpg', b'%PDF-1.4 not a photo', content_type='image/jpeg')
+        response = self.client.post(reverse('update_student_admitted', args=[student.id]), {
+            'student_name': 'Ravi', 'full_name': 'Ravi Suresh Patil', 'photo': fake,
+        })
+        self.assertEqual(response.json(), {'success': False, 'error': 'The photo must be an image file'})
+        student.refresh_from_db()
+        self.assertFalse(student.photo)
+        self.assertFalse(MediaBlob.objects.exists())
+
+    @override_settings(PHOTO_INLINE_MAX_BYTES=0)
+    def test_large_uploads_finish_after_the_request(self):
+        student = make_student()
+        with self.captureOnCommitCallbacks() as callbacks:
+            images.attach_photo(student, self.photo(name='big.png'))
+        self.assertEqual(len(callbacks), 1)
+        original = AdmittedStudent.objects.get(pk=student.pk).photo.name
+        self.assertTrue(original.endswith('.png'))
+
+        images.process_photo(student.pk, original)
+        student.refresh_from_db()
+        self.assertTrue(student.photo.name.endswith('.jpg'))
+        self.assertTrue(student.photo_renditions)
+        # The upload goes with the next sweep
+        self.assertTrue(default_storage.exists(original))
+        self.assertEqual(media.sweep(timedelta(0))[0], 1)
+        self.assertFalse(default_storage.exists(original))
+
+    def test_shared_photos_are_stored_once(self):
+        first, second = make_student(), make_student(full_name='Asha Patil')
+        images.attach_photo(first, self.photo())
+        images.attach_photo(second, self.photo())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.photo.name, second.photo.name)
+        self.assertEqual(MediaBlob.objects.get(name=first.photo.name).refs, 2)
+
+        first.delete()
+        self.assertEqual(media.sweep(timedelta(0)), (0, 0))
+        self.client.post(reverse('delete_admitted_students'), json.dumps({'student_ids': [second.id]}),
+                         content_type='application/json')
+        # Nothing is removed before the grace period is over
+        self.assertEqual(media.sweep()[0], 0)
+        self.assertTrue(default_storage.exists(second.photo.name))
+
+        call_command('sweep_media', '--once', '--grace', '0', stdout=StringIO())
+        self.assertFalse(default_storage.exists(second.photo.name))
+        self.assertFalse(default_storage.exists(images.rendition_name(second.photo.name, 96, 'webp')))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_backfill(self):
+        student = make_student(photo=default_storage.save('student_photos/old.jpg', self.photo(size=(80, 60))))
+        broken = make_student(full_name='Asha Patil', photo=default_storage.save('student_photos/x.jpg', ContentFile(b'nope')))
+        self.assertEqual(self.client.get(reverse('admitted_students_page')).json()['students'][1]['photo_srcset'], '')
+
+        with self.assertLogs('core.images', 'ERROR'):
+            call_command('make_photo_renditions', stdout=StringIO())
+        student.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual((student.photo_renditions, broken.photo_renditions), (True, False))
+        # Never enlarged
+        with Image.open(default_storage.open('student_photos/renditions/old-384w.jpg')) as copy:
+            self.assertEqual(copy.size, (80, 60))
+
+
+class AssetServingTests(TestCase):
+    def setUp(self):
+        self.media = use_temp_dir(self, 'MEDIA_ROOT')
+        self.user = User.objects.create_user('staff', password='secret123')
+
+    def test_media_needs_login_and_supports_caching_and_ranges(self):
+        name = AdmittedStudent._meta.get_field('photo').storage.save('student_photos/a.jpg', ContentFile(b'x' * 1000))
+        url = settings.MEDIA_URL + name
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'x' * 1000)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=31536000, immutable')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        partial = self.client.get(url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual((partial.status_code, partial['Content-Range']), (206, 'bytes 100-199/1000'))
+        self.assertEqual(len(b''.join(partial.streaming_content)), 100)
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=-10')['Content-Range'], 'bytes 990-999/1000')
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=5000-').status_code, 416)
+        # A range of an older version of the file is not resumed
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"').status_code, 200)
+
+        with override_settings(SENDFILE_HEADER='X-Accel-Redirect'):
+            handed_off = self.client.get(url)
+        self.assertEqual(handed_off['X-Accel-Redirect'], f'/protected-media/{name}')
+        self.assertEqual(handed_off.content, b'')
+        self.assertEqual(self.client.get(settings.MEDIA_URL + '../manage.py').status_code, 404)
+
+    def test_collected_static_files_are_hashed_and_precompressed(self):
+        static_root = use_temp_dir(self, 'STATIC_ROOT')
+        with override_settings(STORAGES={
+            **settings.STORAGES, 'staticfiles': {'BACKEND': 'core.storage.CompressedManifestStaticFilesStorage'},
+        }):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            assets.hashed_static_names.cache_clear()
+            self.addCleanup(assets.hashed_static_names.cache_clear)
+            hashed = staticfiles_storage.stored_name('core/style.css')
+
+            request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+            response = views.static_file(request, hashed)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            with open(f'{static_root}/core/style.css', 'rb') as original:
+                self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), original.read())
+
+            plain = views.static_file(RequestFactory().get('/'), 'core/style.css')
+            self.assertEqual(plain['Cache-Control'], 'public, no-cache')
+            self.assertNotIn('Content-Encoding', plain)
+
+    def test_vendored_libraries_are_served_locally(self):
+        html = Template("{% load assets %}{% vendor_static 'vendor/chart.umd.min.js' %}").render(Context())
+        self.assertEqual(html, '/static/vendor/chart.umd.min.js')
+        with open(settings.BASE_DIR / 'static/vendor/chart.umd.min.js') as chart:
+            self.assertIn('Released under the MIT License', chart.read(300))
+
+    @override_settings(VENDOR_ASSETS={'vendor/missing.js': 'https://cdn.example.com/missing.js'})
+    def test_a_library_missing_from_static_is_an_error_not_a_cdn_url(self):
+        with self.assertRaises(ImproperlyConfigured):
+            Template("{% load assets %}{% vendor_static 'vendor/missing.js' %}").render(Context())
+
+
+class TypeaheadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='secret123')
+        self.client.force_login(self.user)
+        self.addCleanup(typeahead.index.clear)
+
+    def search(self, query):
+        response = self.client.get(reverse('search_students_for_payment'), {'q': query})
+        return [student['full_name'] for student in response.json()['students']]
+
+    def test_ranking_and_signal_updates(self):
+        make_student(full_name='Patil Ravi Suresh', student_name='Ravi', mobile_own='9000011111')
+        make_student(full_name='Ravi Suresh Patil', mobile_own='9876543210')
+        typeahead.index.warm()
+
+        # Full-name prefix ranks ahead of a name-token match
+        self.assertEqual(self.search('ravi'), ['Ravi Suresh Patil', 'Patil Ravi Suresh'])
+        self.assertEqual(self.search('ravi su'), ['Ravi Suresh Patil', 'Patil Ravi Suresh'])
+        self.assertEqual(self.search('98765'), ['Ravi Suresh Patil'])
+        self.assertEqual(self.search('1111'), ['Patil Ravi Suresh'])
+
+        def indexed(query):
+            return [s['full_name'] for s in typeahead.index.search(query)]
+
+        # Applied once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            asha = make_student(student_name='Asha', full_name='Asha Jadhav', mobile_own='9123456780')
+            self.assertEqual(indexed('jadh'), [])
+        self.assertEqual(indexed('jadh'), ['Asha Jadhav'])
+        with self.captureOnCommitCallbacks(execute=True):
+            asha.delete()
+        self.assertEqual(indexed('jadh'), [])
+
+        # A rolled-back admission never shows up
+        try:
+            with transaction.atomic():
+                make_student(student_name='Om', full_name='Om Kale', mobile_own='9123456781')
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        self.assertEqual(indexed('om k'), [])
+
+    def test_changes_during_a_rebuild_survive_the_swap(self):
+        make_student(full_name='Ravi Suresh Patil')
+        asha = make_student(student_name='Asha', full_name='Asha Jadhav', mobile_own='9123456780')
+        index = typeahead.TypeaheadIndex()
+        index.warm()
+
+        # Saved and deleted after the rebuild started reading the table
+        late = AdmittedStudent(id=asha.id + 1, student_name='Om', full_name='Om Kale', mobile_own='9123456781',
+                               course='MS-CIT')
+        read, changed = index._entry, []
+
+        def entry(*row):
+            if not changed:
+                changed.append(row)
+                index.add(late)
+                index.remove(asha.id)
+            return read(*row)
+
+        index._entry = entry
+        index.warm()
+        self.assertEqual([s['full_name'] for s in index.search('om')], ['Om Kale'])
+        self.assertEqual(index.search('asha'), [])
+        self.assertEqual(index._pending, {})
+
+    def test_narrowing_reuses_previous_candidates(self):
+        make_student(full_name='Ravi Suresh Patil')
+        typeahead.index.warm()
+        typeahead.index.search('ra')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [s['full_name'] for s in typeahead.index.search('ravi p')],
+                ['Ravi Suresh Patil'],
+            )
@@ -0,0 +1,371 @@
+"""
+In-process typeahead index for the fee-counter student picker.
+
+Full names, individual name tokens and mobile numbers (forwards and
+reversed, for "last digits" lookups) are kept in sorted arrays, so a prefix
+lookup is a couple of bisects and never touches the database. Name-token
+entries are ``(token, full_name, id)``: every run of one token is already in
+display order, and merging the runs under a prefix yields ranked matches
+lazily, so only the first ``limit`` are ever visited.
+
+The index is warmed at startup (Project.wsgi/asgi), updated by the
+AdmittedStudent signals in core.signals once their transaction commits,
+and refreshed in the background after TYPEAHEAD_MAX_AGE seconds to pick up
+writes made by other worker processes. Students saved or deleted while a
+rebuild is reading the table are applied again on top of the new arrays.
+When a query has fewer matches than the limit its result is remembered, and
+longer queries starting with it just filter that list.
+"""
+import bisect
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+from .rollups import course_name_for
+from .models import normalize_mobile
+from .search import TOKEN_RE, mobile_digits
+
+# Tiers used for ranking, best first
+FULL_NAME_MATCH = 0
+NAME_TOKEN_MATCH = 1
+MOBILE_MATCH = 2
+MOBILE_SUFFIX_MATCH = 3
+
+
+def _tokens(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def _prefix_range(keys, prefix):
+    """(start, end) positions of the keys whose first item starts with ``prefix``"""
+    return (
+        bisect.bisect_left(keys, (prefix,)),
+        bisect.bisect_left(keys, (prefix + '\uffff',)),
+    )
+
+
+class TypeaheadIndex:
+    def __init__(self, max_age=300, narrow_cache_size=256):
+        self.max_age = max_age
+        self.narrow_cache_size = narrow_cache_size
+
+        self._lock = threading.RLock()
+        self._refreshing = False
+        self._rebuilds = 0
+        # id -> entry (None: deleted) for changes made while a rebuild runs
+        self._pending = {}
+        self._loaded_at = None
+        self._entries = {}
+        self._names = []
+        self._tokens = []
+        self._mobiles = []
+        self._reversed = []
+        self._complete = OrderedDict()
+
+    # ================= BUILDING =================
+    @property
+    def is_loaded(self):
+        return self._loaded_at is not None
+
+    def warm(self):
+        """(Re)build the index from the database"""
+        from .models import AdmittedStudent
+
+        with self._lock:
+            self._rebuilds += 1
+        try:
+            rows = AdmittedStudent.objects.order_by().values_list(
+                'id', 'full_name', 'student_name', 'mobile_own', 'course', 'custom_course'
+            )
+            entries, names, tokens, mobiles, reversed_mobiles = {}, [], [], [], []
+            for row in rows.iterator(chunk_size=2000):
+                entry = self._entry(*row)
+                entries[entry['id']] = entry
+                names.append(self._name_key(entry))
+                tokens.extend(self._token_keys(entry))
+                if entry['digits']:
+                    mobiles.append(self._mobile_key(entry))
+                    reversed_mobiles.append(self._reversed_key(entry))
+
+            names.sort()
+            tokens.sort()
+            mobiles.sort()
+            reversed_mobiles.sort()
+            with self._lock:
+                self._entries, self._names, self._tokens = entries, names, tokens
+                self._mobiles, self._reversed = mobiles, reversed_mobiles
+                # The rows may have been read before these changes committed
+                for student_id, entry in self._pending.items():
+                    self._discard(student_id)
+                    if entry:
+                        self._insert(entry)
+                self._complete.clear()
+                self._loaded_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._rebuilds -= 1
+                if not self._rebuilds:
+                    self._pending.clear()
+
+    def clear(self):
+        """Forget everything; the next search warms the index again"""
+        with self._lock:
+            self._entries, self._names, self._tokens = {}, [], []
+            self._mobiles, self._reversed = [], []
+            self._complete.clear()
+            self._loaded_at = None
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.warm()
+            except DatabaseError:
+                pass
+            finally:
+                self._refreshing = False
+                connection.close()
+
+        threading.Thread(target=run, name='typeahead-refresh', daemon=True).start()
+
+    @staticmethod
+    def _entry(student_id, full_name, student_name, mobile_own, course, custom_course):
+        tokens = set(_tokens(full_name)) | set(_tokens(student_name))
+        return {
+            'id': student_id,
+            'full_name': full_name,
+            'mobile_own': mobile_own,
+            'course': course_name_for(course, custom_course),
+            'name_key': (full_name or '').lower(),
+            'tokens': sorted(tokens),
+            'digits': normalize_mobile(mobile_own),
+        }
+
+    @staticmethod
+    def _name_key(entry):
+        return (entry['name_key'], entry['id'])
+
+    @staticmethod
+    def _token_keys(entry):
+        return [(token, entry['name_key'], entry['id']) for token in entry['tokens']]
+
+    @staticmethod
+    def _mobile_key(entry):
+        return (entry['digits'], entry['id'])
+
+    @staticmethod
+    def _reversed_key(entry):
+        return (entry['digits'][::-1], entry['id'])
+
+    # ================= SIGNAL HOOKS =================
+    def add(self, student):
+        """Insert or replace one student (called from post_save)"""
+        entry = self._entry(
+            student.id, student.full_name, student.student_name,
+            student.mobile_own, student.course, student.custom_course,
+        )
+        with self._lock:
+            if self._rebuilds:
+                self._pending[entry['id']] = entry
+            if not self.is_loaded:
+                return
+            self._discard(student.id)
+            self._insert(entry)
+            self._complete.clear()
+
+    def add_many(self, students):
+        """Insert many students (bulk imports): one sort per key list instead of an insort per key"""
+        entries = [
+            self._entry(
+                student.id, student.full_name, student.student_name,
+                student.mobile_own, student.course, student.custom_course,
+            )
+            for student in students
+        ]
+        with self._lock:
+            if self._rebuilds:
+                self._pending.update((entry['id'], entry) for entry in entries)
+            if not self.is_loaded:
+                return
+            for entry in entries:
+                self._discard(entry['id'])
+                self._entries[entry['id']] = entry
+                self._names.append(self._name_key(entry))
+                self._tokens.extend(self._token_keys(entry))
+                if entry['digits']:
+                    self._mobiles.append(self._mobile_key(entry))
+                    self._reversed.append(self._reversed_key(entry))
+            for keys in (self._names, self._tokens, self._mobiles, self._reversed):
+                keys.sort()
+            self._complete.clear()
+
+    def remove(self, student_id):
+        """Drop one student (called from post_delete)"""
+        with self._lock:
+            if self._rebuilds:
+                self._pending[student_id] = None
+            if not self.is_loaded:
+                return
+            self._discard(student_id)
+            self._complete.clear()
+
+    def _insert(self, entry):
+        self._entries[entry['id']] = entry
+        bisect.insort(self._names, self._name_key(entry))
+        for key in self._token_keys(entry):
+            bisect.insort(self._tokens, key)
+        if entry['digits']:
+            bisect.insort(self._mobiles, self._mobile_key(entry))
+            bisect.insort(self._reversed, self._reversed_key(entry))
+
+    def _discard(self, student_id):
+        entry = self._entries.pop(student_id, None)
+        if not entry:
+            return
+        self._remove_key(self._names, self._name_key(entry))
+        for key in self._token_keys(entry):
+            self._remove_key(self._tokens, key)
+        if entry['digits']:
+            self._remove_key(self._mobiles, self._mobile_key(entry))
+            self._remove_key(self._reversed, self._reversed_key(entry))
+
+    @staticmethod
+    def _remove_key(keys, key):
+        position = bisect.bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            del keys[position]
+
+    # ================= CANDIDATES (LAZY, IN RANK ORDER) =================
+    def _full_name_ids(self, query):
+        start, end = _prefix_range(self._names, query)
+        return (self._names[i][1] for i in range(start, end))
+
+    def _name_token_ids(self, word):
+        keys = self._tokens
+        start, end = _prefix_range(keys, word)
+        runs = []
+        while start < end:
+            # Every (token, ...) key sorts before (token + '\0',)
+            run_end = bisect.bisect_left(keys, (keys[start][0] + '\0',), start, end)
+            runs.append(keys[i] for i in range(start, run_end))
+            start = run_end
+        return (key[2] for key in heapq.merge(*runs, key=lambda key: key[1]))
+
+    def _mobile_ids(self, digits):
+        start, end = _prefix_range(self._mobiles, digits)
+        return (self._mobiles[i][1] for i in range(start, end))
+
+    def _mobile_suffix_ids(self, digits):
+        start, end = _prefix_range(self._reversed, digits[::-1])
+        return (self._reversed[i][1] for i in range(start, end))
+
+    # ================= SEARCHING =================
+    @staticmethod
+    def _match_tier(entry, query, query_tokens, query_digits):
+        if entry['name_key'].startswith(query):
+            return FULL_NAME_MATCH
+        if query_tokens and all(
+            any(token.startswith(word) for token in entry['tokens']) for word in query_tokens
+        ):
+            return NAME_TOKEN_MATCH
+        if query_digits and entry['digits'].startswith(query_digits):
+            return MOBILE_MATCH
+        if query_digits and entry['digits'].endswith(query_digits):
+            return MOBILE_SUFFIX_MATCH
+        return None
+
+    @staticmethod
+    def _rank_key(entry, tier):
+        if tier == MOBILE_MATCH:
+            return (tier, entry['digits'], entry['id'])
+        if tier == MOBILE_SUFFIX_MATCH:
+            return (tier, entry['digits'][::-1], entry['id'])
+        return (tier, entry['name_key'], entry['id'])
+
+    def _ranked_ids(self, query, query_tokens, query_digits, limit):
+        ids, seen = [], set()
+        tiers = [(FULL_NAME_MATCH, self._full_name_ids(query))]
+        if query_tokens:
+            tiers.append((NAME_TOKEN_MATCH, self._name_token_ids(query_tokens[0])))
+        if query_digits:
+            tiers.append((MOBILE_MATCH, self._mobile_ids(query_digits)))
+            tiers.append((MOBILE_SUFFIX_MATCH, self._mobile_suffix_ids(query_digits)))
+
+        for tier, candidates in tiers:
+            for student_id in candidates:
+                if len(ids) == limit:
+                    return ids
+                if student_id in seen:
+                    continue
+                entry = self._entries[student_id]
+                if self._match_tier(entry, query, query_tokens, query_digits) == tier:
+                    seen.add(student_id)
+                    ids.append(student_id)
+        return ids
+
+    def _narrowed_ids(self, query, query_tokens, query_digits):
+        """Re-rank a remembered complete result for a shorter prefix, if any"""
+        for length in range(len(query) - 1, 0, -1):
+            previous = self._complete.get(query[:length])
+            if previous is None:
+                continue
+            ranked = []
+            for student_id in previous:
+                entry = self._entries[student_id]
+                tier = self._match_tier(entry, query, query_tokens, query_digits)
+                if tier is not None:
+                    ranked.append((self._rank_key(entry, tier), student_id))
+            ranked.sort()
+            return [student_id for _, student_id in ranked]
+        return None
+
+    def search(self, query, limit=10):
+        """Best ``limit`` matches as dicts ready for JSON, best first"""
+        if not self.is_loaded:
+            self.warm()
+        elif time.monotonic() - self._loaded_at > self.max_age:
+            self._refresh_in_background()
+
+        query = query.strip().lower()
+        query_tokens = _tokens(query)
+        query_digits = mobile_digits(query)
+
+        with self._lock:
+            ids = self._narrowed_ids(query, query_tokens, query_digits)
+            if ids is None:
+                ids = self._ranked_ids(query, query_tokens, query_digits, limit)
+
+            if len(ids) < limit:
+                self._complete[query] = ids
+                self._complete.move_to_end(query)
+                while len(self._complete) > self.narrow_cache_size:
+                    self._complete.popitem(last=False)
+
+            return [
+                {
+                    'id': student_id,
+                    'full_name': self._entries[student_id]['full_name'],
+                    'mobile_own': self._entries[student_id]['mobile_own'],
+                    'course': self._entries[student_id]['course'],
+                }
+                for student_id in ids[:limit]
+            ]
+
+
+index = TypeaheadIndex(max_age=getattr(settings, 'TYPEAHEAD_MAX_AGE', 300))
+
+
+def warm_index():
+    """Warm the shared index at process start; a missing table is not fatal"""
+    try:
+        index.warm()
+    except DatabaseError:
+        pass
@@ -12,6 +12,8 @@ urlpatterns = [
     # Admission URLs
     path('admission/new/', views.new_admission, name='new_admission'),
     path('admission/students/', views.admitted_students, name='admitted_students'),
+    path('api/admitted-students/', views.admitted_students_page, name='admitted_students_page'),
+    path('api/admitted-students/import/', views.import_admissions_view, name='import_admissions'),
     
     # Student Detail and Update URLs
     path('student-detail-admitted/<int:student_id>/', views.student_detail_admitted, name='student_detail_admitted'),
@@ -34,8 +36,20 @@ urlpatterns = [
     # Receipts URLs
     path('receipts/', views.receipts_view, name='receipts_view'),
     path('api/receipts/', views.get_receipts, name='get_receipts'),
+    path('api/receipts/changes/', views.get_receipt_changes, name='get_receipt_changes'),
     path('api/receipts/<int:receipt_id>/update/', views.update_receipt, name='update_receipt'),
     path('api/receipts/export/', views.export_receipts, name='export_receipts'),
+    path('reports/month-end/', views.month_end_report, name='month_end_report'),
+    path('api/cache-stats/', views.cache_stats, name='cache_stats'),
+
+    # Bank / UPI settlements
+    path('settlements/', views.settlements_view, name='settlements'),
+    path('api/settlements/import/', views.import_settlement_view, name='import_settlement'),
+    path('api/settlements/review/<int:review_id>/', views.resolve_settlement_review, name='resolve_settlement_review'),
     path('api/receipts/<int:receipt_id>/delete/', views.delete_receipt, name='delete_receipt'),
+
+    # Background exports
+    path('api/export-jobs/<int:job_id>/', views.export_job_status, name='export_job_status'),
+    path('api/export-jobs/<int:job_id>/download/', views.export_job_download, name='export_job_download'),
     
 ]
\ No newline at end of file
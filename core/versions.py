@@ -0,0 +1,55 @@
+"""
+Data versions.
+
+Every write to a model listed in DATA_SETS bumps the DataVersion counter of
+its data set (see core.signals). Anything derived from those tables - an
+export file, a cached report - can be keyed on the versions it depends on
+and is stale exactly when one of them has moved.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AdmittedStudent, Course, DataVersion, Enquiry, FeePayment, Student
+
+# model -> data set whose version its writes bump
+DATA_SETS = {
+    Enquiry: 'enquiries',
+    AdmittedStudent: 'admissions',
+    FeePayment: 'receipts',
+    Student: 'students',
+    Course: 'students',
+}
+
+
+def bump(name):
+    """Advance the version of data set ``name``"""
+    if DataVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            DataVersion.objects.create(name=name, version=1)
+    except IntegrityError:
+        # Created by a concurrent writer in the meantime
+        DataVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def current(names):
+    """{name: version} for the given data sets; never-written sets are at 0"""
+    versions = dict.fromkeys(sorted(names), 0)
+    versions.update(DataVersion.objects.filter(name__in=versions).values_list('name', 'version'))
+    return versions
+
+
+def stamps(names):
+    """
+    {name: 'version.microseconds'} for the given data sets. Unlike the bare
+    number, a stamp is never reused: a rolled-back write can hand the same
+    version to the next write, but not the same update time.
+    """
+    stamps = dict.fromkeys(sorted(names), '0')
+    for name, version, updated_at in DataVersion.objects.filter(name__in=stamps).values_list(
+        'name', 'version', 'updated_at'
+    ):
+        stamps[name] = f'{version}.{int(updated_at.timestamp() * 1_000_000)}'
+    return stamps
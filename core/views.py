@@ -1,21 +1,38 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.utils import timezone
-from django.db.models.functions import ExtractYear
 from django.db import transaction
-import csv
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
-from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from datetime import datetime
+import re
+import uuid
 from decimal import Decimal
 
-from .models import Enquiry, AdmittedStudent, Course, Student, FeePayment
+from .models import (
+    Enquiry, AdmittedStudent, Course, Student, FeePayment, ExportJob, SettlementImport, SettlementReview,
+)
+from . import assets, caching, images, ledger, rollups, typeahead
+from .filters import (
+    admission_facets, count_admitted_students, count_enquiries, enquiry_facets,
+    filtered_admitted_students, filtered_enquiries, parse_int,
+)
+from .pagination import keyset_page
+from .receipts import receipt_changes, receipt_page
+from .search import search_students
+from .exports import EXPORT_KINDS, export_response
+from .imports import ImportFileError, import_admissions
+from .settlements import SETTLEMENT_MODES, ReviewError, dismiss_review, import_settlement, post_review
+from .export_cache import cached_export_response
+from .reports import MonthEndReport, month_end_sheets
+from .xlsx import XLSX_CONTENT_TYPE, stream_xlsx
+from . import export_jobs
 from django.views.decorators.http import require_http_methods
 import json
 from django.views.decorators.http import require_http_methods
@@ -56,59 +73,22 @@ def home(request):
 def dashboard(request):
     selected_year = request.GET.get('year', '')
     
-    # Get available years from AdmittedStudent model
-    available_years = (
-        AdmittedStudent.objects
-        .annotate(year=ExtractYear('admission_date'))
-        .values_list('year', flat=True)
-        .distinct()
-        .order_by('-year')
-    )
-    
-    # Base queryset for admitted students
-    students = AdmittedStudent.objects.all()
-    
-    # Filter by year if selected
-    if selected_year:
-        students = students.filter(admission_date__year=selected_year)
-    
-    # Total enquiries (from Enquiry model)
-    enquiries = Enquiry.objects.all()
-    if selected_year:
-        enquiries = enquiries.filter(created_at__year=selected_year)
-    enquiry_count = enquiries.count()
-    
-    # MSCIT Students - only MS-CIT course
-    mscit_count = students.filter(course='MS-CIT').count()
-    
-    # KLIC Students - all courses EXCEPT MS-CIT
-    klic_count = students.exclude(course='MS-CIT').count()
-    
-    # Get course distribution for pie chart
-    course_distribution = {}
-    for student in students:
-        course_name = student.custom_course if student.course == 'Other' and student.custom_course else student.course
-        course_distribution[course_name] = course_distribution.get(course_name, 0) + 1
-    
-    # Get monthly admission data
-    monthly_data = {str(i): 0 for i in range(1, 13)}  # Initialize all months with 0
-    
-    if selected_year:
-        # Get admissions for selected year
-        year_students = AdmittedStudent.objects.filter(admission_date__year=selected_year)
-    else:
-        # Get admissions for current year
-        from datetime import datetime
-        current_year = datetime.now().year
-        year_students = AdmittedStudent.objects.filter(admission_date__year=current_year)
-    
-    for student in year_students:
-        month = str(student.admission_date.month)
-        monthly_data[month] = monthly_data.get(month, 0) + 1
+    try:
+        year = int(selected_year) if selected_year else None
+    except ValueError:
+        selected_year, year = '', None
+    
+    # All figures come from the pre-aggregated rollup tables (see core.rollups),
+    # cached until the next enquiry or admission is written (core.caching)
+    figures = rollups.dashboard_figures(year, year or timezone.localdate().year)
+    available_years = figures['available_years']
+    enquiry_count = figures['enquiry_count']
+    mscit_count = figures['mscit_count']
+    klic_count = figures['klic_count']
     
     # Convert to JSON for JavaScript
-    course_distribution_json = json.dumps(course_distribution)
-    monthly_data_json = json.dumps(monthly_data)
+    course_distribution_json = json.dumps(figures['course_distribution'])
+    monthly_data_json = json.dumps(figures['monthly_data'])
     
     context = {
         "enquiry_count": enquiry_count,
@@ -132,40 +112,13 @@ def enquiry_list(request):
     year = request.GET.get("year", "")
     course = request.GET.get("course", "")
     
-    enquiries = Enquiry.objects.all().order_by("-created_at")
-    
-    if search:
-        enquiries = enquiries.filter(
-            Q(name__icontains=search) |
-            Q(mobile__icontains=search) |
-            Q(course__icontains=search)
-        )
-    
-    if month:
-        enquiries = enquiries.filter(created_at__month=month)
+    enquiries = filtered_enquiries(request.GET)
     
-    if year:
-        enquiries = enquiries.filter(created_at__year=year)
-    
-    if course:
-        enquiries = enquiries.filter(course=course)
-    
-    available_years = (
-        Enquiry.objects
-        .annotate(year=ExtractYear('created_at'))
-        .values_list('year', flat=True)
-        .distinct()
-        .order_by('-year')
-    )
-    
-    available_courses = (
-        Enquiry.objects
-        .values_list('course', flat=True)
-        .distinct()
-        .order_by('course')
-    )
+    facets = enquiry_facets()
     
     paginator = Paginator(enquiries, 10)
+    # The count is cached; the page itself is always queried
+    paginator.count = count_enquiries(request.GET)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
     
@@ -185,8 +138,8 @@ def enquiry_list(request):
         "month": month,
         "year": year,
         "course": course,
-        "available_years": available_years,
-        "available_courses": available_courses,
+        "available_years": facets['years'],
+        "available_courses": facets['courses'],
         "filters_query": filters_query,
         "active_page": "enquiries"
     })
@@ -201,51 +154,45 @@ def delete_enquiry(request, id):
     return redirect("enquiry_list")
 
 
-# ================= EXPORT ENQUIRIES =================
+# ================= EXPORT JOBS =================
+def export_view(request, kind):
+    """Stream an export, or with ?background=1 queue it and return the job"""
+    kind = EXPORT_KINDS[kind]
+    if request.GET.get('background') == '1':
+        job = export_jobs.enqueue(kind, request.GET, request.user)
+        return JsonResponse({'success': True, 'job': export_jobs.job_status(job)}, status=202)
+    return export_response(request, kind)
+
+
+def _user_job(request, job_id):
+    jobs = ExportJob.objects.all()
+    if not request.user.is_superuser:
+        jobs = jobs.filter(created_by=request.user)
+    return get_object_or_404(jobs, id=job_id)
+
+
 @login_required
-def export_enquiries(request):
-    search = request.GET.get("search", "")
-    month = request.GET.get("month", "")
-    year = request.GET.get("year", "")
-    course = request.GET.get("course", "")
-    
-    enquiries = Enquiry.objects.all().order_by("-created_at")
-    
-    if search:
-        enquiries = enquiries.filter(
-            Q(name__icontains=search) |
-            Q(mobile__icontains=search) |
-            Q(course__icontains=search)
-        )
-    
-    if month:
-        enquiries = enquiries.filter(created_at__month=month)
-    
-    if year:
-        enquiries = enquiries.filter(created_at__year=year)
-    
-    if course:
-        enquiries = enquiries.filter(course=course)
-    
-    response = HttpResponse(content_type="text/csv")
-    timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
-    response["Content-Disposition"] = f'attachment; filename="enquiries_{timestamp}.csv"'
+def export_job_status(request, job_id):
+    """Progress of a background export"""
+    job = _user_job(request, job_id)
+    return JsonResponse({'success': True, 'job': export_jobs.job_status(job)})
 
-    writer = csv.writer(response)
-    writer.writerow(["ID", "Name", "Mobile", "Education", "Course", "Date & Time"])
 
-    for e in enquiries:
-        writer.writerow([
-            e.id,
-            e.name,
-            e.mobile,
-            e.education,
-            e.course,
-            e.created_at.strftime("%d-%m-%Y %I:%M %p")
-        ])
+@login_required
+def export_job_download(request, job_id):
+    """The finished file of a background export"""
+    job = _user_job(request, job_id)
+    if job.status == 'expired' or (job.expires_at and job.expires_at < timezone.now()):
+        return JsonResponse({'success': False, 'error': 'This export has expired'}, status=410)
+    if job.status != 'done' or not job.file:
+        return JsonResponse({'success': False, 'error': 'This export is not ready yet'}, status=404)
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.filename)
 
-    return response
 
+# ================= EXPORT ENQUIRIES =================
+@login_required
+def export_enquiries(request):
+    return export_view(request, 'enquiries')
 
 # ================= CONVERT ENQUIRY TO ADMISSION =================
 @login_required
@@ -282,29 +229,35 @@ def new_admission(request):
             educational_qualification = request.POST.get("educational_qualification")
             total_fees = request.POST.get("total_fees", 5000)
             photo = request.FILES.get("photo")
+            photo_error = photo and images.upload_error(photo)
+            if photo_error:
+                raise ValueError(photo_error)
             
-            admission = AdmittedStudent.objects.create(
-                course=course,
-                custom_course=custom_course if course == "Other" else "",
-                student_name=student_name,
-                father_name=father_name,
-                surname=surname,
-                mother_name=mother_name,
-                full_name=full_name,
-                date_of_birth=date_of_birth,
-                mobile_own=mobile_own,
-                parent_mobile=parent_mobile,
-                gender=gender,
-                marital_status=marital_status,
-                address=address,
-                city=city,
-                tehsil_block=tehsil_block,
-                district=district,
-                pin_code=pin_code,
-                educational_qualification=educational_qualification,
-                total_fees=total_fees,
-                photo=photo
-            )
+            # A photo that turns out unreadable leaves no admission behind
+            with transaction.atomic():
+                admission = AdmittedStudent.objects.create(
+                    course=course,
+                    custom_course=custom_course if course == "Other" else "",
+                    student_name=student_name,
+                    father_name=father_name,
+                    surname=surname,
+                    mother_name=mother_name,
+                    full_name=full_name,
+                    date_of_birth=date_of_birth,
+                    mobile_own=mobile_own,
+                    parent_mobile=parent_mobile,
+                    gender=gender,
+                    marital_status=marital_status,
+                    address=address,
+                    city=city,
+                    tehsil_block=tehsil_block,
+                    district=district,
+                    pin_code=pin_code,
+                    educational_qualification=educational_qualification,
+                    total_fees=total_fees
+                )
+                if photo:
+                    images.attach_photo(admission, photo)
             
             messages.success(request, f"Admission for {full_name} has been successfully recorded! Total Fees: ₹{total_fees}")
             return redirect("new_admission")
@@ -325,47 +278,74 @@ def admitted_students(request):
     year = request.GET.get("year", "")
     course = request.GET.get("course", "")
     
-    students = AdmittedStudent.objects.all().order_by('-admission_date')
-    
-    if search:
-        students = students.filter(
-            Q(full_name__icontains=search) |
-            Q(student_name__icontains=search) |
-            Q(mobile_own__icontains=search)
-        )
-    
-    if month:
-        students = students.filter(admission_date__month=month)
-    
-    if year:
-        students = students.filter(admission_date__year=year)
-    
-    if course:
-        students = students.filter(course=course)
+    students = filtered_admitted_students(request.GET)
+    cards, next_cursor = admitted_student_cards(students)
     
-    available_years = (
-        AdmittedStudent.objects
-        .annotate(year=ExtractYear('admission_date'))
-        .values_list('year', flat=True)
-        .distinct()
-        .order_by('-year')
-    )
+    # Only the filtered view shows a total, and COUNT(*) is cheaper than loading every row
+    filtered = bool(search or month or year or course)
     
     return render(request, 'core/admitted_students.html', {
-        'students': students,
+        'students': cards,
+        'next_cursor': next_cursor or '',
+        'total_count': count_admitted_students(request.GET) if filtered else None,
         'search': search,
         'month': month,
         'year': year,
         'course': course,
-        'available_years': available_years,
+        'available_years': admission_facets()['years'],
         'active_page': 'admitted_students'
     })
 
 
+# Columns a student card needs; the rest of the row is never loaded
+STUDENT_CARD_FIELDS = (
+    'id', 'full_name', 'student_name', 'mobile_own', 'photo', 'photo_renditions', 'total_fees', 'paid_fees',
+)
+STUDENT_CARD_ORDERING = ('-admission_date', '-id')
+STUDENT_PAGE_SIZE = 30
+
+
+def admitted_student_cards(students, cursor='', size=STUDENT_PAGE_SIZE):
+    """One keyset page of ``students`` as card dicts, plus the next cursor"""
+    rows, next_cursor = keyset_page(
+        students, STUDENT_CARD_ORDERING, cursor=cursor, size=size, fields=STUDENT_CARD_FIELDS
+    )
+    storage = images.photo_storage()
+    cards = []
+    for row in rows:
+        photo = images.photo_sources(row['photo'], row['photo_renditions'], storage)
+        cards.append({
+            'id': row['id'],
+            'full_name': row['full_name'],
+            'initial': (row['student_name'] or '')[:1].upper(),
+            'mobile_own': row['mobile_own'],
+            'photo_url': photo['url'],
+            'photo_srcset': photo['srcset'],
+            'photo_webp_srcset': photo['webp_srcset'],
+            'remaining_fees': f"{row['total_fees'] - row['paid_fees']:.2f}",
+        })
+    return cards, next_cursor
+
+
+@login_required
+def admitted_students_page(request):
+    """Next page of student cards for the infinite-scroll grid"""
+    students = filtered_admitted_students(request.GET)
+    size = parse_int(request.GET.get('size', STUDENT_PAGE_SIZE), 1, 100) or STUDENT_PAGE_SIZE
+    cards, next_cursor = admitted_student_cards(students, request.GET.get('cursor', ''), size)
+    
+    return JsonResponse({
+        'success': True,
+        'students': cards,
+        'next_cursor': next_cursor,
+    })
+
+
 # ================= STUDENT DETAIL (ADMITTED) =================
 @login_required
 def student_detail_admitted(request, student_id):
     student = get_object_or_404(AdmittedStudent, id=student_id)
+    photo = images.photo_sources(student.photo.name, student.photo_renditions)
     
     data = {
         'id': student.id,
@@ -379,7 +359,8 @@ def student_detail_admitted(request, student_id):
         'parent_mobile': student.parent_mobile or '',
         'gender': student.gender,
         'marital_status': student.marital_status,
-        'photo': student.photo.url if student.photo else '',
+        'photo': photo['url'],
+        'photo_srcset': photo['srcset'],
         'course': student.course,
         'custom_course': student.custom_course or '',
         'educational_qualification': student.educational_qualification,
@@ -402,6 +383,11 @@ def update_student_admitted(request, student_id):
     if request.method == 'POST':
         student = get_object_or_404(AdmittedStudent, id=student_id)
         
+        photo = request.FILES.get('photo')
+        photo_error = photo and images.upload_error(photo)
+        if photo_error:
+            return JsonResponse({'success': False, 'error': photo_error})
+        
         student.student_name = request.POST.get('student_name')
         student.father_name = request.POST.get('father_name')
         student.surname = request.POST.get('surname')
@@ -421,10 +407,13 @@ def update_student_admitted(request, student_id):
         student.district = request.POST.get('district')
         student.pin_code = request.POST.get('pin_code')
         
-        if request.FILES.get('photo'):
-            student.photo = request.FILES['photo']
-        
-        student.save()
+        try:
+            with transaction.atomic():
+                student.save()
+                if photo:
+                    images.attach_photo(student, photo)
+        except images.PhotoError as e:
+            return JsonResponse({'success': False, 'error': str(e)})
         
         messages.success(request, 'Student details updated successfully!')
         return JsonResponse({'success': True})
@@ -444,27 +433,33 @@ def fees_payment(request):
 @login_required
 def search_students_for_payment(request):
     query = request.GET.get('q', '').strip()
+    limit = 10
     
     if len(query) < 2:
         return JsonResponse({'students': []})
     
-    students = AdmittedStudent.objects.filter(
-        Q(full_name__icontains=query) |
-        Q(student_name__icontains=query) |
-        Q(mobile_own__icontains=query)
-    ).order_by('full_name')[:10]
-    
-    students_data = []
-    for student in students:
-        course_name = student.custom_course if student.course == 'Other' and student.custom_course else student.course
-        students_data.append({
-            'id': student.id,
-            'full_name': student.full_name,
-            'mobile_own': student.mobile_own,
-            'course': course_name
-        })
+    # Served from the in-process typeahead index (no database round trip)
+    students_data = typeahead.index.search(query, limit=limit)
+    
+    if not students_data:
+        # The student may have been admitted through another worker process
+        # since this process last refreshed its index
+        students = search_students(AdmittedStudent.objects.all(), query).order_by('full_name')[:limit]
+        for student in students:
+            course_name = student.custom_course if student.course == 'Other' and student.custom_course else student.course
+            students_data.append({
+                'id': student.id,
+                'full_name': student.full_name,
+                'mobile_own': student.mobile_own,
+                'course': course_name
+            })
     
-    return JsonResponse({'students': students_data})
+    # Fewer than ``limit`` results means the list is exhaustive, so the browser
+    # can narrow it locally while the query keeps growing
+    return JsonResponse({
+        'students': students_data,
+        'complete': len(students_data) < limit
+    })
 
 
 # ================= SUBMIT FEE PAYMENT =================
@@ -477,23 +472,24 @@ def submit_fee_payment(request):
             payment_mode = request.POST.get('payment_mode')
             remarks = request.POST.get('remarks', '')
             
+            # Validate amount
+            if amount <= 0:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Payment amount must be greater than zero'
+                })
+            
             with transaction.atomic():
-                student = AdmittedStudent.objects.select_for_update().get(id=student_id)
-                
-                # Validate amount
-                if amount <= 0:
-                    return JsonResponse({
-                        'success': False,
-                        'error': 'Payment amount must be greater than zero'
-                    })
-                
-                if amount > student.remaining_fees:
+                # Add to the student's paid fees (checked against the remaining fees)
+                try:
+                    student = ledger.pay(student_id, amount)
+                except ledger.LedgerError as e:
                     return JsonResponse({
                         'success': False,
-                        'error': f'Payment amount cannot exceed remaining fees (₹{student.remaining_fees})'
+                        'error': str(e)
                     })
                 
-                # Create payment record
+                # Create payment record, with the fees as they were just before
                 payment = FeePayment.objects.create(
                     student=student,
                     amount=amount,
@@ -504,9 +500,11 @@ def submit_fee_payment(request):
                     remaining_after_this=student.total_fees - (student.paid_fees + amount)
                 )
                 
-                # Update student's paid fees
                 student.paid_fees += amount
-                student.save()
+                
+                # Another receipt may be dated later than this one (an edited or settled one)
+                if ledger.rechain(student.id, [payment]):
+                    payment.refresh_from_db(fields=['paid_before_this', 'remaining_after_this'])
                 
                 # Prepare receipt data
                 course_name = student.custom_course if student.course == 'Other' and student.custom_course else student.course
@@ -616,89 +614,8 @@ def number_to_words(num):
 # ================= EXPORT STUDENTS TO EXCEL =================
 @login_required
 def export_students_excel(request):
-    students = Student.objects.filter(is_active=True)
-    
-    month = request.GET.get('month', '')
-    year = request.GET.get('year', '')
-    course_id = request.GET.get('course', '')
-    
-    if month and year:
-        students = students.filter(
-            admission_date__month=month,
-            admission_date__year=year
-        )
-    elif year:
-        students = students.filter(admission_date__year=year)
-    
-    if course_id:
-        students = students.filter(course_id=course_id)
-    
-    students = students.order_by('admission_date', 'name')
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Admitted Students"
-    
-    headers = [
-        'S.No', 'Name', 'Phone', 'Email', 'Course', 'Admission Date',
-        'Address', 'City', 'State', 'Pincode', 'Parent Name', 'Parent Phone',
-        'Qualification', 'Date of Birth', 'Total Fees', 'Paid Fees', 'Remaining Fees'
-    ]
-    
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=12)
-    
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.value = header
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    for row_num, student in enumerate(students, 2):
-        ws.cell(row=row_num, column=1).value = row_num - 1
-        ws.cell(row=row_num, column=2).value = student.name
-        ws.cell(row=row_num, column=3).value = student.phone
-        ws.cell(row=row_num, column=4).value = student.email or ''
-        ws.cell(row=row_num, column=5).value = student.course.name if student.course else ''
-        ws.cell(row=row_num, column=6).value = student.admission_date.strftime('%d-%m-%Y')
-        ws.cell(row=row_num, column=7).value = student.address or ''
-        ws.cell(row=row_num, column=8).value = student.city or ''
-        ws.cell(row=row_num, column=9).value = student.state or ''
-        ws.cell(row=row_num, column=10).value = student.pincode or ''
-        ws.cell(row=row_num, column=11).value = student.parent_name or ''
-        ws.cell(row=row_num, column=12).value = student.parent_phone or ''
-        ws.cell(row=row_num, column=13).value = student.qualification or ''
-        ws.cell(row=row_num, column=14).value = student.date_of_birth.strftime('%d-%m-%Y') if student.date_of_birth else ''
-        ws.cell(row=row_num, column=15).value = float(student.total_fees)
-        ws.cell(row=row_num, column=16).value = float(student.paid_fees)
-        ws.cell(row=row_num, column=17).value = float(student.remaining_fees)
-    
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    excel_file = BytesIO()
-    wb.save(excel_file)
-    excel_file.seek(0)
-    
-    response = HttpResponse(
-        excel_file.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    
-    filename = f'admitted_students_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return export_view(request, 'students')
+
 
 # ================= RECEIPTS VIEW =================
 @login_required
@@ -712,74 +629,15 @@ def receipts_view(request):
 # ================= GET RECEIPTS API =================
 @login_required
 def get_receipts(request):
-    """API endpoint to get all receipts with filters"""
+    """
+    API endpoint for receipts: filtered, sorted and paginated on the server.
+    
+    Filters: search, date, month, year, payment_mode, student
+    Paging: sort, size, cursor (from the previous page's next_cursor)
+    Output: fields (comma-separated subset), totals for the whole filtered set
+    """
     try:
-        # Get filter parameters
-        search = request.GET.get('search', '').strip()
-        date_filter = request.GET.get('date', '').strip()
-        month_filter = request.GET.get('month', '').strip()
-        year_filter = request.GET.get('year', '').strip()
-        
-        # Get all payments with related student data
-        payments = FeePayment.objects.select_related('student').all().order_by('-payment_date')
-        
-        # Apply search filter
-        if search:
-            payments = payments.filter(
-                Q(student__full_name__icontains=search) |
-                Q(student__mobile_own__icontains=search) |
-                Q(receipt_no__icontains=search)
-            )
-        
-        # Apply date filter
-        if date_filter:
-            try:
-                filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-                payments = payments.filter(payment_date__date=filter_date)
-            except ValueError:
-                pass
-        
-        # Apply month and year filters
-        if month_filter:
-            try:
-                payments = payments.filter(payment_date__month=int(month_filter))
-            except ValueError:
-                pass
-        
-        if year_filter:
-            try:
-                payments = payments.filter(payment_date__year=int(year_filter))
-            except ValueError:
-                pass
-        
-        # Build receipts data
-        receipts_data = []
-        for payment in payments:
-            # Get course name
-            course_name = payment.student.custom_course if payment.student.course == 'Other' and payment.student.custom_course else payment.student.course
-            
-            receipts_data.append({
-                'id': payment.id,
-                'receipt_no': payment.receipt_no,
-                'student_name': payment.student.full_name,
-                'student_id': payment.student.id,
-                'payment_date': payment.payment_date.strftime('%Y-%m-%d'),
-                'payment_time': payment.payment_date.strftime('%I:%M %p'),
-                'paid_fees': float(payment.amount),
-                'remaining_fees': float(payment.remaining_after_this),
-                'total_fees': float(payment.total_fees_at_payment),
-                'paid_before_this': float(payment.paid_before_this),
-                'payment_mode': payment.payment_mode,
-                'course': course_name,
-                'mobile': payment.student.mobile_own,
-                'remarks': payment.remarks or '',
-            })
-        
-        return JsonResponse({
-            'success': True,
-            'receipts': receipts_data,
-            'total_count': len(receipts_data)
-        })
+        return JsonResponse(receipt_page(request.GET))
         
     except Exception as e:
         print(f"Error in get_receipts: {str(e)}")  # Debug log
@@ -791,62 +649,79 @@ def get_receipts(request):
         }, status=500)
 
 
+# ================= RECEIPT CHANGES API =================
+@login_required
+def get_receipt_changes(request):
+    """API endpoint for receipts saved or deleted since the client's last sync token"""
+    try:
+        return JsonResponse(receipt_changes(request.GET))
+        
+    except Exception as e:
+        print(f"Error in get_receipt_changes: {str(e)}")  # Debug log
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
 # ================= UPDATE RECEIPT API =================
 @login_required
 @require_http_methods(["POST"])
 def update_receipt(request, receipt_id):
     """API endpoint to update receipt details"""
     try:
-        # Get the payment
-        payment = get_object_or_404(FeePayment, id=receipt_id)
-        
         # Parse JSON data
         data = json.loads(request.body)
         
-        # Store old amount for updating student's paid_fees
-        old_amount = payment.amount
-        
-        # Update fields
-        if 'payment_date' in data:
-            try:
-                # Parse the date string
-                payment_date_str = data['payment_date']
-                payment_date = datetime.strptime(payment_date_str, '%Y-%m-%d')
-                payment.payment_date = payment_date
-            except ValueError:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Invalid date format'
-                })
-        
-        if 'paid_fees' in data:
-            new_amount = Decimal(str(data['paid_fees']))
+        with transaction.atomic():
+            # Get the payment, locked so a concurrent edit cannot use a stale amount
+            payment = FeePayment.objects.select_for_update().get(id=receipt_id)
             
-            # Validate amount
-            if new_amount <= 0:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Payment amount must be greater than zero'
-                })
+            # Store old amount for updating student's paid_fees, and where the receipt stood
+            old_amount = payment.amount
+            old_position = (payment.payment_date, payment.id)
+            opening = ledger.opening_balance(payment.student_id)
             
-            # Calculate the difference
-            difference = new_amount - old_amount
+            # Update fields
+            if 'payment_date' in data:
+                try:
+                    # Parse the date string
+                    payment_date_str = data['payment_date']
+                    payment_date = timezone.make_aware(datetime.strptime(payment_date_str, '%Y-%m-%d'))
+                    payment.payment_date = payment_date
+                except ValueError:
+                    return JsonResponse({
+                        'success': False,
+                        'error': 'Invalid date format'
+                    })
             
-            # Update payment amount
-            payment.amount = new_amount
+            if 'paid_fees' in data:
+                new_amount = Decimal(str(data['paid_fees']))
+                
+                # Validate amount
+                if new_amount <= 0:
+                    return JsonResponse({
+                        'success': False,
+                        'error': 'Payment amount must be greater than zero'
+                    })
+                
+                # Update payment amount
+                payment.amount = new_amount
+                
+                # Recalculate remaining fees
+                payment.remaining_after_this = payment.total_fees_at_payment - (payment.paid_before_this + new_amount)
+                
+                # Update student's paid fees by the difference
+                if new_amount != old_amount:
+                    ledger.adjust(payment.student_id, new_amount - old_amount)
             
-            # Recalculate remaining fees
-            payment.remaining_after_this = payment.total_fees_at_payment - (payment.paid_before_this + new_amount)
+            payment.save()
             
-            # Update student's paid fees
-            with transaction.atomic():
-                student = payment.student
-                student.paid_fees = student.paid_fees + difference
-                if student.paid_fees < 0:
-                    student.paid_fees = 0
-                student.save()
-        
-        payment.save()
+            # Bring the snapshots of this and every later receipt up to date
+            start = min(old_position, (payment.payment_date, payment.id))
+            ledger.restate(payment.student_id, start, opening)
         
         return JsonResponse({
             'success': True,
@@ -858,6 +733,11 @@ def update_receipt(request, receipt_id):
             'success': False,
             'error': 'Receipt not found'
         }, status=404)
+    except ledger.LedgerError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=409)
     except Exception as e:
         print(f"Error in update_receipt: {str(e)}")  # Debug log
         import traceback
@@ -879,28 +759,26 @@ def delete_receipt(request, receipt_id):
         }, status=405)
     
     try:
-        # Get the payment
-        payment = FeePayment.objects.select_related('student').get(id=receipt_id)
-        
-        # Store payment details before deletion
-        payment_amount = payment.amount
-        student = payment.student
-        receipt_no = payment.receipt_no
-        student_name = student.full_name
-        
-        # Debug logging
-        print(f"Deleting receipt {receipt_no} for {student_name}, amount: {payment_amount}")
-        
-        # Update student's paid fees (subtract the deleted payment amount)
         with transaction.atomic():
-            # Recalculate student's paid fees
-            student.paid_fees = max(0, student.paid_fees - payment_amount)
-            student.save()
+            # Get the payment
+            payment = FeePayment.objects.select_for_update().select_related('student').get(id=receipt_id)
             
-            # Delete the payment record
+            # Store payment details before deletion
+            payment_amount = payment.amount
+            receipt_no = payment.receipt_no
+            student_name = payment.student.full_name
+            
+            # Debug logging
+            print(f"Deleting receipt {receipt_no} for {student_name}, amount: {payment_amount}")
+            
+            # Update student's paid fees (subtract the deleted payment amount)
+            student = ledger.adjust(payment.student_id, -payment_amount)
+            
+            # Delete the payment record and re-chain the receipts after it
             payment.delete()
+            ledger.restate(payment.student_id, (payment.payment_date, receipt_id), ledger.opening_balance(payment.student_id))
             
-            print(f"Receipt deleted successfully. Student's new paid_fees: {student.paid_fees}")
+            print(f"Receipt deleted successfully. Student's new paid_fees: {max(0, student.paid_fees - payment_amount)}")
         
         return JsonResponse({
             'success': True,
@@ -927,108 +805,7 @@ def delete_receipt(request, receipt_id):
 def export_receipts(request):
     """Export receipts to Excel"""
     try:
-        # Get filter parameters
-        search = request.GET.get('search', '')
-        date_filter = request.GET.get('date', '')
-        month = request.GET.get('month', '')
-        year = request.GET.get('year', '')
-        
-        # Get all payments
-        payments = FeePayment.objects.select_related('student').all().order_by('-payment_date')
-        
-        # Apply filters
-        if search:
-            payments = payments.filter(
-                Q(student__full_name__icontains=search) |
-                Q(student__mobile_own__icontains=search) |
-                Q(receipt_no__icontains=search)
-            )
-        
-        if date_filter:
-            try:
-                filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-                payments = payments.filter(payment_date__date=filter_date)
-            except ValueError:
-                pass
-        
-        if month:
-            try:
-                payments = payments.filter(payment_date__month=int(month))
-            except ValueError:
-                pass
-        
-        if year:
-            try:
-                payments = payments.filter(payment_date__year=int(year))
-            except ValueError:
-                pass
-        
-        # Create workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Payment Receipts"
-        
-        # Headers
-        headers = [
-            'Receipt No', 'Student Name', 'Mobile', 'Course', 
-            'Payment Date', 'Payment Mode', 'Total Fees', 
-            'Paid Before', 'Amount Paid', 'Remaining Fees', 'Remarks'
-        ]
-        
-        # Style headers
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=12)
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Add data
-        for row_num, payment in enumerate(payments, 2):
-            course_name = payment.student.custom_course if payment.student.course == 'Other' and payment.student.custom_course else payment.student.course
-            
-            ws.cell(row=row_num, column=1).value = payment.receipt_no
-            ws.cell(row=row_num, column=2).value = payment.student.full_name
-            ws.cell(row=row_num, column=3).value = payment.student.mobile_own
-            ws.cell(row=row_num, column=4).value = course_name
-            ws.cell(row=row_num, column=5).value = payment.payment_date.strftime('%d-%m-%Y %I:%M %p')
-            ws.cell(row=row_num, column=6).value = payment.payment_mode
-            ws.cell(row=row_num, column=7).value = float(payment.total_fees_at_payment)
-            ws.cell(row=row_num, column=8).value = float(payment.paid_before_this)
-            ws.cell(row=row_num, column=9).value = float(payment.amount)
-            ws.cell(row=row_num, column=10).value = float(payment.remaining_after_this)
-            ws.cell(row=row_num, column=11).value = payment.remarks or ''
-        
-        # Adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Create response
-        excel_file = BytesIO()
-        wb.save(excel_file)
-        excel_file.seek(0)
-        
-        response = HttpResponse(
-            excel_file.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-        filename = f'receipts_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        return response
+        return export_view(request, 'receipts')
         
     except Exception as e:
         print(f"Error in export_receipts: {str(e)}")  # Debug log
@@ -1042,127 +819,132 @@ def export_receipts(request):
 # ================= EXPORT ADMITTED STUDENTS TO EXCEL =================
 @login_required
 def export_admitted_students_excel(request):
-    # Get filter parameters
-    search = request.GET.get('search', '')
-    month = request.GET.get('month', '')
-    year = request.GET.get('year', '')
-    course = request.GET.get('course', '')
-    
-    # Base queryset
-    students = AdmittedStudent.objects.all()
+    return export_view(request, 'admitted_students')
+
+
+# ================= IMPORT ADMISSIONS =================
+@login_required
+@require_http_methods(["POST"])
+def import_admissions_view(request):
+    """Check (dry_run=1) or import an .xlsx/.csv file of admissions"""
+    upload = request.FILES.get('file')
+    if not upload:
+        return JsonResponse({'success': False, 'error': 'Choose an .xlsx or .csv file to import'}, status=400)
     
-    # Apply filters
-    if search:
-        students = students.filter(
-            Q(full_name__icontains=search) |
-            Q(student_name__icontains=search) |
-            Q(mobile_own__icontains=search)
+    try:
+        result = import_admissions(upload, upload.name, dry_run=request.POST.get('dry_run') == '1')
+    except ImportFileError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    summary = result.summary()
+    summary['error_file_url'] = None
+    if result.errors:
+        # Random directory, like export files: the URL is not guessable
+        name = default_storage.save(
+            f'imports/errors/{uuid.uuid4().hex}/admission_errors.csv',
+            ContentFile(b''.join(result.error_file_chunks())),
         )
+        summary['error_file_url'] = default_storage.url(name)
     
-    if month:
-        students = students.filter(admission_date__month=month)
-    
-    if year:
-        students = students.filter(admission_date__year=year)
-    
-    if course:
-        students = students.filter(course=course)
-    
-    # Order by admission date
-    students = students.order_by('-admission_date')
-    
-    # Create workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Admitted Students"
-    
-    # Headers
-    headers = [
-        'S.No', 'Full Name', 'Student Name', 'Father Name', 'Surname', 'Mother Name',
-        'Date of Birth', 'Mobile (Own)', 'Parent Mobile', 'Gender', 'Marital Status',
-        'Course', 'Custom Course', 'Educational Qualification',
-        'Address', 'City', 'Tehsil/Block', 'District', 'Pin Code',
-        'Total Fees (₹)', 'Paid Fees (₹)', 'Remaining Fees (₹)', 'Fees % Paid',
-        'Admission Date'
-    ]
-    
-    # Style headers
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=12)
-    
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.value = header
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Add data
-    for row_num, student in enumerate(students, 2):
-        ws.cell(row=row_num, column=1).value = row_num - 1  # S.No
-        ws.cell(row=row_num, column=2).value = student.full_name
-        ws.cell(row=row_num, column=3).value = student.student_name
-        ws.cell(row=row_num, column=4).value = student.father_name
-        ws.cell(row=row_num, column=5).value = student.surname
-        ws.cell(row=row_num, column=6).value = student.mother_name
-        ws.cell(row=row_num, column=7).value = student.date_of_birth.strftime('%d-%m-%Y') if student.date_of_birth else ''
-        ws.cell(row=row_num, column=8).value = student.mobile_own
-        ws.cell(row=row_num, column=9).value = student.parent_mobile or ''
-        ws.cell(row=row_num, column=10).value = student.gender
-        ws.cell(row=row_num, column=11).value = student.marital_status
-        ws.cell(row=row_num, column=12).value = student.course
-        ws.cell(row=row_num, column=13).value = student.custom_course or ''
-        ws.cell(row=row_num, column=14).value = student.educational_qualification
-        ws.cell(row=row_num, column=15).value = student.address
-        ws.cell(row=row_num, column=16).value = student.city
-        ws.cell(row=row_num, column=17).value = student.tehsil_block
-        ws.cell(row=row_num, column=18).value = student.district
-        ws.cell(row=row_num, column=19).value = student.pin_code
-        ws.cell(row=row_num, column=20).value = float(student.total_fees)
-        ws.cell(row=row_num, column=21).value = float(student.paid_fees)
-        ws.cell(row=row_num, column=22).value = float(student.remaining_fees)
-        ws.cell(row=row_num, column=23).value = f"{student.fees_percentage_paid:.2f}%"
-        ws.cell(row=row_num, column=24).value = student.admission_date.strftime('%d-%m-%Y %I:%M %p')
-    
-    # Adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Create response
-    excel_file = BytesIO()
-    wb.save(excel_file)
-    excel_file.seek(0)
-    
-    response = HttpResponse(
-        excel_file.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    return JsonResponse({'success': True, **summary})
+
+
+# ================= SETTLEMENT IMPORT AND REVIEW =================
+@login_required
+def settlements_view(request):
+    """Statement import form and the queue of rows waiting for review"""
+    reviews = list(
+        SettlementReview.objects.filter(status='pending').select_related('settlement')[:200]
     )
+    candidate_ids = {student_id for review in reviews for student_id in review.candidate_ids}
+    names = dict(
+        AdmittedStudent.objects.filter(id__in=candidate_ids).values_list('id', 'full_name')
+    )
+    for review in reviews:
+        review.candidates = [
+            {'id': student_id, 'name': names[student_id]}
+            for student_id in review.candidate_ids if student_id in names
+        ]
     
-    # Generate filename with timestamp and filters
-    filename_parts = ['admitted_students']
-    if search:
-        filename_parts.append(f'search_{search[:20]}')
-    if course:
-        filename_parts.append(f'{course}')
-    if month:
-        filename_parts.append(f'month_{month}')
-    if year:
-        filename_parts.append(f'{year}')
-    filename_parts.append(datetime.now().strftime("%Y%m%d_%H%M%S"))
+    return render(request, 'core/settlements.html', {
+        'reviews': reviews,
+        'pending_count': SettlementReview.objects.filter(status='pending').count(),
+        'recent_imports': SettlementImport.objects.all()[:10],
+        'payment_modes': SETTLEMENT_MODES,
+        'active_page': 'settlements',
+    })
+
+
+@login_required
+@require_http_methods(["POST"])
+def import_settlement_view(request):
+    """Post the matched rows of a bank/UPI statement; queue the rest for review"""
+    upload = request.FILES.get('file')
+    if not upload:
+        return JsonResponse({'success': False, 'error': 'Choose a statement file to import'}, status=400)
     
-    filename = '_'.join(filename_parts) + '.xlsx'
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    try:
+        settlement = import_settlement(upload, upload.name, request.POST.get('payment_mode', ''), request.user)
+    except ImportFileError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'settlement': {
+            'id': settlement.id,
+            'rows': settlement.rows_total,
+            'posted': settlement.matched,
+            'review': settlement.queued_for_review,
+            'duplicates': settlement.duplicates,
+        }
+    })
+
+
+@login_required
+@require_http_methods(["POST"])
+def resolve_settlement_review(request, review_id):
+    """Post a queued statement row to a student (student_id) or dismiss it (dismiss=1)"""
+    review = get_object_or_404(SettlementReview.objects.select_related('settlement'), id=review_id)
     
-    return response
+    try:
+        if request.POST.get('dismiss') == '1':
+            dismiss_review(review, request.user)
+            return JsonResponse({'success': True, 'status': review.status})
+        
+        student_id = parse_int(request.POST.get('student_id', ''), 1, 2 ** 63 - 1)
+        if not student_id:
+            return JsonResponse({'success': False, 'error': 'Choose a student'}, status=400)
+        payment = post_review(review, student_id, request.user)
+    except ReviewError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({'success': True, 'status': review.status, 'receipt_no': payment.receipt_no})
+
+
+# ================= MONTH-END REPORT =================
+@login_required
+def month_end_report(request):
+    """Students, receipts, course summary and cash books for one month, as one workbook"""
+    today = timezone.localdate()
+    year = parse_int(request.GET.get('year', ''), 1900, 9999) or today.year
+    month = parse_int(request.GET.get('month', ''), 1, 12) or today.month
+
+    filename = f'month_end_{year}_{month:02d}.xlsx'
+    return cached_export_response(
+        request, MonthEndReport, 'xlsx', lambda: stream_xlsx(month_end_sheets(year, month)),
+        filename, XLSX_CONTENT_TYPE, False, params={'year': str(year), 'month': str(month)},
+    )
+
+
+# ================= CACHE STATS =================
+@login_required
+def cache_stats(request):
+    """Hit/miss counters of the cached facets, counts and dashboard figures"""
+    return JsonResponse({
+        'success': True,
+        'backend': settings.CACHE_BACKEND,
+        'stats': caching.stats(),
+    })
 
 
 # ================= DELETE ADMITTED STUDENTS (BULK DELETE) =================
@@ -1208,21 +990,9 @@ def delete_admitted_students(request):
         # Count students
         delete_count = students_to_delete.count()
         
-        # Delete students (this will also delete related FeePayment records due to CASCADE)
+        # Delete students (this will also delete related FeePayment records due to CASCADE).
+        # Their photos are released and removed later by the media sweeper (core.media)
         with transaction.atomic():
-            # Delete photos first (optional - to clean up media files)
-            for student in students_to_delete:
-                if student.photo:
-                    try:
-                        # Delete the physical file
-                        if student.photo.path:
-                            import os
-                            if os.path.isfile(student.photo.path):
-                                os.remove(student.photo.path)
-                    except Exception as e:
-                        # Log error but don't fail the deletion
-                        print(f"Error deleting photo for student {student.id}: {str(e)}")
-            
             # Delete all students (and related fee payments via CASCADE)
             students_to_delete.delete()
         
@@ -1244,4 +1014,27 @@ def delete_admitted_students(request):
         return JsonResponse({
             'success': False,
             'error': f'An error occurred: {str(e)}'
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+
+# ================= MEDIA & STATIC FILES =================
+# Content-addressed photos and their renditions never change under their names (core.storage)
+IMMUTABLE_MEDIA = re.compile(r'(^|/)(renditions/|[0-9a-f]{2}/[0-9a-f]{64}\.)')
+
+
+@login_required
+def media_file(request, path):
+    """Uploaded files (student photos), for logged-in staff only"""
+    cache_control = 'private, ' + (assets.IMMUTABLE if IMMUTABLE_MEDIA.search(path) else assets.REVALIDATE)
+    sendfile = None
+    if settings.SENDFILE_HEADER:
+        sendfile = assets.sendfile_target(
+            settings.SENDFILE_HEADER, settings.SENDFILE_MEDIA_PREFIX, settings.MEDIA_ROOT, path,
+        )
+    return assets.serve_file(request, settings.MEDIA_ROOT, path, cache_control, sendfile=sendfile)
+
+
+def static_file(request, path):
+    """Collected static files, when DEBUG is off and no web server serves STATIC_ROOT"""
+    cache_control = 'public, ' + (assets.IMMUTABLE if path in assets.hashed_static_names() else assets.REVALIDATE)
+    return assets.serve_file(request, settings.STATIC_ROOT, path, cache_control, precompressed=True)
@@ -0,0 +1,267 @@
+"""
+Streaming XLSX writer.
+
+An .xlsx file is a zip of SpreadsheetML parts. This module writes those parts
+directly and streams the zip as it is produced, instead of building an
+openpyxl Workbook in memory, sizing columns with a second pass over
+``ws.columns`` and copying the saved file through a BytesIO.
+
+Rows are read once. Each row's XML goes to a spooled temporary file while the
+column widths are measured; ``<cols>`` must come before ``<sheetData>``, so
+the sheet part is then written as head + spooled rows + tail. Strings are
+inline (no shared-string table), so memory use does not depend on the row
+count.
+"""
+import re
+import tempfile
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape, quoteattr
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Same rule the exports used with openpyxl: longest value + 2, at most 50
+MAX_COLUMN_WIDTH = 50
+MIN_COLUMN_WIDTH = 4
+
+# Rows are kept in memory up to this size, then spill to disk
+SPOOL_SIZE = 4 * 1024 * 1024
+COPY_CHUNK = 64 * 1024
+ROWS_PER_WRITE = 200
+
+# Characters XML 1.0 does not allow (openpyxl raises IllegalCharacterError on them)
+ILLEGAL_CHARACTERS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+HEADER_STYLE = 1
+
+
+class Sheet:
+    """One worksheet: a title, the header row and an iterable of data rows"""
+
+    def __init__(self, title, headers, rows):
+        self.title = title[:31]
+        self.headers = list(headers)
+        self.rows = rows
+
+
+# ================= STATIC PARTS =================
+def _content_types(sheet_count):
+    overrides = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{index}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for index in range(1, sheet_count + 1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        f'{overrides}</Types>'
+    )
+
+
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+
+def _workbook(titles):
+    sheets = ''.join(
+        f'<sheet name={quoteattr(_clean(title))} sheetId="{index}" r:id="rId{index}"/>'
+        for index, title in enumerate(titles, 1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets>{sheets}</sheets></workbook>'
+    )
+
+
+def _workbook_rels(sheet_count):
+    sheets = ''.join(
+        f'<Relationship Id="rId{index}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{index}.xml"/>'
+        for index in range(1, sheet_count + 1)
+    )
+    styles = (
+        f'<Relationship Id="rId{sheet_count + 1}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'{sheets}{styles}</Relationships>'
+    )
+
+
+# Style 0 is the default; style 1 is the export header (bold white on 366092, centred)
+STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2">'
+    '<font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="12"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font>'
+    '</fonts>'
+    '<fills count="3">'
+    '<fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FF366092"/><bgColor rgb="FF366092"/></patternFill></fill>'
+    '</fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="center"/></xf>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+# ================= CELLS =================
+def _clean(text):
+    return ILLEGAL_CHARACTERS.sub('', text)
+
+
+def column_letter(index):
+    """1 -> A, 27 -> AA"""
+    letters = ''
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def display_text(value):
+    """What a cell shows, for width estimates"""
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _cell(ref, value, style=0):
+    style_attr = f' s="{style}"' if style else ''
+    if value is None or value == '':
+        return f'<c r="{ref}"{style_attr}/>' if style else ''
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{style_attr} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c r="{ref}"{style_attr}><v>{value}</v></c>'
+    text = _clean(display_text(value))
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<c r="{ref}"{style_attr} t="inlineStr"><is><t{space}>{escape(text)}</t></is></c>'
+
+
+def _row(number, letters, values, style=0):
+    cells = ''.join(
+        _cell(f'{letter}{number}', value, style)
+        for letter, value in zip(letters, values)
+    )
+    return f'<row r="{number}">{cells}</row>'
+
+
+# ================= SHEETS =================
+def _write_rows(output, sheet):
+    """Write the <row> elements to ``output``; return the estimated column widths"""
+    letters = [column_letter(index) for index in range(1, len(sheet.headers) + 1)]
+    widths = [len(str(header)) for header in sheet.headers]
+
+    output.write(_row(1, letters, sheet.headers, HEADER_STYLE).encode('utf-8'))
+    batch = []
+    for number, values in enumerate(sheet.rows, 2):
+        values = list(values)
+        for position, value in enumerate(values[:len(widths)]):
+            length = len(display_text(value))
+            if length > widths[position]:
+                widths[position] = length
+        batch.append(_row(number, letters, values))
+        if len(batch) >= ROWS_PER_WRITE:
+            output.write(''.join(batch).encode('utf-8'))
+            batch = []
+    if batch:
+        output.write(''.join(batch).encode('utf-8'))
+    return [max(MIN_COLUMN_WIDTH, min(width + 2, MAX_COLUMN_WIDTH)) for width in widths]
+
+
+def _sheet_head(widths):
+    cols = ''.join(
+        f'<col min="{index}" max="{index}" width="{width}" customWidth="1"/>'
+        for index, width in enumerate(widths, 1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<cols>{cols}</cols><sheetData>'
+    )
+
+
+SHEET_TAIL = '</sheetData></worksheet>'
+
+
+# ================= ZIP STREAM =================
+class _Sink:
+    """Write-only file object collecting what zipfile writes, drained by the generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        if chunks:
+            yield b''.join(chunks)
+
+
+def stream_xlsx(sheets):
+    """Generate the bytes of an .xlsx workbook holding ``sheets``, as it is built"""
+    sheets = list(sheets)
+    sink = _Sink()
+    # The sink cannot seek, so zipfile writes sizes in data descriptors after each part
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        archive.writestr('[Content_Types].xml', _content_types(len(sheets)))
+        archive.writestr('_rels/.rels', ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _workbook([sheet.title for sheet in sheets]))
+        archive.writestr('xl/_rels/workbook.xml.rels', _workbook_rels(len(sheets)))
+        archive.writestr('xl/styles.xml', STYLES)
+        yield from sink.drain()
+
+        for index, sheet in enumerate(sheets, 1):
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as rows:
+                widths = _write_rows(rows, sheet)
+                rows.seek(0)
+                with archive.open(f'xl/worksheets/sheet{index}.xml', 'w', force_zip64=True) as part:
+                    part.write(_sheet_head(widths).encode('utf-8'))
+                    while True:
+                        chunk = rows.read(COPY_CHUNK)
+                        if not chunk:
+                            break
+                        part.write(chunk)
+                        yield from sink.drain()
+                    part.write(SHEET_TAIL.encode('utf-8'))
+            yield from sink.drain()
+
+    # Central directory, written when the archive closes
+    yield from sink.drain()
@@ -51,9 +51,9 @@ document.addEventListener('DOMContentLoaded', function() {
         const file = e.target.files[0];
         
         if (file) {
-            // Check file size (max 2MB)
-            if (file.size > 2 * 1024 * 1024) {
-                alert('File size should be less than 2MB');
+            // Check file size (max 15MB; the server shrinks photos when they are saved)
+            if (file.size > 15 * 1024 * 1024) {
+                alert('File size should be less than 15MB');
                 photoInput.value = '';
                 return;
             }
@@ -14,6 +14,147 @@ function getCookie(name) {
     return cookieValue;
 }
 
+// ===================== INFINITE SCROLL =====================
+function buildStudentCard(student) {
+    const card = document.createElement('div');
+    card.className = 'student-card';
+    card.dataset.studentId = student.id;
+    
+    const select = document.createElement('div');
+    select.className = 'student-select';
+    const checkbox = document.createElement('input');
+    checkbox.type = 'checkbox';
+    checkbox.className = 'student-checkbox';
+    checkbox.value = student.id;
+    checkbox.addEventListener('click', function(event) {
+        event.stopPropagation();
+        updateSelectedCount();
+    });
+    select.appendChild(checkbox);
+    
+    const photo = document.createElement('div');
+    photo.className = 'student-photo';
+    photo.addEventListener('click', () => openStudentModal(student.id));
+    if (student.photo_url) {
+        const img = document.createElement('img');
+        img.src = student.photo_url;
+        img.alt = student.full_name;
+        img.loading = 'lazy';
+        img.decoding = 'async';
+        if (student.photo_srcset) {
+            // Downscaled copies: WebP where supported, JPEG otherwise
+            const picture = document.createElement('picture');
+            const webp = document.createElement('source');
+            webp.type = 'image/webp';
+            webp.srcset = student.photo_webp_srcset;
+            webp.sizes = '1.8cm';
+            img.srcset = student.photo_srcset;
+            img.sizes = '1.8cm';
+            picture.appendChild(webp);
+            picture.appendChild(img);
+            photo.appendChild(picture);
+        } else {
+            photo.appendChild(img);
+        }
+    } else {
+        const placeholder = document.createElement('div');
+        placeholder.className = 'photo-placeholder';
+        placeholder.textContent = student.initial;
+        photo.appendChild(placeholder);
+    }
+    
+    const info = document.createElement('div');
+    info.className = 'student-info';
+    info.addEventListener('click', () => openStudentModal(student.id));
+    
+    const name = document.createElement('h3');
+    name.className = 'student-name';
+    name.textContent = student.full_name;
+    
+    const details = document.createElement('div');
+    details.className = 'student-details';
+    details.appendChild(buildDetailItem('📞', student.mobile_own));
+    const fees = buildDetailItem('💰', `Remaining: ₹${student.remaining_fees}`);
+    fees.classList.add('fees');
+    details.appendChild(fees);
+    
+    info.appendChild(name);
+    info.appendChild(details);
+    card.appendChild(select);
+    card.appendChild(photo);
+    card.appendChild(info);
+    return card;
+}
+
+function buildDetailItem(icon, text) {
+    const item = document.createElement('div');
+    item.className = 'detail-item';
+    const iconSpan = document.createElement('span');
+    iconSpan.className = 'detail-icon';
+    iconSpan.textContent = icon;
+    const textSpan = document.createElement('span');
+    textSpan.textContent = text;
+    item.appendChild(iconSpan);
+    item.appendChild(textSpan);
+    return item;
+}
+
+function setupInfiniteScroll() {
+    const grid = document.getElementById('studentsGrid');
+    const sentinel = document.getElementById('studentsSentinel');
+    if (!grid || !sentinel || !('IntersectionObserver' in window)) {
+        return;
+    }
+    
+    let nextCursor = grid.dataset.nextCursor;
+    let loading = false;
+    
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadNextPage();
+        }
+    }, { rootMargin: '600px 0px' });
+    
+    function loadNextPage() {
+        if (loading || !nextCursor) {
+            return;
+        }
+        loading = true;
+        
+        // Same filters as the page itself, plus the cursor
+        const params = new URLSearchParams(window.location.search);
+        params.set('cursor', nextCursor);
+        
+        fetch(`${grid.dataset.pageUrl}?${params.toString()}`)
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    throw new Error(data.error || 'Failed to load students');
+                }
+                const fragment = document.createDocumentFragment();
+                data.students.forEach(student => fragment.appendChild(buildStudentCard(student)));
+                grid.appendChild(fragment);
+                
+                nextCursor = data.next_cursor;
+                if (!nextCursor) {
+                    observer.disconnect();
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                nextCursor = null;
+                observer.disconnect();
+            })
+            .finally(() => {
+                loading = false;
+            });
+    }
+    
+    if (nextCursor) {
+        observer.observe(sentinel);
+    }
+}
+
 // ===================== OPEN STUDENT MODAL =====================
 function openStudentModal(studentId) {
     const modal = document.getElementById('studentModal');
@@ -46,6 +187,7 @@ function openStudentModal(studentId) {
             
             // Photo
             const modalPhoto = document.getElementById('modalPhoto');
+            modalPhoto.srcset = data.photo_srcset || '';
             if (data.photo) {
                 modalPhoto.src = data.photo;
             } else {
@@ -187,6 +329,9 @@ function validatePinCode(input) {
 // ===================== DOCUMENT READY =====================
 document.addEventListener('DOMContentLoaded', function() {
     
+    // ===================== INFINITE SCROLL =====================
+    setupInfiniteScroll();
+    
     // ===================== FEES CALCULATION =====================
     const totalFeesInput = document.getElementById('totalFees');
     const paidFeesInput = document.getElementById('paidFees');
@@ -243,9 +388,9 @@ document.addEventListener('DOMContentLoaded', function() {
             const file = e.target.files[0];
             
             if (file) {
-                // Check file size (max 2MB)
-                if (file.size > 2 * 1024 * 1024) {
-                    alert('⚠️ File size should be less than 2MB');
+                // Check file size (max 15MB; the server shrinks photos when they are saved)
+                if (file.size > 15 * 1024 * 1024) {
+                    alert('⚠️ File size should be less than 15MB');
                     photoInput.value = '';
                     return;
                 }
@@ -262,6 +407,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 reader.onload = function(e) {
                     const modalPhoto = document.getElementById('modalPhoto');
                     if (modalPhoto) {
+                        modalPhoto.srcset = '';
                         modalPhoto.src = e.target.result;
                     }
                 };
@@ -417,4 +563,65 @@ style.textContent = `
         }
     }
 `;
-document.head.appendChild(style);
\ No newline at end of file
+document.head.appendChild(style);
+
+
+// ===================== IMPORT ADMISSIONS =====================
+// The file is checked first (dry run); nothing is saved until the summary is confirmed
+async function postImport(input, dryRun) {
+    const formData = new FormData();
+    formData.append('file', input.files[0]);
+    if (dryRun) formData.append('dry_run', '1');
+
+    const response = await fetch(input.dataset.importUrl, {
+        method: 'POST',
+        headers: { 'X-CSRFToken': getCookie('csrftoken') },
+        body: formData
+    });
+    const data = await response.json();
+    if (!data.success) {
+        throw new Error(data.error || 'Import failed');
+    }
+    return data;
+}
+
+function importErrorText(data) {
+    if (!data.failed) return '';
+    const lines = data.errors.slice(0, 5).map(error => `Row ${error.row}: ${error.error}`);
+    if (data.failed > lines.length) lines.push(`...and ${data.failed - lines.length} more`);
+    return `\n\n${lines.join('\n')}`;
+}
+
+async function importAdmissions(input) {
+    if (!input.files.length) return;
+    try {
+        const check = await postImport(input, true);
+        if (!check.valid) {
+            alert(`No rows can be imported from this file.${importErrorText(check)}`);
+            if (check.error_file_url) window.open(check.error_file_url);
+            return;
+        }
+        const proceed = confirm(
+            `${check.rows} rows checked: ${check.valid} ready to import, ${check.failed} with errors.` +
+            `${importErrorText(check)}\n\nImport the ${check.valid} valid rows now?`
+        );
+        if (!proceed) return;
+
+        const result = await postImport(input, false);
+        alert(`Imported ${result.imported} of ${result.rows} rows.`);
+        if (result.error_file_url) window.open(result.error_file_url);
+        window.location.reload();
+    } catch (error) {
+        console.error('Error importing:', error);
+        alert(`Import failed: ${error.message}`);
+    } finally {
+        input.value = '';
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const importFile = document.getElementById('importFile');
+    if (importFile) {
+        importFile.addEventListener('change', () => importAdmissions(importFile));
+    }
+});
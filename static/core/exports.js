@@ -0,0 +1,90 @@
+// ================= BACKGROUND EXPORTS =================
+// Large exports are queued with ?background=1; the server answers at once
+// with a job, which is polled here until the file is ready to download.
+
+const EXPORT_POLL_MS = 1500;
+
+function exportToast() {
+    let toast = document.getElementById('exportToast');
+    if (!toast) {
+        toast = document.createElement('div');
+        toast.id = 'exportToast';
+        toast.className = 'export-toast';
+        toast.innerHTML = '<div class="export-toast-text"></div><div class="export-toast-bar"><span></span></div>';
+        document.body.appendChild(toast);
+    }
+    return toast;
+}
+
+function showExportProgress(job) {
+    const toast = exportToast();
+    const text = toast.querySelector('.export-toast-text');
+    const bar = toast.querySelector('.export-toast-bar span');
+
+    toast.classList.remove('failed');
+    toast.classList.add('visible');
+
+    if (job.status === 'failed') {
+        toast.classList.add('failed');
+        text.textContent = `Export failed: ${job.error || 'unknown error'}`;
+        setTimeout(() => toast.classList.remove('visible'), 6000);
+        return;
+    }
+    if (job.status === 'done') {
+        text.textContent = `Export ready: ${job.filename}`;
+        bar.style.width = '100%';
+        setTimeout(() => toast.classList.remove('visible'), 4000);
+        return;
+    }
+    text.textContent = job.rows_total
+        ? `Preparing export… ${job.rows_done.toLocaleString()} of ${job.rows_total.toLocaleString()} rows`
+        : 'Preparing export…';
+    bar.style.width = `${job.percent || 0}%`;
+}
+
+async function pollExportJob(job) {
+    while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, EXPORT_POLL_MS));
+        const response = await fetch(job.status_url, { headers: { 'Accept': 'application/json' } });
+        const data = await response.json();
+        if (!data.success) {
+            throw new Error(data.error || 'Could not check the export');
+        }
+        job = data.job;
+        showExportProgress(job);
+    }
+    return job;
+}
+
+async function startBackgroundExport(url) {
+    const exportUrl = new URL(url, window.location.origin);
+    exportUrl.searchParams.set('background', '1');
+
+    try {
+        const response = await fetch(exportUrl, { headers: { 'Accept': 'application/json' } });
+        const data = await response.json();
+        if (!data.success) {
+            throw new Error(data.error || 'Could not start the export');
+        }
+
+        showExportProgress(data.job);
+        const job = await pollExportJob(data.job);
+        if (job.status === 'done' && job.download_url) {
+            window.location.href = job.download_url;
+        }
+        return job;
+    } catch (error) {
+        console.error('Error exporting:', error);
+        showExportProgress({ status: 'failed', error: error.message });
+        return null;
+    }
+}
+
+document.addEventListener('click', event => {
+    const link = event.target.closest('a[data-background-export]');
+    if (!link || event.ctrlKey || event.metaKey || event.shiftKey) {
+        return;
+    }
+    event.preventDefault();
+    startBackgroundExport(link.href);
+});
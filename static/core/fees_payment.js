@@ -19,6 +19,10 @@ function getCookie(name) {
 }
 
 // ===================== SEARCH STUDENTS =====================
+// Results for recent queries: query -> { students, complete }
+const searchCache = new Map();
+const SEARCH_CACHE_SIZE = 50;
+
 document.addEventListener('DOMContentLoaded', function() {
     const searchInput = document.getElementById('studentSearch');
     const searchResults = document.getElementById('searchResults');
@@ -34,35 +38,94 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
         
+        // Narrow a complete result list for a shorter prefix without asking the server
+        const narrowed = narrowCachedResults(query);
+        if (narrowed) {
+            renderSearchResults(narrowed);
+            return;
+        }
+        
         searchTimeout = setTimeout(() => {
             searchStudents(query);
-        }, 300);
+        }, 150);
     });
 });
 
+// Same matching rules as core/typeahead.py
+function studentMatches(student, query) {
+    const name = student.full_name.toLowerCase();
+    if (name.startsWith(query)) {
+        return true;
+    }
+    
+    const nameTokens = name.match(/[\p{L}\p{M}\p{N}_]+/gu) || [];
+    const queryTokens = query.match(/[\p{L}\p{M}\p{N}_]+/gu) || [];
+    if (queryTokens.length && queryTokens.every(word => nameTokens.some(token => token.startsWith(word)))) {
+        return true;
+    }
+    
+    if (!/^\d+$/.test(query)) {
+        return false;
+    }
+    const digits = student.mobile_own.replace(/\D/g, '');
+    return digits.startsWith(query) || digits.endsWith(query);
+}
+
+function narrowCachedResults(query) {
+    const normalized = query.toLowerCase();
+    for (let length = normalized.length - 1; length >= 2; length--) {
+        const cached = searchCache.get(normalized.slice(0, length));
+        if (cached && cached.complete) {
+            return cached.students.filter(student => studentMatches(student, normalized));
+        }
+    }
+    return null;
+}
+
+function rememberResults(query, data) {
+    searchCache.set(query.toLowerCase(), {
+        students: data.students || [],
+        complete: Boolean(data.complete)
+    });
+    if (searchCache.size > SEARCH_CACHE_SIZE) {
+        searchCache.delete(searchCache.keys().next().value);
+    }
+}
+
+function renderSearchResults(students) {
+    const searchResults = document.getElementById('searchResults');
+    
+    if (students && students.length > 0) {
+        let html = '';
+        students.forEach(student => {
+            html += `
+                <div class="student-result" onclick="selectStudent(${student.id})">
+                    <div class="student-result-name">${student.full_name}</div>
+                    <div class="student-result-details">
+                        📞 ${student.mobile_own} | 📚 ${student.course}
+                    </div>
+                </div>
+            `;
+        });
+        searchResults.innerHTML = html;
+        searchResults.classList.add('active');
+    } else {
+        searchResults.innerHTML = '<div class="no-results">No students found</div>';
+        searchResults.classList.add('active');
+    }
+}
+
 function searchStudents(query) {
     const searchResults = document.getElementById('searchResults');
     
     fetch(`/fees-payment/search/?q=${encodeURIComponent(query)}`)
         .then(response => response.json())
         .then(data => {
-            if (data.students && data.students.length > 0) {
-                let html = '';
-                data.students.forEach(student => {
-                    html += `
-                        <div class="student-result" onclick="selectStudent(${student.id})">
-                            <div class="student-result-name">${student.full_name}</div>
-                            <div class="student-result-details">
-                                📞 ${student.mobile_own} | 📚 ${student.course}
-                            </div>
-                        </div>
-                    `;
-                });
-                searchResults.innerHTML = html;
-                searchResults.classList.add('active');
-            } else {
-                searchResults.innerHTML = '<div class="no-results">No students found</div>';
-                searchResults.classList.add('active');
+            rememberResults(query, data);
+            
+            // Ignore answers to queries the user has already typed past
+            if (document.getElementById('studentSearch').value.trim() === query) {
+                renderSearchResults(data.students);
             }
         })
         .catch(error => {
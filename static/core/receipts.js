@@ -1,6 +1,10 @@
 // Global variables
-let allReceipts = [];
-let filteredReceipts = [];
+let allReceipts = [];          // receipts loaded so far for the current filters
+let nextCursor = null;         // cursor for the next page, null on the last page
+let loadingPage = false;
+let requestSerial = 0;         // responses for outdated filters are ignored
+let replicaRows = null;        // unfiltered view served from the local replica, newest first
+const PAGE_SIZE = 50;
 
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', function() {
@@ -8,6 +12,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initializePage();
     loadReceipts();
     setupEventListeners();
+    setupInfiniteScroll();
 });
 
 // Initialize page
@@ -37,6 +42,9 @@ function setupEventListeners() {
     // Export button
     document.getElementById('exportBtn').addEventListener('click', exportToExcel);
     
+    // Month-end report follows the month/year filters (current month when unset)
+    document.getElementById('monthEndBtn').addEventListener('click', openMonthEndReport);
+    
     // Edit form submit
     document.getElementById('editForm').addEventListener('submit', handleEditSubmit);
 }
@@ -54,83 +62,261 @@ function debounce(func, wait) {
     };
 }
 
-// Load receipts from backend
-async function loadReceipts() {
+// Current filter values as API parameters
+function filterParams() {
+    const params = new URLSearchParams();
+    
+    const searchTerm = document.getElementById('searchInput').value.trim();
+    const dateFilter = document.getElementById('dateFilter').value;
+    const monthFilter = document.getElementById('monthFilter').value;
+    const yearFilter = document.getElementById('yearFilter').value;
+    
+    if (searchTerm) params.append('search', searchTerm);
+    if (dateFilter) params.append('date', dateFilter);
+    if (monthFilter) params.append('month', monthFilter);
+    if (yearFilter) params.append('year', yearFilter);
+    
+    return params;
+}
+
+// ===================== LOCAL REPLICA (IndexedDB) =====================
+// A persistent copy of all receipts. Each visit pulls only what changed since
+// the last sync token from /api/receipts/changes/, so reopening the page
+// costs one small request. Filtered views still go to /api/receipts/.
+function idbResult(request) {
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function idbDone(transaction) {
+    return new Promise((resolve, reject) => {
+        transaction.oncomplete = () => resolve();
+        transaction.onerror = () => reject(transaction.error);
+        transaction.onabort = () => reject(transaction.error);
+    });
+}
+
+const receiptReplica = {
+    dbPromise: null,
+    
+    open() {
+        if (!('indexedDB' in window)) {
+            return Promise.resolve(null);
+        }
+        if (!this.dbPromise) {
+            this.dbPromise = new Promise(resolve => {
+                const request = indexedDB.open('receipts-replica', 1);
+                request.onupgradeneeded = () => {
+                    request.result.createObjectStore('receipts', { keyPath: 'id' });
+                    request.result.createObjectStore('meta');
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => resolve(null);
+                request.onblocked = () => resolve(null);
+            });
+        }
+        return this.dbPromise;
+    },
+    
+    async all() {
+        const db = await this.open();
+        return idbResult(db.transaction('receipts').objectStore('receipts').getAll());
+    },
+    
+    async token() {
+        const db = await this.open();
+        return idbResult(db.transaction('meta').objectStore('meta').get('token'));
+    },
+    
+    async apply(receipts, deleted, reset, token) {
+        const db = await this.open();
+        const transaction = db.transaction(['receipts', 'meta'], 'readwrite');
+        const store = transaction.objectStore('receipts');
+        if (reset) {
+            store.clear();
+        }
+        deleted.forEach(id => store.delete(id));
+        receipts.forEach(receipt => store.put(receipt));
+        if (token) {
+            transaction.objectStore('meta').put(token, 'token');
+        }
+        return idbDone(transaction);
+    },
+    
+    async sync() {
+        const since = (await this.token()) || '';
+        let cursor = '';
+        let first = null;
+        
+        do {
+            const params = new URLSearchParams({ since: since, cursor: cursor });
+            const response = await fetch(`/api/receipts/changes/?${params.toString()}`);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const data = await response.json();
+            if (!data.success) {
+                throw new Error(data.error || 'Failed to sync receipts');
+            }
+            
+            first = first || data;
+            cursor = data.next_cursor;
+            
+            // The new token is stored with the last page, once everything is in
+            await this.apply(
+                data.receipts,
+                data === first ? first.deleted : [],
+                data === first && first.reset,
+                cursor ? null : first.token
+            );
+        } while (cursor);
+    }
+};
+
+function newestFirst(a, b) {
+    if (a.payment_at !== b.payment_at) {
+        return a.payment_at < b.payment_at ? 1 : -1;
+    }
+    return b.id - a.id;
+}
+
+function replicaTotals(receipts) {
+    return {
+        count: receipts.length,
+        paid: receipts.reduce((sum, r) => sum + parseFloat(r.paid_fees || 0), 0),
+        remaining: receipts.reduce((sum, r) => sum + parseFloat(r.remaining_fees || 0), 0)
+    };
+}
+
+function showReplicaPage(append) {
+    const start = append ? allReceipts.length : 0;
+    const page = replicaRows.slice(start, start + PAGE_SIZE);
+    allReceipts = append ? allReceipts.concat(page) : page;
+    nextCursor = allReceipts.length < replicaRows.length ? 'replica' : null;
+    
+    renderReceipts(page, append);
+    if (!append) {
+        updateSummary(replicaTotals(replicaRows));
+    }
+}
+
+async function loadFromReplica() {
+    const serial = ++requestSerial;
+    showLoading(true);
+    
     try {
-        console.log('Loading receipts...'); // Debug log
+        // Paint the cached copy straight away, then bring it up to date
+        const cached = await receiptReplica.all();
+        if (serial === requestSerial && cached.length) {
+            replicaRows = cached.sort(newestFirst);
+            showReplicaPage(false);
+        }
+        
+        await receiptReplica.sync();
+        const current = await receiptReplica.all();
+        if (serial !== requestSerial) {
+            return true;
+        }
+        replicaRows = current.sort(newestFirst);
+        showReplicaPage(false);
+        return true;
+    } catch (error) {
+        console.error('Receipt replica unavailable, using the server:', error);
+        replicaRows = null;
+        return false;
+    } finally {
+        if (serial === requestSerial) {
+            showLoading(false);
+        }
+    }
+}
+
+// Load receipts: the first page, or the next one when append is true
+async function loadReceipts(append = false) {
+    if (append && (loadingPage || !nextCursor)) {
+        return;
+    }
+    
+    if (append && replicaRows) {
+        showReplicaPage(true);
+        return;
+    }
+    
+    // The unfiltered list comes from the local replica when the browser has one
+    if (!filterParams().toString() && await receiptReplica.open()) {
+        if (await loadFromReplica()) {
+            return;
+        }
+    }
+    
+    replicaRows = null;
+    const serial = ++requestSerial;
+    const params = filterParams();
+    params.append('size', PAGE_SIZE);
+    if (append) {
+        params.append('cursor', nextCursor);
+    }
+    
+    try {
+        loadingPage = true;
         showLoading(true);
         
-        const response = await fetch('/api/receipts/');
-        console.log('Response status:', response.status); // Debug log
+        const response = await fetch(`/api/receipts/?${params.toString()}`);
         
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         
         const data = await response.json();
-        console.log('Received data:', data); // Debug log
+        
+        // Filters changed while this page was loading
+        if (serial !== requestSerial) {
+            return;
+        }
         
         if (data.success) {
-            allReceipts = data.receipts || [];
-            filteredReceipts = [...allReceipts];
-            
-            console.log('Total receipts loaded:', allReceipts.length); // Debug log
+            const receipts = data.receipts || [];
+            allReceipts = append ? allReceipts.concat(receipts) : receipts;
+            nextCursor = data.next_cursor;
             
-            renderReceipts(filteredReceipts);
-            updateSummary(filteredReceipts);
+            renderReceipts(receipts, append);
+            if (data.totals) {
+                updateSummary(data.totals);
+            }
         } else {
             throw new Error(data.error || 'Failed to load receipts');
         }
-        
-        showLoading(false);
     } catch (error) {
         console.error('Error loading receipts:', error);
         showError('Failed to load receipts. Please refresh the page or contact support.');
-        showLoading(false);
+    } finally {
+        if (serial === requestSerial) {
+            loadingPage = false;
+            showLoading(false);
+        }
     }
 }
 
-// Apply filters
-function applyFilters() {
-    const searchTerm = document.getElementById('searchInput').value.toLowerCase();
-    const dateFilter = document.getElementById('dateFilter').value;
-    const monthFilter = document.getElementById('monthFilter').value;
-    const yearFilter = document.getElementById('yearFilter').value;
-    
-    console.log('Applying filters:', { searchTerm, dateFilter, monthFilter, yearFilter }); // Debug log
+// Load the next page when the bottom of the table scrolls into view
+function setupInfiniteScroll() {
+    const sentinel = document.getElementById('receiptsSentinel');
+    if (!sentinel || !('IntersectionObserver' in window)) {
+        return;
+    }
     
-    filteredReceipts = allReceipts.filter(receipt => {
-        // Search filter
-        if (searchTerm && !receipt.student_name.toLowerCase().includes(searchTerm) && !receipt.receipt_no.toLowerCase().includes(searchTerm)) {
-            return false;
-        }
-        
-        // Date filter
-        if (dateFilter && receipt.payment_date !== dateFilter) {
-            return false;
-        }
-        
-        // Month and Year filter
-        if (monthFilter || yearFilter) {
-            const receiptDate = new Date(receipt.payment_date);
-            const receiptMonth = String(receiptDate.getMonth() + 1).padStart(2, '0');
-            const receiptYear = String(receiptDate.getFullYear());
-            
-            if (monthFilter && receiptMonth !== monthFilter) {
-                return false;
-            }
-            
-            if (yearFilter && receiptYear !== yearFilter) {
-                return false;
-            }
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadReceipts(true);
         }
-        
-        return true;
-    });
-    
-    console.log('Filtered receipts:', filteredReceipts.length); // Debug log
-    renderReceipts(filteredReceipts);
-    updateSummary(filteredReceipts);
+    }, { rootMargin: '400px 0px' });
+    observer.observe(sentinel);
+}
+
+// Apply filters (on the server)
+function applyFilters() {
+    loadReceipts();
 }
 
 // Clear all filters
@@ -140,19 +326,19 @@ function clearFilters() {
     document.getElementById('monthFilter').value = '';
     document.getElementById('yearFilter').value = '';
     
-    filteredReceipts = [...allReceipts];
-    renderReceipts(filteredReceipts);
-    updateSummary(filteredReceipts);
+    loadReceipts();
 }
 
-// Render receipts in table
-function renderReceipts(receipts) {
+// Render receipts in table (appending a further page when append is true)
+function renderReceipts(receipts, append = false) {
     const tbody = document.getElementById('receiptsTableBody');
     const noResults = document.getElementById('noResults');
     
-    tbody.innerHTML = '';
+    if (!append) {
+        tbody.innerHTML = '';
+    }
     
-    if (receipts.length === 0) {
+    if (allReceipts.length === 0) {
         noResults.style.display = 'block';
         return;
     }
@@ -189,15 +375,11 @@ function renderReceipts(receipts) {
     });
 }
 
-// Update summary cards
-function updateSummary(receipts) {
-    const totalReceipts = receipts.length;
-    const totalPaid = receipts.reduce((sum, r) => sum + parseFloat(r.paid_fees || 0), 0);
-    const totalRemaining = receipts.reduce((sum, r) => sum + parseFloat(r.remaining_fees || 0), 0);
-    
-    document.getElementById('totalReceipts').textContent = totalReceipts;
-    document.getElementById('totalPaid').textContent = '₹' + formatNumber(totalPaid);
-    document.getElementById('totalRemaining').textContent = '₹' + formatNumber(totalRemaining);
+// Update summary cards from the totals the server computed for all matching receipts
+function updateSummary(totals) {
+    document.getElementById('totalReceipts').textContent = totals.count;
+    document.getElementById('totalPaid').textContent = '₹' + formatNumber(totals.paid);
+    document.getElementById('totalRemaining').textContent = '₹' + formatNumber(totals.remaining);
 }
 
 // Open edit modal
@@ -408,34 +590,24 @@ function printReceipt() {
 
 // Export to Excel
 async function exportToExcel() {
-    try {
-        showLoading(true);
-        
-        // Build query parameters
-        const params = new URLSearchParams();
-        
-        const searchTerm = document.getElementById('searchInput').value;
-        const dateFilter = document.getElementById('dateFilter').value;
-        const monthFilter = document.getElementById('monthFilter').value;
-        const yearFilter = document.getElementById('yearFilter').value;
-        
-        if (searchTerm) params.append('search', searchTerm);
-        if (dateFilter) params.append('date', dateFilter);
-        if (monthFilter) params.append('month', monthFilter);
-        if (yearFilter) params.append('year', yearFilter);
-        
-        // Download file
-        window.location.href = `/api/receipts/export/?${params.toString()}`;
-        
-        showLoading(false);
-        showNotification('Export started! Your download will begin shortly.', 'success');
-    } catch (error) {
-        console.error('Error exporting:', error);
+    // Queued on the server; exports.js polls the job and starts the download
+    const job = await startBackgroundExport(`/api/receipts/export/?${filterParams().toString()}`);
+    if (!job || job.status !== 'done') {
         showError('Failed to export receipts. Please try again.');
-        showLoading(false);
     }
 }
 
+// Month-end workbook for the selected month
+function openMonthEndReport(event) {
+    event.preventDefault();
+    const params = new URLSearchParams();
+    const month = document.getElementById('monthFilter').value;
+    const year = document.getElementById('yearFilter').value;
+    if (month) params.append('month', month);
+    if (year) params.append('year', year);
+    window.location.href = `${event.currentTarget.pathname}?${params.toString()}`;
+}
+
 // Show/hide loading
 function showLoading(show) {
     const spinner = document.getElementById('loadingSpinner');
@@ -0,0 +1,117 @@
+// ===================== GET CSRF TOKEN =====================
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+async function postForm(url, formData) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'X-CSRFToken': getCookie('csrftoken') },
+        body: formData
+    });
+    const data = await response.json();
+    if (!data.success) {
+        throw new Error(data.error || 'Request failed');
+    }
+    return data;
+}
+
+// ===================== STATEMENT IMPORT =====================
+async function importStatement(event) {
+    event.preventDefault();
+    const form = event.currentTarget;
+    const file = document.getElementById('statementFile').files[0];
+    if (!file) return;
+
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('payment_mode', document.getElementById('paymentMode').value);
+
+    try {
+        const { settlement } = await postForm(form.dataset.importUrl, formData);
+        alert(
+            `${settlement.rows} rows read: ${settlement.posted} posted, ` +
+            `${settlement.review} sent for review, ${settlement.duplicates} already imported.`
+        );
+        window.location.reload();
+    } catch (error) {
+        console.error('Error importing statement:', error);
+        alert(`Import failed: ${error.message}`);
+    }
+}
+
+// ===================== REVIEW QUEUE =====================
+const studentSearchTimers = new WeakMap();
+
+function searchStudents(input) {
+    clearTimeout(studentSearchTimers.get(input));
+    const query = input.value.trim();
+    if (query.length < 2) return;
+
+    studentSearchTimers.set(input, setTimeout(async () => {
+        const response = await fetch(`/fees-payment/search/?q=${encodeURIComponent(query)}`);
+        const data = await response.json();
+        const list = document.getElementById(input.getAttribute('list'));
+        list.innerHTML = '';
+        (data.students || []).forEach(student => {
+            const option = document.createElement('option');
+            option.value = `${student.full_name} (${student.mobile_own})`;
+            option.dataset.id = student.id;
+            list.appendChild(option);
+        });
+    }, 250));
+}
+
+function chosenStudentId(input) {
+    const list = document.getElementById(input.getAttribute('list'));
+    const option = Array.from(list.options).find(option => option.value === input.value);
+    return option ? option.dataset.id : null;
+}
+
+async function resolveReview(row, action) {
+    const formData = new FormData();
+    if (action === 'dismiss') {
+        if (!confirm('Dismiss this statement row? It will not be posted.')) return;
+        formData.append('dismiss', '1');
+    } else {
+        const studentId = chosenStudentId(row.querySelector('.review-student'));
+        if (!studentId) {
+            alert('Pick a student from the list first.');
+            return;
+        }
+        formData.append('student_id', studentId);
+    }
+
+    try {
+        const data = await postForm(row.dataset.reviewUrl, formData);
+        if (data.receipt_no) {
+            alert(`Posted as receipt ${data.receipt_no}.`);
+        }
+        row.remove();
+    } catch (error) {
+        console.error('Error resolving review:', error);
+        alert(error.message);
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.getElementById('settlementForm').addEventListener('submit', importStatement);
+
+    document.querySelectorAll('tr[data-review-url]').forEach(row => {
+        row.querySelector('.review-student').addEventListener('input', event => searchStudents(event.target));
+        row.querySelectorAll('button[data-action]').forEach(button => {
+            button.addEventListener('click', () => resolveReview(row, button.dataset.action));
+        });
+    });
+});